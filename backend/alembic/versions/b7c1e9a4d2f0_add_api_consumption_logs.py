@@ -0,0 +1,50 @@
+"""add_api_consumption_logs
+
+Revision ID: b7c1e9a4d2f0
+Revises: da43202f3006
+Create Date: 2026-10-18 09:12:44.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c1e9a4d2f0'
+down_revision: Union[str, Sequence[str], None] = 'da43202f3006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('api_consumption_logs',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('instance', sa.String(length=100), nullable=True),
+    sa.Column('model', sa.String(length=100), nullable=False),
+    sa.Column('operation', sa.String(length=100), nullable=False),
+    sa.Column('input_tokens', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('output_tokens', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('thinking_tokens', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('cached_tokens', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('total_tokens', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('latency_ms', sa.Float(), nullable=False, server_default='0'),
+    sa.Column('queue_wait_ms', sa.Float(), nullable=False, server_default='0'),
+    sa.Column('retries', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('cost_usd', sa.Float(), nullable=False, server_default='0'),
+    sa.Column('success', sa.Boolean(), nullable=False, server_default=sa.true()),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('cache_hit', sa.Boolean(), nullable=False, server_default=sa.false()),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('idx_consumption_created', 'api_consumption_logs', ['created_at'], unique=False)
+    op.create_index('idx_consumption_model_created', 'api_consumption_logs', ['model', 'created_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_consumption_model_created', table_name='api_consumption_logs')
+    op.drop_index('idx_consumption_created', table_name='api_consumption_logs')
+    op.drop_table('api_consumption_logs')
@@ -0,0 +1,33 @@
+"""add_rfp_content_hashes
+
+Revision ID: c4e8a1f7b3d9
+Revises: b7c1e9a4d2f0
+Create Date: 2026-10-18 11:47:05.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1f7b3d9'
+down_revision: Union[str, Sequence[str], None] = 'b7c1e9a4d2f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('rfp_submissions', sa.Column('file_sha256', sa.String(length=64), nullable=True))
+    op.add_column('rfp_submissions', sa.Column('text_sha256', sa.String(length=64), nullable=True))
+    op.create_index('idx_rfp_file_sha256', 'rfp_submissions', ['file_sha256'], unique=False)
+    op.create_index('idx_rfp_text_sha256', 'rfp_submissions', ['text_sha256'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_rfp_text_sha256', table_name='rfp_submissions')
+    op.drop_index('idx_rfp_file_sha256', table_name='rfp_submissions')
+    op.drop_column('rfp_submissions', 'text_sha256')
+    op.drop_column('rfp_submissions', 'file_sha256')
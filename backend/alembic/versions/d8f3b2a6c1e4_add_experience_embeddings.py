@@ -0,0 +1,30 @@
+"""add_experience_embeddings
+
+Revision ID: d8f3b2a6c1e4
+Revises: c4e8a1f7b3d9
+Create Date: 2026-10-18 15:22:41.318054
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8f3b2a6c1e4'
+down_revision: Union[str, Sequence[str], None] = 'c4e8a1f7b3d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('experiences', sa.Column('embedding', postgresql.ARRAY(sa.Float()), nullable=True))
+    op.add_column('experiences', sa.Column('embedding_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('experiences', 'embedding_hash')
+    op.drop_column('experiences', 'embedding')
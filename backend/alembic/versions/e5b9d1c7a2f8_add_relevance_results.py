@@ -0,0 +1,42 @@
+"""add_relevance_results
+
+Revision ID: e5b9d1c7a2f8
+Revises: d8f3b2a6c1e4
+Create Date: 2026-10-18 17:05:12.640277
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b9d1c7a2f8'
+down_revision: Union[str, Sequence[str], None] = 'd8f3b2a6c1e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('relevance_results',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('rfp_id', sa.UUID(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('item_id', sa.UUID(), nullable=False),
+    sa.Column('item_hash', sa.String(length=64), nullable=False),
+    sa.Column('context_hash', sa.String(length=64), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.Column('reason', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['rfp_id'], ['rfp_submissions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('rfp_id', 'kind', 'item_id', name='uq_relevance_rfp_kind_item')
+    )
+    op.create_index('idx_relevance_rfp_kind', 'relevance_results', ['rfp_id', 'kind'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_relevance_rfp_kind', table_name='relevance_results')
+    op.drop_table('relevance_results')
@@ -9,6 +9,7 @@ from uuid import UUID
 import unicodedata
 import re
 from core.services.analyzer import get_analyzer_service
+from core.services.certification_catalog import certification_catalog
 from core.database import get_db
 from core.storage import get_storage_service
 from models.certification import Certification
@@ -83,6 +84,7 @@ async def create_certification(
     db.add(cert)
     await db.commit()
     await db.refresh(cert)
+    certification_catalog.invalidate()
     
     return {"message": "Certificación cargada exitosamente", "id": cert.id}
 
@@ -104,6 +106,7 @@ async def delete_certification(cert_id: UUID, db: AsyncSession = Depends(get_db)
     from sqlalchemy import delete
     await db.execute(delete(Certification).where(Certification.id == cert_id))
     await db.commit()
+    certification_catalog.invalidate()
     
     return {"message": "Certificación eliminada exitosamente"}
 
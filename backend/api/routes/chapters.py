@@ -6,6 +6,7 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.services.analyzer import get_analyzer_service
+from core.services.relevance_store import KIND_CHAPTER, item_hash, load_relevance, save_relevance
 from core.database import get_db
 from core.storage import get_storage_service
 from models.chapter import Chapter
@@ -159,6 +160,7 @@ async def get_chapter_recommendations(
 ):
     """
     Genera recomendaciones de capítulos basadas en el RFP.
+    Los resultados se guardan por RFP; solo se evalúan capítulos nuevos o modificados.
     """
     try:
         # 1. Fetch RFP Summary
@@ -175,22 +177,45 @@ async def get_chapter_recommendations(
         if not chapters:
             return []
 
-        # 3. Format data for Analyzer
+        # 3. Resultados guardados: solo se evalúan capítulos nuevos o modificados
         rfp_summary = f"Title: {rfp.title or rfp.file_name}\nSummary: {rfp.summary or 'No summary available'}"
-        chap_list = [
-            {
-                "id": str(c.id),
-                "name": c.name,
-                "description": c.description
-            } 
-            for c in chapters
-        ]
-
-        # 4. Call AI Analyzer
-        analyzer = get_analyzer_service()
-        recommendations = await analyzer.analyze_chapter_relevance(rfp_summary, chap_list)
+        hashes = {str(c.id): item_hash(c.name, c.description) for c in chapters}
+        stored, pending_ids = await load_relevance(db, rfp.id, KIND_CHAPTER, hashes, rfp_summary)
+        logger.info(f"Relevancia guardada: {len(stored)} capítulos, {len(pending_ids)} por evaluar")
+
+        if pending_ids:
+            # 4. Format data for Analyzer
+            pending = set(pending_ids)
+            chap_list = [
+                {
+                    "id": str(c.id),
+                    "name": c.name,
+                    "description": c.description
+                } 
+                for c in chapters if str(c.id) in pending
+            ]
+
+            # 5. Call AI Analyzer
+            analyzer = get_analyzer_service()
+            recommendations = await analyzer.analyze_chapter_relevance(rfp_summary, chap_list)
+            recommendations = [
+                rec for rec in recommendations if str(rec.get("chapter_id")) in pending
+            ]
+
+            # Los capítulos omitidos por la IA se guardan con puntaje 0 (el
+            # frontend ya los trata así) para no re-evaluarlos. Una lista vacía
+            # puede ser un error de la llamada: no se guarda nada.
+            if recommendations:
+                returned = {str(rec["chapter_id"]) for rec in recommendations}
+                recommendations += [
+                    {"chapter_id": chap_id, "score": 0.0, "reason": "No seleccionado por IA como relevante para este RFP."}
+                    for chap_id in pending_ids if chap_id not in returned
+                ]
+                await save_relevance(db, rfp.id, KIND_CHAPTER, recommendations, hashes, rfp_summary)
+                await db.commit()
+            stored.update({str(rec["chapter_id"]): rec for rec in recommendations})
         
-        return recommendations
+        return [stored[chap_id] for chap_id in hashes if chap_id in stored]
 
     except Exception as e:
         logger.error(f"Error generating chapter recommendations: {e}")
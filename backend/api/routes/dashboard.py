@@ -1,18 +1,32 @@
 """
 Endpoints para el Dashboard.
 """
-from fastapi import APIRouter, Depends
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import select, func, case
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.config import settings
 from core.database import get_db
 from core.dependencies import get_current_user
 from models.rfp import RFPSubmission, RFPStatus
 from models.schemas import DashboardStats, RFPSummary
 from models.user import User
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
 
+# Rangos predefinidos para el consumo de la API
+CONSUMPTION_RANGES = {
+    "1h": timedelta(hours=1),
+    "24h": timedelta(hours=24),
+    "7d": timedelta(days=7),
+    "30d": timedelta(days=30),
+}
+
 
 @router.get("/stats", response_model=DashboardStats)
 async def get_dashboard_stats(
@@ -144,19 +158,52 @@ async def get_rfps_by_status(
 
 @router.get("/api-consumption")
 async def get_api_consumption(
+    range_: Literal["1h", "24h", "7d", "30d"] = Query("24h", alias="range", description="Rango si no se indica start"),
+    start: datetime | None = Query(None, description="Inicio del rango (ISO 8601)"),
+    end: datetime | None = Query(None, description="Fin del rango (ISO 8601, por defecto ahora)"),
+    model: str | None = Query(None, description="Filtrar por modelo"),
+    operation: str | None = Query(None, description="Filtrar por operación"),
     current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     """
     Obtiene el resumen de consumo de la API de Gemini.
     
-    Muestra:
-    - Total de requests
-    - Tokens consumidos (input, output, thinking)
-    - Tasa de éxito
+    Los totales salen de la tabla api_consumption_logs (todas las instancias,
+    sobreviven a los deploys) para el rango pedido:
+    - Total de requests, tasa de éxito y costo
+    - Tokens consumidos (input, output, thinking, cached)
+    - Latencia p50/p95/p99
+    - Desglose por modelo y operación, y serie temporal
     - Últimos 10 logs
+    
+    `process` trae el estado en memoria de esta instancia (ventanas 1m/1h/24h,
+    concurrencia, cachés). Si la base no está disponible se retorna solo eso.
     """
     from core.gcp.gemini_client import get_consumption_summary
-    return get_consumption_summary()
+    from core.gcp.consumption_writer import get_consumption_aggregates
+    from core.services.certification_catalog import certification_catalog
+    
+    live = {**get_consumption_summary(), "certification_catalog": certification_catalog.get_stats()}
+    if not settings.CONSUMPTION_PERSIST_ENABLED:
+        return {**live, "source": "memory"}
+    
+    end = end or datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    start = start or end - CONSUMPTION_RANGES[range_]
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start debe ser anterior a end")
+    
+    try:
+        history = await get_consumption_aggregates(db, start, end, model=model, operation=operation)
+    except Exception as e:
+        logger.warning(f"No se pudo consultar el consumo persistido: {e}")
+        return {**live, "source": "memory"}
+    
+    return {**history, "source": "database", "process": live}
 
 
 @router.get("/storage-info")
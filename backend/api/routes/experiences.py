@@ -3,18 +3,31 @@ from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
+from sqlalchemy.orm import undefer
 
+from core.config import settings
 from core.database import get_db
 from models.experience import Experience
 from models.rfp import RFPSubmission
 from models.schemas.experience_schemas import ExperienceCreate, Experience as ExperienceSchema, ExperienceRecommendationRequest, ExperienceRecommendation
 from core.services.analyzer import get_analyzer_service
+from core.services.experience_index import embed_experiences, shortlist_experiences
+from core.services.relevance_store import KIND_EXPERIENCE, item_hash, load_relevance, save_relevance
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/experiences", tags=["experiences"])
 
+
+async def _embed(experience: Experience) -> None:
+    """Calcula el embedding al guardar; si falla, se calcula al recomendar."""
+    try:
+        await embed_experiences(get_analyzer_service().gemini, [experience])
+    except Exception as e:
+        logger.warning(f"No se pudo calcular el embedding de la experiencia: {e}")
+
+
 @router.get("/", response_model=List[ExperienceSchema])
 async def get_experiences(db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Experience).order_by(Experience.fecha_inicio.desc()))
@@ -23,6 +36,7 @@ async def get_experiences(db: AsyncSession = Depends(get_db)):
 @router.post("/", response_model=ExperienceSchema)
 async def create_experience(experience: ExperienceCreate, db: AsyncSession = Depends(get_db)):
     new_experience = Experience(**experience.dict())
+    await _embed(new_experience)
     db.add(new_experience)
     await db.commit()
     await db.refresh(new_experience)
@@ -34,7 +48,9 @@ async def update_experience(
     experience_update: ExperienceCreate, 
     db: AsyncSession = Depends(get_db)
 ):
-    result = await db.execute(select(Experience).where(Experience.id == experience_id))
+    result = await db.execute(
+        select(Experience).where(Experience.id == experience_id).options(undefer(Experience.embedding))
+    )
     experience = result.scalar_one_or_none()
     
     if not experience:
@@ -45,6 +61,8 @@ async def update_experience(
     for key, value in update_data.items():
         setattr(experience, key, value)
     
+    # Recalcula el embedding solo si cambió el texto
+    await _embed(experience)
     await db.commit()
     await db.refresh(experience)
     return experience
@@ -69,6 +87,7 @@ async def get_experience_recommendations(
 ):
     """
     Genera recomendaciones de experiencias basadas en el RFP.
+    Los resultados se guardan por RFP; solo se evalúan experiencias nuevas o modificadas.
     """
     try:
         # 1. Fetch RFP Summary
@@ -82,33 +101,67 @@ async def get_experience_recommendations(
 
         # 2. Fetch All Experiences
         exp_result = await db.execute(select(Experience))
-        experiences = exp_result.scalars().all()
+        experiences = list(exp_result.scalars().all())
         
         if not experiences:
             return []
 
-        # 3. Format data for Analyzer
+        # 3. Resultados guardados: solo se evalúan experiencias nuevas o modificadas
         rfp_summary = f"Title: {rfp.title or rfp.file_name}\nSummary: {rfp.summary or 'No summary available'}"
-        exp_list = [
-            {
-                "id": str(e.id),
-                "propietario_servicio": e.propietario_servicio,
-                "descripcion_servicio": e.descripcion_servicio,
-                "monto_final": e.monto_final
-            } 
+        hashes = {
+            str(e.id): item_hash(e.propietario_servicio, e.descripcion_servicio, e.monto_final)
             for e in experiences
-        ]
+        }
+        stored, pending_ids = await load_relevance(db, rfp.id, KIND_EXPERIENCE, hashes, rfp_summary)
+        logger.info(f"Relevancia guardada: {len(stored)} experiencias, {len(pending_ids)} por evaluar")
 
-        logger.info(f"info-rfp: {rfp_summary}")
-        logger.info(f"info-exp: {exp_list}")
+        if pending_ids:
+            analyzer = get_analyzer_service()
 
-        # 4. Call AI Analyzer
-        analyzer = get_analyzer_service()
-        recommendations = await analyzer.analyze_experience_relevance(rfp_summary, exp_list)
-        
-        logger.info(f"AI Recommendations: {len(recommendations)} items returned. Content: {recommendations}")
+            # 4. Pre-ranking local: solo las más afines al RFP van a Gemini
+            shortlist = None
+            top_k = settings.EXPERIENCE_PRERANK_TOP_K
+            if top_k and len(experiences) > top_k:
+                exp_result = await db.execute(
+                    select(Experience)
+                    .options(undefer(Experience.embedding))
+                    .execution_options(populate_existing=True)
+                )
+                experiences = list(exp_result.scalars().all())
+                try:
+                    shortlist = await shortlist_experiences(analyzer.gemini, rfp, experiences, top_k)
+                    logger.info(f"Pre-ranking: {len(shortlist)} de {len(experiences)} experiencias van a Gemini")
+                except Exception as e:
+                    logger.warning(f"Pre-ranking de experiencias no disponible, se envían todas: {e}")
+                # Conserva los embeddings calculados al vuelo
+                await db.commit()
+
+            # 5. Format data for Analyzer
+            pending = set(pending_ids)
+            exp_list = [
+                {
+                    "id": str(e.id),
+                    "propietario_servicio": e.propietario_servicio,
+                    "descripcion_servicio": e.descripcion_servicio,
+                    "monto_final": e.monto_final
+                } 
+                for e in experiences if str(e.id) in pending
+            ]
+
+            logger.info(f"info-rfp: {rfp_summary}")
+            logger.info(f"info-exp: {len(exp_list)} experiencias")
+
+            # 6. Call AI Analyzer
+            recommendations = await analyzer.analyze_experience_relevance(
+                rfp_summary, exp_list, shortlist=shortlist
+            )
+            logger.info(f"AI Recommendations: {len(recommendations)} items returned. Content: {recommendations}")
+
+            await save_relevance(db, rfp.id, KIND_EXPERIENCE, recommendations, hashes, rfp_summary)
+            await db.commit()
+            stored.update({str(rec["experience_id"]): rec for rec in recommendations if rec.get("experience_id")})
         
-        return recommendations
+        return [stored[exp_id] for exp_id in hashes if exp_id in stored]
 
     except Exception as e:
         logger.error(f"Error generating recommendations: {e}")
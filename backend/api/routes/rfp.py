@@ -2,21 +2,28 @@
 Endpoints para gestión de RFPs.
 Usa almacenamiento híbrido (GCS con fallback local).
 """
+import asyncio
+import copy
+import json
 import logging
 from datetime import datetime
+from typing import Any, AsyncIterator
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from core.database import get_db
 from core.dependencies import get_current_user
+from core.gcp.gemini_cache import hash_text
+from core.gcp.token_budget import DocumentTooLargeError
 from core.storage import get_storage_service
 from core.services.analyzer import get_analyzer_service
 from core.services.mcp_client import get_mcp_client, convert_team_estimation_to_mcp_roles
+from core.services.text_sidecar import delete_sidecar, save_sidecar
 from models.rfp import RFPSubmission, RFPQuestion, RFPStatus
 from models.user import User
 from models.schemas import (
@@ -34,12 +41,83 @@ from models.schemas import (
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/rfp", tags=["RFP"])
 
+ALLOWED_RFP_TYPES = [
+    "application/pdf", 
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+]
+
+# Intervalo de comentarios keep-alive en el stream SSE (la conexión nunca queda inactiva)
+SSE_HEARTBEAT_SECONDS = 10.0
+
+# Análisis en curso lanzados por /upload/stream (siguen aunque el cliente se desconecte)
+_stream_tasks: set[asyncio.Task] = set()
+
+
+def _apply_analysis(rfp: RFPSubmission, extracted_data: dict[str, Any]) -> None:
+    """Guarda el resultado del análisis y los campos indexados en el RFP."""
+    indexed_fields = get_analyzer_service().extract_indexed_fields(extracted_data)
+    
+    rfp.extracted_data = extracted_data
+    rfp.status = RFPStatus.ANALYZED.value
+    rfp.analyzed_at = datetime.utcnow()
+    
+    for field, value in indexed_fields.items():
+        setattr(rfp, field, value)
+    
+    # Guardar recommended_isos en su columna específica
+    if "recommended_isos" in extracted_data:
+        rfp.recommended_isos = extracted_data["recommended_isos"]
+
+
+# Estados con un análisis completo que puede reutilizarse
+REUSABLE_STATUSES = (RFPStatus.ANALYZED.value, RFPStatus.GO.value, RFPStatus.NO_GO.value)
+
+
+async def _find_analyzed_duplicate(
+    db: AsyncSession,
+    file_sha256: str | None = None,
+    text_sha256: str | None = None,
+) -> RFPSubmission | None:
+    """RFP ya analizado con el mismo archivo o el mismo texto normalizado (el más reciente)."""
+    if file_sha256:
+        condition = RFPSubmission.file_sha256 == file_sha256
+    elif text_sha256:
+        condition = RFPSubmission.text_sha256 == text_sha256
+    else:
+        return None
+    result = await db.execute(
+        select(RFPSubmission)
+        .where(condition)
+        .where(RFPSubmission.status.in_(REUSABLE_STATUSES))
+        .where(RFPSubmission.extracted_data.is_not(None))
+        .order_by(RFPSubmission.analyzed_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+def _reuse_analysis(rfp: RFPSubmission, source: RFPSubmission) -> None:
+    """Copia el análisis de un RFP idéntico (sin la decisión del BDM)."""
+    extracted_data = copy.deepcopy(source.extracted_data)
+    extracted_data["_reused_from"] = str(source.id)
+    _apply_analysis(rfp, extracted_data)
+    rfp.text_sha256 = rfp.text_sha256 or source.text_sha256
+    logger.info(f"RFP {rfp.id}: análisis reutilizado de {source.id}")
+
+
+def _reused_message(source: RFPSubmission) -> str:
+    return (
+        f"Se reutilizó el análisis de un RFP idéntico ({source.file_name}). "
+        "Puedes forzar un análisis nuevo si lo necesitas."
+    )
+
 
 # ============ UPLOAD ============
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_rfp(
     file: UploadFile = File(...),
+    force_reanalysis: bool = Query(False, description="Analizar aunque exista un RFP idéntico ya analizado"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
@@ -48,15 +126,14 @@ async def upload_rfp(
     
     - Acepta PDF y DOCX
     - Guarda localmente (o GCS si está disponible)
+    - Si ya existe un RFP analizado con el mismo archivo o el mismo texto,
+      reutiliza su análisis al instante (`reused_from`); `force_reanalysis=true`
+      analiza de todas formas
     - Realiza análisis SÍNCRONO (espera a que termine)
     - Retorna cuando el análisis está completo
     """
     # Validar tipo de archivo
-    allowed_types = [
-        "application/pdf", 
-        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
-    ]
-    if file.content_type not in allowed_types:
+    if file.content_type not in ALLOWED_RFP_TYPES:
         raise HTTPException(
             status_code=400,
             detail="Tipo de archivo no soportado. Permitidos: PDF, DOCX"
@@ -70,6 +147,23 @@ async def upload_rfp(
     filename = file.filename or "documento_sin_nombre.pdf"
     content_type = file.content_type or "application/pdf"
     
+    # Deduplicación: primero por bytes, luego por texto normalizado (re-guardados)
+    analyzer = get_analyzer_service()
+    file_sha256 = hash_text(content)
+    prepared = None
+    text_sha256 = None
+    duplicate = None if force_reanalysis else await _find_analyzed_duplicate(db, file_sha256=file_sha256)
+    if duplicate is None:
+        try:
+            prepared = await analyzer.prepare_document_text(content, filename)
+        except Exception as e:
+            # El análisis vuelve a intentar la extracción y registra el error en el RFP
+            logger.warning(f"No se pudo extraer texto para deduplicar {filename}: {e}")
+        if prepared and prepared[0].strip():
+            text_sha256 = hash_text(prepared[0])
+            if not force_reanalysis:
+                duplicate = await _find_analyzed_duplicate(db, text_sha256=text_sha256)
+    
     # Guardar en storage (híbrido: GCS o local)
     storage = get_storage_service()
     file_uri = storage.upload_file(
@@ -78,17 +172,34 @@ async def upload_rfp(
         content_type=content_type,
     )
     
+    # Texto extraído junto al original: los re-análisis no vuelven a parsear el archivo
+    if prepared and prepared[0].strip():
+        await asyncio.to_thread(save_sidecar, storage, file_uri, *prepared)
+    
     # Crear registro en BD
     rfp = RFPSubmission(
         file_name=filename,
         file_gcs_path=file_uri,
         file_size_bytes=file_size,
+        file_sha256=file_sha256,
+        text_sha256=text_sha256,
         status=RFPStatus.ANALYZING.value,  # Directamente analyzing
     )
     db.add(rfp)
     await db.commit()
     await db.refresh(rfp)
     
+    if duplicate is not None:
+        _reuse_analysis(rfp, duplicate)
+        await db.commit()
+        return UploadResponse(
+            id=rfp.id,
+            file_name=filename,
+            status=RFPStatus.ANALYZED.value,
+            message=_reused_message(duplicate),
+            reused_from=duplicate.id,
+        )
+    
     # Obtener modo de análisis de las preferencias del usuario
     user_prefs = current_user.preferences or {}
     analysis_mode = user_prefs.get("analysis_mode", "balanced")
@@ -96,28 +207,16 @@ async def upload_rfp(
     
     # Realizar análisis SÍNCRONO
     try:
-        analyzer = get_analyzer_service()
         extracted_data = await analyzer.analyze_rfp_from_content(
             content, 
             filename,
             analysis_mode=analysis_mode,
             db=db,
+            prepared=prepared,
         )
         
-        # Extraer campos indexados
-        indexed_fields = analyzer.extract_indexed_fields(extracted_data)
-        
         # Actualizar RFP con resultados
-        rfp.extracted_data = extracted_data
-        rfp.status = RFPStatus.ANALYZED.value
-        rfp.analyzed_at = datetime.utcnow()
-        
-        for field, value in indexed_fields.items():
-            setattr(rfp, field, value)
-        
-        # Guardar recommended_isos en su columna específica
-        if "recommended_isos" in extracted_data:
-            rfp.recommended_isos = extracted_data["recommended_isos"]
+        _apply_analysis(rfp, extracted_data)
         
         await db.commit()
         await db.refresh(rfp)
@@ -131,6 +230,13 @@ async def upload_rfp(
             message="RFP subido y analizado exitosamente.",
         )
         
+    except DocumentTooLargeError as e:
+        logger.warning(f"RFP {rfp.id} rechazado por tamaño: {e}")
+        rfp.status = RFPStatus.ERROR.value
+        await db.commit()
+        
+        raise HTTPException(status_code=413, detail=str(e))
+        
     except Exception as e:
         logger.error(f"Error analyzing RFP {rfp.id}: {e}")
         rfp.status = RFPStatus.ERROR.value
@@ -167,29 +273,196 @@ async def analyze_rfp_task(rfp_id: str, file_uri: str, file_content: bytes):
             analyzer = get_analyzer_service()
             extracted_data = await analyzer.analyze_rfp_from_content(file_content, rfp.file_name, db=db)
             
-            # Extraer campos indexados
-            indexed_fields = analyzer.extract_indexed_fields(extracted_data)
-            
             # Actualizar RFP
-            rfp.extracted_data = extracted_data
-            rfp.status = RFPStatus.ANALYZED.value
-            rfp.analyzed_at = datetime.utcnow()
+            _apply_analysis(rfp, extracted_data)
+            
+            await db.commit()
+            logger.info(f"RFP analysis completed: {rfp_id}")
+            
+        except Exception as e:
+            logger.error(f"Error analyzing RFP {rfp_id}: {e}")
+            if rfp:
+                rfp.status = RFPStatus.ERROR.value
+                await db.commit()
+
+
+@router.post("/upload/stream")
+async def upload_rfp_stream(
+    file: UploadFile = File(...),
+    force_reanalysis: bool = Query(False, description="Analizar aunque exista un RFP idéntico ya analizado"),
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Sube un RFP y transmite el análisis como Server-Sent Events.
+    
+    A diferencia de /upload, la respuesta empieza de inmediato y la conexión
+    nunca queda inactiva (evita los 403/timeouts de Cloud Run con archivos grandes):
+    
+    - `accepted`: RFP registrado (id)
+    - `progress`: etapa actual (extracción, análisis)
+    - `token`: fragmentos generados por Gemini (`chars` acumulados)
+    - `done`: análisis persistido (mismo contenido que UploadResponse)
+    - `error`: el análisis falló (el RFP queda en estado error)
+    
+    Si existe un RFP idéntico ya analizado (mismo archivo o mismo texto), su
+    análisis se reutiliza y `done` trae `reused_from`, salvo con
+    `force_reanalysis=true`.
+    
+    El análisis continúa y se persiste aunque el cliente se desconecte.
+    """
+    if file.content_type not in ALLOWED_RFP_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Tipo de archivo no soportado. Permitidos: PDF, DOCX"
+        )
+    
+    content = await file.read()
+    filename = file.filename or "documento_sin_nombre.pdf"
+    content_type = file.content_type or "application/pdf"
+    
+    storage = get_storage_service()
+    file_uri = storage.upload_file(
+        file_content=content,
+        file_name=filename,
+        content_type=content_type,
+    )
+    
+    rfp = RFPSubmission(
+        file_name=filename,
+        file_gcs_path=file_uri,
+        file_size_bytes=len(content),
+        file_sha256=hash_text(content),
+        status=RFPStatus.ANALYZING.value,
+    )
+    db.add(rfp)
+    await db.commit()
+    await db.refresh(rfp)
+    
+    user_prefs = current_user.preferences or {}
+    analysis_mode = user_prefs.get("analysis_mode", "balanced")
+    logger.info(f"Streaming analysis for RFP {rfp.id} (mode: {analysis_mode})")
+    
+    queue: asyncio.Queue = asyncio.Queue()
+    await queue.put({"type": "accepted", "id": str(rfp.id), "file_name": filename})
+    
+    task = asyncio.create_task(
+        stream_analysis_task(str(rfp.id), content, filename, analysis_mode, queue, force_reanalysis)
+    )
+    _stream_tasks.add(task)
+    task.add_done_callback(_stream_tasks.discard)
+    
+    return StreamingResponse(
+        _sse_events(queue),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Sin buffering en nginx
+        },
+    )
+
+
+async def _sse_events(queue: asyncio.Queue) -> AsyncIterator[str]:
+    """Serializa los eventos de la cola como SSE, con keep-alive mientras no hay datos."""
+    while True:
+        try:
+            event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+        except asyncio.TimeoutError:
+            yield ": keep-alive\n\n"
+            continue
+        if event is None:
+            return
+        event_type = event.pop("type")
+        yield f"event: {event_type}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+
+async def stream_analysis_task(
+    rfp_id: str,
+    file_content: bytes,
+    filename: str,
+    analysis_mode: str,
+    queue: asyncio.Queue,
+    force_reanalysis: bool = False,
+):
+    """Ejecuta el análisis streaming, publica eventos en la cola y persiste el resultado."""
+    from core.database import AsyncSessionLocal
+    
+    async with AsyncSessionLocal() as db:
+        rfp = None
+        try:
+            result = await db.execute(
+                select(RFPSubmission).where(RFPSubmission.id == rfp_id)
+            )
+            rfp = result.scalar_one_or_none()
+            if not rfp:
+                raise ValueError(f"RFP not found: {rfp_id}")
+            
+            analyzer = get_analyzer_service()
+            duplicate = None
+            prepared = None
+            if not force_reanalysis:
+                duplicate = await _find_analyzed_duplicate(db, file_sha256=rfp.file_sha256)
+            if duplicate is None:
+                await queue.put({"type": "progress", "stage": "extracting", "message": "Extrayendo texto del documento"})
+                prepared = await analyzer.prepare_document_text(file_content, filename)
+                if prepared[0].strip():
+                    await asyncio.to_thread(save_sidecar, get_storage_service(), rfp.file_gcs_path, *prepared)
+                    rfp.text_sha256 = hash_text(prepared[0])
+                    if not force_reanalysis:
+                        duplicate = await _find_analyzed_duplicate(db, text_sha256=rfp.text_sha256)
             
-            for field, value in indexed_fields.items():
-                setattr(rfp, field, value)
+            if duplicate is not None:
+                _reuse_analysis(rfp, duplicate)
+                await db.commit()
+                await queue.put({
+                    "type": "done",
+                    "id": rfp_id,
+                    "file_name": filename,
+                    "status": RFPStatus.ANALYZED.value,
+                    "message": _reused_message(duplicate),
+                    "reused_from": str(duplicate.id),
+                })
+                return
             
-            # Guardar recommended_isos en su columna específica
-            if "recommended_isos" in extracted_data:
-                rfp.recommended_isos = extracted_data["recommended_isos"]
+            extracted_data: dict[str, Any] = {}
+            async for event in analyzer.analyze_rfp_stream(
+                file_content,
+                filename,
+                analysis_mode=analysis_mode,
+                db=db,
+                prepared=prepared,
+            ):
+                if event["type"] == "result":
+                    extracted_data = event["data"]
+                else:
+                    await queue.put(event)
             
+            _apply_analysis(rfp, extracted_data)
             await db.commit()
-            logger.info(f"RFP analysis completed: {rfp_id}")
+            logger.info(f"RFP streaming analysis completed: {rfp_id}")
             
+            await queue.put({
+                "type": "done",
+                "id": rfp_id,
+                "file_name": filename,
+                "status": RFPStatus.ANALYZED.value,
+                "message": "RFP subido y analizado exitosamente.",
+            })
+            
+        except DocumentTooLargeError as e:
+            logger.warning(f"RFP {rfp_id} rechazado por tamaño: {e}")
+            if rfp:
+                rfp.status = RFPStatus.ERROR.value
+                await db.commit()
+            await queue.put({"type": "error", "id": rfp_id, "status": 413, "detail": str(e)})
         except Exception as e:
             logger.error(f"Error analyzing RFP {rfp_id}: {e}")
             if rfp:
                 rfp.status = RFPStatus.ERROR.value
                 await db.commit()
+            await queue.put({"type": "error", "id": rfp_id, "detail": f"Error al analizar el RFP: {str(e)}"})
+        finally:
+            await queue.put(None)
 
 
 # ============ DOWNLOAD ============
@@ -420,7 +693,7 @@ async def generate_questions_task(rfp_id: str, extracted_data: dict):
     async with AsyncSessionLocal() as db:
         try:
             analyzer = get_analyzer_service()
-            questions = await analyzer.generate_questions(extracted_data)
+            questions = await analyzer.generate_questions(extracted_data, rfp_id=rfp_id)
             
             # Obtener RFP
             result = await db.execute(
@@ -474,11 +747,15 @@ async def get_questions(
 @router.post("/{rfp_id}/questions/regenerate", response_model=list[RFPQuestionSchema])
 async def regenerate_questions(
     rfp_id: UUID,
+    force: bool = Query(False, description="Ignorar la caché de Gemini y generar preguntas nuevas"),
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Regenera las preguntas para un RFP.
+    
+    Con los mismos datos de análisis se reutiliza la respuesta cacheada de Gemini;
+    usar `force=true` para obtener un set distinto.
     """
     result = await db.execute(
         select(RFPSubmission)
@@ -499,7 +776,9 @@ async def regenerate_questions(
     
     # Generar nuevas preguntas
     analyzer = get_analyzer_service()
-    questions = await analyzer.generate_questions(rfp.extracted_data)
+    questions = await analyzer.generate_questions(
+        rfp.extracted_data, use_cache=not force, rfp_id=rfp.id
+    )
     
     # Crear en BD
     new_questions = []
@@ -543,9 +822,16 @@ async def delete_rfp(
     try:
         storage = get_storage_service()
         storage.delete_file(rfp.file_gcs_path)
+        delete_sidecar(storage, rfp.file_gcs_path)
     except Exception as e:
         logger.warning(f"Failed to delete local file: {e}")
     
+    # Liberar el contexto cacheado en Gemini (si existe)
+    try:
+        await get_analyzer_service().gemini.release_rfp_context(rfp.id)
+    except Exception as e:
+        logger.warning(f"Failed to release Gemini context cache: {e}")
+    
     # Eliminar de BD (cascade eliminará las preguntas)
     await db.delete(rfp)
     await db.commit()
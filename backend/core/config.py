@@ -50,6 +50,112 @@ class Settings(BaseSettings):
         default="gemini-3-pro-preview",
         description="Gemini model to use (gemini-3-pro-preview es el más potente para análisis complejos)"
     )
+    GEMINI_MAX_CONCURRENCY: int = Field(
+        default=4,
+        description="Llamadas simultáneas máximas a Gemini por modelo (por proceso)"
+    )
+    GEMINI_MODEL_CONCURRENCY: str = Field(
+        default="",
+        description="Límites por modelo, ej: 'gemini-3-pro-preview=2,gemini-3-flash-preview=8'"
+    )
+    GEMINI_QUEUE_TIMEOUT_SECONDS: float = Field(
+        default=300.0,
+        description="Espera máxima en cola por un slot de Gemini (0 = sin límite)"
+    )
+    GEMINI_MAX_RETRIES: int = Field(
+        default=4,
+        description="Reintentos ante 429/5xx/errores de red (0 = sin reintentos)"
+    )
+    GEMINI_RETRY_BASE_DELAY_SECONDS: float = Field(default=2.0, description="Backoff base (se duplica por intento)")
+    GEMINI_RETRY_MAX_DELAY_SECONDS: float = Field(
+        default=60.0,
+        description="Espera máxima del backoff entre reintentos (un retry-after del servidor se respeta completo)"
+    )
+    GEMINI_RPM_LIMIT: int = Field(default=0, description="Requests por minuto por modelo (0 = sin límite)")
+    GEMINI_TPM_LIMIT: int = Field(default=0, description="Tokens de entrada por minuto por modelo (0 = sin límite)")
+    GEMINI_MODEL_RATE_LIMITS: str = Field(
+        default="",
+        description="Cuotas por modelo 'modelo=RPM:TPM', ej: 'gemini-3-pro-preview=25:1000000'"
+    )
+    GEMINI_CACHE_ENABLED: bool = Field(default=True, description="Caché persistente de respuestas de Gemini")
+    GEMINI_CACHE_PATH: str = Field(
+        default="",
+        description=(
+            "Archivo SQLite de la caché en un disco persistente (vacío = directorio temporal "
+            "del sistema; en Cloud Run vive en memoria y se pierde al reiniciar)"
+        )
+    )
+    GEMINI_CACHE_TTL_HOURS: float = Field(default=168.0, description="Vigencia de una respuesta cacheada (horas)")
+    GEMINI_CACHE_MAX_MB: int = Field(default=256, description="Tamaño máximo de la caché antes de expulsar (MB)")
+    GEMINI_CONTEXT_CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Context caching por RFP para la generación de preguntas"
+    )
+    GEMINI_CONTEXT_CACHE_TTL_MINUTES: float = Field(default=60.0, description="TTL del contexto cacheado (se renueva al usarlo)")
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS: int = Field(
+        default=4096,
+        description="Tamaño mínimo (tokens estimados) para cachear el contexto; la API rechaza contextos menores"
+    )
+    GEMINI_PROMPT_CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Cachear en Gemini los prompts estáticos de análisis (prefijo del prompt)"
+    )
+    CERT_CATALOG_TTL_SECONDS: int = Field(
+        default=300,
+        description="Vigencia del catálogo de certificaciones en memoria (otras instancias no reciben la invalidación)"
+    )
+    GEMINI_CASCADE_THRESHOLD: float = Field(
+        default=0.7,
+        description="Modo cascade: puntaje mínimo (0-1) del resultado de Flash para no escalar a Pro"
+    )
+    
+    # Pre-flight de tokens para RFPs largos
+    RFP_SINGLE_CALL_MAX_TOKENS: int = Field(
+        default=200_000,
+        description="Tokens de entrada hasta los que el RFP se analiza completo en una llamada (sobre 200K la tarifa sube)"
+    )
+    RFP_SELECTIVE_MAX_TOKENS: int = Field(
+        default=400_000,
+        description="Hasta este tamaño se envían solo las secciones relevantes; sobre esto se usa map-reduce"
+    )
+    RFP_MAX_DOCUMENT_TOKENS: int = Field(
+        default=1_500_000,
+        description="Documentos más grandes se rechazan de inmediato (HTTP 413)"
+    )
+    RFP_MAP_SECTION_TOKENS: int = Field(
+        default=30_000,
+        description="Map-reduce: tamaño objetivo de cada bloque de secciones"
+    )
+    RFP_MAP_MAX_SECTIONS: int = Field(
+        default=24,
+        description="Map-reduce: máximo de bloques (si hay más, los bloques crecen)"
+    )
+    RFP_NORMALIZE_TEXT: bool = Field(
+        default=True,
+        description="Quitar encabezados, pies, índices y párrafos repetidos antes de analizar"
+    )
+    GEMINI_PREFLIGHT_COUNT_TOKENS: bool = Field(
+        default=True,
+        description="Contar tokens con la API cuando la estimación cae cerca de un umbral"
+    )
+    
+    # Pre-ranking de experiencias con embeddings
+    GEMINI_EMBEDDING_MODEL: str = Field(default="gemini-embedding-001", description="Modelo de embeddings de Gemini")
+    EMBEDDING_DIMENSIONS: int = Field(default=768, description="Dimensiones de los embeddings (output_dimensionality)")
+    EXPERIENCE_PRERANK_TOP_K: int = Field(
+        default=20,
+        description="Experiencias más afines (por similitud de embeddings) que se envían a Gemini; 0 = todas"
+    )
+    
+    # Extracción de texto de PDFs (pool de procesos)
+    PDF_EXTRACTION_WORKERS: int = Field(default=0, description="Procesos del pool de extracción (0 = min(4, CPUs))")
+    PDF_PARALLEL_MIN_PAGES: int = Field(default=40, description="Páginas a partir de las cuales se extrae por rangos en paralelo")
+    
+    # Persistencia del consumo de Gemini (tabla api_consumption_logs)
+    CONSUMPTION_PERSIST_ENABLED: bool = Field(default=True, description="Persistir el consumo de Gemini en Postgres")
+    CONSUMPTION_FLUSH_BATCH_SIZE: int = Field(default=50, description="Registros por lote de escritura")
+    CONSUMPTION_FLUSH_INTERVAL_SECONDS: float = Field(default=5.0, description="Espera máxima antes de escribir un lote")
+    CONSUMPTION_QUEUE_MAX_SIZE: int = Field(default=10000, description="Registros pendientes antes de descartar")
     
     # MCP Talent Search Server
     MCP_TALENT_URL: str = Field(
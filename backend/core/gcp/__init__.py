@@ -1,12 +1,17 @@
 """GCP clients module."""
 # Usar cliente con API Key en lugar de Vertex AI
 from .gemini_client import GeminiClient, get_gemini_client, get_consumption_summary
+from .gemini_governor import GeminiCapacityError, get_gemini_governor
+from .token_budget import DocumentTooLargeError
 from .storage import StorageClient, get_storage_client
 
 __all__ = [
     "GeminiClient",
     "get_gemini_client",
     "get_consumption_summary",
+    "GeminiCapacityError",
+    "get_gemini_governor",
+    "DocumentTooLargeError",
     "StorageClient", 
     "get_storage_client",
 ]
@@ -0,0 +1,193 @@
+"""
+Agregados de consumo de Gemini con memoria constante.
+
+- Histogramas de latencia de buckets fijos (p50/p95/p99 sin guardar muestras)
+- Ventanas móviles (1m/1h/24h) divididas en slots de tiempo; cada slot guarda
+  contadores por (modelo, operación) y se reutiliza al rotar
+
+El costo de registrar una llamada es O(1) y el de un resumen depende solo del
+número de slots y de combinaciones modelo/operación, no del número de llamadas.
+"""
+import bisect
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+# Límites superiores (ms) de los buckets de latencia; el último es abierto
+LATENCY_BUCKETS_MS = (
+    50, 100, 250, 500, 1_000, 2_000, 5_000, 10_000, 20_000,
+    30_000, 60_000, 120_000, 300_000, float("inf"),
+)
+
+# Ventanas móviles: nombre -> (duración en segundos, cantidad de slots)
+ROLLING_WINDOWS = {
+    "1m": (60, 60),
+    "1h": (3_600, 60),
+    "24h": (86_400, 96),
+}
+
+
+class LatencyHistogram:
+    """Histograma de latencias con buckets fijos."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS_MS)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, latency_ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.count += 1
+        self.total_ms += latency_ms
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for i, value in enumerate(other.counts):
+            self.counts[i] += value
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, q: float) -> float:
+        """Percentil aproximado (interpolación lineal dentro del bucket)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, value in enumerate(self.counts):
+            if value and seen + value >= rank:
+                lower = LATENCY_BUCKETS_MS[i - 1] if i else 0.0
+                upper = min(LATENCY_BUCKETS_MS[i], self.max_ms)
+                if upper <= lower:
+                    return upper
+                return lower + (upper - lower) * (rank - seen) / value
+            seen += value
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.50), 2),
+            "p95_ms": round(self.percentile(0.95), 2),
+            "p99_ms": round(self.percentile(0.99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+@dataclass
+class UsageStats:
+    """Contadores agregados de un conjunto de llamadas."""
+    requests: int = 0
+    failed: int = 0
+    cache_hits: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    thinking_tokens: int = 0
+    cached_tokens: int = 0
+    cost_usd: float = 0.0
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
+
+    def add(self, log: Any) -> None:
+        """Registra un APIConsumptionLog (los cache hits no cuentan como requests)."""
+        if log.cache_hit:
+            self.cache_hits += 1
+            return
+        self.requests += 1
+        self.latency.observe(log.latency_ms)
+        if not log.success:
+            self.failed += 1
+            return
+        self.input_tokens += log.input_tokens
+        self.output_tokens += log.output_tokens
+        self.thinking_tokens += log.thinking_tokens
+        self.cached_tokens += log.cached_tokens
+        self.cost_usd += log.cost_usd
+
+    def merge(self, other: "UsageStats") -> None:
+        self.requests += other.requests
+        self.failed += other.failed
+        self.cache_hits += other.cache_hits
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.thinking_tokens += other.thinking_tokens
+        self.cached_tokens += other.cached_tokens
+        self.cost_usd += other.cost_usd
+        self.latency.merge(other.latency)
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "failed": self.failed,
+            "cache_hits": self.cache_hits,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "thinking_tokens": self.thinking_tokens,
+            "cached_tokens": self.cached_tokens,
+            "total_tokens": self.input_tokens + self.output_tokens + self.thinking_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "latency": self.latency.to_dict(),
+        }
+
+
+class RollingWindow:
+    """Ventana móvil de `span_seconds` dividida en `slots` slots circulares."""
+
+    def __init__(self, span_seconds: int, slots: int):
+        self.span_seconds = span_seconds
+        self.slot_seconds = span_seconds / slots
+        self._epochs = [-1] * slots
+        self._slots: list[dict[tuple[str, str], UsageStats]] = [{} for _ in range(slots)]
+
+    def add(self, log: Any, now: float | None = None) -> None:
+        epoch = int((now if now is not None else time.time()) // self.slot_seconds)
+        index = epoch % len(self._slots)
+        if self._epochs[index] != epoch:
+            # Slot viejo: se recicla
+            self._epochs[index] = epoch
+            self._slots[index] = {}
+        key = (log.model, log.operation)
+        stats = self._slots[index].get(key)
+        if stats is None:
+            stats = self._slots[index][key] = UsageStats()
+        stats.add(log)
+
+    def summary(self, now: float | None = None) -> dict:
+        current = int((now if now is not None else time.time()) // self.slot_seconds)
+        oldest = current - len(self._slots) + 1
+        total = UsageStats()
+        by_model: dict[str, UsageStats] = {}
+        by_operation: dict[str, UsageStats] = {}
+        for epoch, slot in zip(self._epochs, self._slots):
+            if epoch < oldest:
+                continue
+            for (model, operation), stats in slot.items():
+                total.merge(stats)
+                by_model.setdefault(model, UsageStats()).merge(stats)
+                by_operation.setdefault(operation, UsageStats()).merge(stats)
+        return {
+            **total.to_dict(),
+            "by_model": {name: stats.to_dict() for name, stats in by_model.items()},
+            "by_operation": {name: stats.to_dict() for name, stats in by_operation.items()},
+        }
+
+
+class ConsumptionWindows:
+    """Conjunto de ventanas móviles (1m/1h/24h) alimentadas por cada log."""
+
+    def __init__(self):
+        self.windows = {
+            name: RollingWindow(span, slots) for name, (span, slots) in ROLLING_WINDOWS.items()
+        }
+
+    def add(self, log: Any) -> None:
+        now = time.time()
+        for window in self.windows.values():
+            window.add(log, now)
+
+    def summary(self) -> dict:
+        now = time.time()
+        return {name: window.summary(now) for name, window in self.windows.items()}
@@ -0,0 +1,327 @@
+"""
+Persistencia durable del consumo de Gemini en Postgres.
+
+Los APIConsumptionLog se encolan sin bloquear el request y una tarea de fondo
+los inserta por lotes (cada N registros o T segundos, lo que ocurra primero).
+Si la cola se llena o un lote falla, los registros se descartan y se cuentan:
+la telemetría nunca frena las llamadas a Gemini.
+
+Incluye las consultas de agregados (SQL) que sirven el dashboard de consumo
+para cualquier rango de tiempo, sumando todas las instancias.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import and_, case, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from models.consumption import APIConsumptionRecord
+
+logger = logging.getLogger(__name__)
+
+
+def _instance_name() -> str:
+    """Identificador de la instancia (revisión de Cloud Run + host)."""
+    revision = os.getenv("K_REVISION")
+    host = socket.gethostname()
+    return (f"{revision}/{host}" if revision else host)[:100]
+
+
+def log_to_row(log: Any, instance: str | None = None) -> dict:
+    """Convierte un APIConsumptionLog en una fila de api_consumption_logs."""
+    return {
+        "created_at": log.timestamp.astimezone(timezone.utc),  # Los logs usan hora local naive
+        "instance": instance,
+        "model": log.model[:100],
+        "operation": log.operation[:100],
+        "input_tokens": log.input_tokens,
+        "output_tokens": log.output_tokens,
+        "thinking_tokens": log.thinking_tokens,
+        "cached_tokens": log.cached_tokens,
+        "total_tokens": log.total_tokens,
+        "latency_ms": log.latency_ms,
+        "queue_wait_ms": log.queue_wait_ms,
+        "retries": log.retries,
+        "cost_usd": log.cost_usd,
+        "success": log.success,
+        "error": log.error,
+        "cache_hit": log.cache_hit,
+    }
+
+
+class ConsumptionWriter:
+    """Escritor asíncrono por lotes de registros de consumo."""
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue_size: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.instance = _instance_name()
+        self._queue: asyncio.Queue | None = None
+        self._task: asyncio.Task | None = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed_batches = 0
+        self.last_flush_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """Inicia la tarea de escritura (llamar dentro del event loop)."""
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+        logger.info(
+            f"Consumption writer iniciado (lote {self.batch_size}, cada {self.flush_interval}s, "
+            f"instancia {self.instance})"
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Escribe lo pendiente y detiene la tarea."""
+        if not self.running:
+            return
+        try:
+            self._queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self._task.cancel()
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            logger.warning("Consumption writer detenido con registros pendientes")
+        self._task = None
+        self._queue = None
+
+    def enqueue(self, log: Any) -> None:
+        """Encola un log sin bloquear (no-op si el writer no está corriendo)."""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(log_to_row(log, self.instance))
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+        except Exception as e:
+            self.dropped += 1
+            logger.debug(f"No se pudo encolar log de consumo: {e}")
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: list[dict]) -> None:
+        start = time.perf_counter()
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(APIConsumptionRecord), batch)
+                await db.commit()
+            self.written += len(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            self.dropped += len(batch)
+            logger.warning(f"No se pudo persistir lote de consumo ({len(batch)} registros): {e}")
+        self.last_flush_ms = (time.perf_counter() - start) * 1000
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "instance": self.instance,
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_batches": self.failed_batches,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+# ============ AGREGADOS SQL ============
+
+def _aggregate_columns() -> list:
+    """Columnas agregadas comunes (los cache hits no cuentan como requests)."""
+    record = APIConsumptionRecord
+    api_call = record.cache_hit.is_(False)
+    billed = and_(api_call, record.success.is_(True))
+
+    def sum_if(condition, column, label):
+        return func.coalesce(func.sum(case((condition, column), else_=0)), 0).label(label)
+
+    latency = case((api_call, record.latency_ms), else_=None)
+    return [
+        sum_if(api_call, 1, "requests"),
+        sum_if(and_(api_call, record.success.is_(False)), 1, "failed"),
+        sum_if(billed, record.input_tokens, "input_tokens"),
+        sum_if(billed, record.output_tokens, "output_tokens"),
+        sum_if(billed, record.thinking_tokens, "thinking_tokens"),
+        sum_if(billed, record.cached_tokens, "cached_tokens"),
+        sum_if(billed, record.cost_usd, "cost_usd"),
+        sum_if(record.cache_hit.is_(True), 1, "cache_hits"),
+        sum_if(record.cache_hit.is_(True), record.total_tokens, "cache_tokens_saved"),
+        sum_if(record.cache_hit.is_(True), record.cost_usd, "cache_cost_saved_usd"),
+        func.avg(latency).label("avg_ms"),
+        func.percentile_cont(0.50).within_group(latency).label("p50_ms"),
+        func.percentile_cont(0.95).within_group(latency).label("p95_ms"),
+        func.percentile_cont(0.99).within_group(latency).label("p99_ms"),
+    ]
+
+
+def _usage_dict(row: Any) -> dict:
+    requests = int(row.requests or 0)
+    failed = int(row.failed or 0)
+    input_tokens = int(row.input_tokens or 0)
+    output_tokens = int(row.output_tokens or 0)
+    thinking_tokens = int(row.thinking_tokens or 0)
+    return {
+        "total_requests": requests,
+        "failed_requests": failed,
+        "success_rate": (requests - failed) / requests * 100 if requests else 0,
+        "total_input_tokens": input_tokens,
+        "total_output_tokens": output_tokens,
+        "total_thinking_tokens": thinking_tokens,
+        "total_cached_tokens": int(row.cached_tokens or 0),
+        "total_tokens": input_tokens + output_tokens + thinking_tokens,
+        "total_cost_usd": round(float(row.cost_usd or 0), 6),
+        "latency": {
+            "avg_ms": round(float(row.avg_ms or 0), 2),
+            "p50_ms": round(float(row.p50_ms or 0), 2),
+            "p95_ms": round(float(row.p95_ms or 0), 2),
+            "p99_ms": round(float(row.p99_ms or 0), 2),
+        },
+        "cache": {
+            "hits": int(row.cache_hits or 0),
+            "tokens_saved": int(row.cache_tokens_saved or 0),
+            "cost_saved_usd": round(float(row.cache_cost_saved_usd or 0), 6),
+        },
+    }
+
+
+def _time_bucket(start: datetime, end: datetime) -> str:
+    """Granularidad de la serie temporal según el largo del rango."""
+    hours = (end - start).total_seconds() / 3600
+    if hours <= 3:
+        return "minute"
+    if hours <= 24 * 7:
+        return "hour"
+    return "day"
+
+
+async def get_consumption_aggregates(
+    db: AsyncSession,
+    start: datetime,
+    end: datetime,
+    model: str | None = None,
+    operation: str | None = None,
+) -> dict:
+    """Resumen de consumo persistido en [start, end) con filtros opcionales."""
+    record = APIConsumptionRecord
+    filters = [record.created_at >= start, record.created_at < end]
+    if model:
+        filters.append(record.model == model)
+    if operation:
+        filters.append(record.operation == operation)
+    where = and_(*filters)
+    columns = _aggregate_columns()
+
+    totals = (await db.execute(select(*columns).where(where))).one()
+
+    by_model = (await db.execute(
+        select(record.model, *columns).where(where).group_by(record.model)
+    )).all()
+    by_operation = (await db.execute(
+        select(record.operation, *columns).where(where).group_by(record.operation)
+    )).all()
+
+    bucket_name = _time_bucket(start, end)
+    bucket = func.date_trunc(bucket_name, record.created_at).label("bucket")
+    series = (await db.execute(
+        select(bucket, *columns[:7]).where(where).group_by(bucket).order_by(bucket)
+    )).all()
+
+    recent = (await db.execute(
+        select(record).where(where).order_by(record.created_at.desc()).limit(10)
+    )).scalars().all()
+
+    return {
+        "range": {"start": start.isoformat(), "end": end.isoformat(), "bucket": bucket_name},
+        **_usage_dict(totals),
+        "by_model": {row.model: _usage_dict(row) for row in by_model},
+        "by_operation": {row.operation: _usage_dict(row) for row in by_operation},
+        "timeseries": [
+            {
+                "bucket": row.bucket.isoformat(),
+                "requests": int(row.requests or 0),
+                "failed": int(row.failed or 0),
+                "input_tokens": int(row.input_tokens or 0),
+                "output_tokens": int(row.output_tokens or 0),
+                "thinking_tokens": int(row.thinking_tokens or 0),
+                "cached_tokens": int(row.cached_tokens or 0),
+                "cost_usd": round(float(row.cost_usd or 0), 6),
+            }
+            for row in series
+        ],
+        "recent_logs": [
+            {
+                "timestamp": r.created_at.isoformat(),
+                "instance": r.instance,
+                "model": r.model,
+                "operation": r.operation,
+                "input_tokens": r.input_tokens,
+                "output_tokens": r.output_tokens,
+                "total_tokens": r.total_tokens,
+                "thinking_tokens": r.thinking_tokens,
+                "cached_tokens": r.cached_tokens,
+                "latency_ms": round(r.latency_ms, 2),
+                "queue_wait_ms": round(r.queue_wait_ms, 2),
+                "retries": r.retries,
+                "cost_usd": round(r.cost_usd, 6),
+                "success": r.success,
+                "error": r.error,
+                "cache_hit": r.cache_hit,
+            }
+            for r in recent
+        ],
+    }
+
+
+# Singleton instance
+_consumption_writer: ConsumptionWriter | None = None
+
+
+def get_consumption_writer() -> ConsumptionWriter:
+    """Get or create the consumption writer."""
+    global _consumption_writer
+    if _consumption_writer is None:
+        _consumption_writer = ConsumptionWriter(
+            batch_size=settings.CONSUMPTION_FLUSH_BATCH_SIZE,
+            flush_interval=settings.CONSUMPTION_FLUSH_INTERVAL_SECONDS,
+            max_queue_size=settings.CONSUMPTION_QUEUE_MAX_SIZE,
+        )
+    return _consumption_writer
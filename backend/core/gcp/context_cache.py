@@ -0,0 +1,229 @@
+"""
+Context caching de Gemini por RFP.
+
+La generación de preguntas envía el contexto compacto del RFP
+(build_prompt_context). Si alcanza el mínimo de la API, ese mismo bloque se
+sube una vez (client.aio.caches) y se reutiliza el handle en las
+regeneraciones vía `cached_content`.
+
+No se precarga el documento al analizar: las preguntas se generan al decidir
+GO, en general mucho después del TTL, y el documento completo se cobraría
+como input cacheado en cada llamada.
+
+- El handle es por (RFP, modelo): el contenido cacheado solo sirve para el
+  modelo con el que se creó
+- Solo se reutiliza un handle cuyo hash coincide con el contenido que se
+  enviaría en línea; si cambió, se reemplaza
+- El TTL se renueva al usar el handle cuando queda menos de la mitad
+- Documentos por debajo del mínimo de tokens de la API no se cachean
+- Cualquier error deja la llamada en el camino normal (sin caché)
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from google.genai import types
+
+from core.config import settings
+from core.gcp.gemini_cache import hash_text
+from core.gcp.gemini_governor import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ContextHandle:
+    """Contexto cacheado en Gemini para un RFP."""
+    name: str
+    model: str
+    content_hash: str
+    tokens: int
+    expires_at: float
+    uses: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "tokens": self.tokens,
+            "uses": self.uses,
+            "expires_in_s": max(0, round(self.expires_at - time.time())),
+        }
+
+
+@dataclass
+class ContextCacheStats:
+    """Métricas del context caching."""
+    created: int = 0
+    reused: int = 0
+    refreshed: int = 0
+    released: int = 0
+    skipped_small: int = 0
+    failures: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "reused": self.reused,
+            "refreshed": self.refreshed,
+            "released": self.released,
+            "skipped_small": self.skipped_small,
+            "failures": self.failures,
+        }
+
+
+class RFPContextCache:
+    """Registro en proceso de handles de contexto cacheado por RFP."""
+
+    def __init__(self, ttl_seconds: int, min_tokens: int):
+        self.ttl_seconds = ttl_seconds
+        self.min_tokens = min_tokens
+        self.stats = ContextCacheStats()
+        self._handles: dict[tuple[str, str], ContextHandle] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def _sweep(self) -> None:
+        """
+        Olvida los handles expirados (la API ya los eliminó por TTL) y los
+        locks de RFPs sin handles, para que el registro no crezca con cada
+        RFP procesado. Un lock tomado se conserva.
+        """
+        now = time.time()
+        for key in [k for k, h in self._handles.items() if h.expires_at <= now]:
+            del self._handles[key]
+        active = {rfp_id for rfp_id, _ in self._handles}
+        for rfp_id in [r for r, lock in self._locks.items() if r not in active and not lock.locked()]:
+            del self._locks[rfp_id]
+
+    def _lock(self, rfp_id: str) -> asyncio.Lock:
+        if rfp_id not in self._locks:
+            self._locks[rfp_id] = asyncio.Lock()
+        return self._locks[rfp_id]
+
+    def _ttl(self) -> str:
+        return f"{self.ttl_seconds}s"
+
+    async def _refresh(self, client, handle: ContextHandle) -> None:
+        """Extiende el TTL si queda menos de la mitad."""
+        if handle.expires_at - time.time() > self.ttl_seconds / 2:
+            return
+        await client.aio.caches.update(
+            name=handle.name,
+            config=types.UpdateCachedContentConfig(ttl=self._ttl()),
+        )
+        handle.expires_at = time.time() + self.ttl_seconds
+        self.stats.refreshed += 1
+
+    async def _delete(self, client, handle: ContextHandle) -> None:
+        try:
+            await client.aio.caches.delete(name=handle.name)
+            self.stats.released += 1
+        except Exception as e:
+            logger.debug(f"No se pudo eliminar contexto {handle.name}: {e}")
+
+    async def _create(self, client, rfp_id: str, model: str, content: str) -> ContextHandle | None:
+        tokens = estimate_tokens(content)
+        if tokens < self.min_tokens:
+            self.stats.skipped_small += 1
+            logger.debug(f"Contexto del RFP {rfp_id} muy pequeño para cachear (~{tokens} tokens)")
+            return None
+
+        cached = await client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                contents=[types.Content(role="user", parts=[types.Part(text=content)])],
+                display_name=f"rfp-{rfp_id}",
+                ttl=self._ttl(),
+            ),
+        )
+        usage = getattr(cached, "usage_metadata", None)
+        handle = ContextHandle(
+            name=cached.name,
+            model=model,
+            content_hash=hash_text(content),
+            tokens=getattr(usage, "total_token_count", None) or tokens,
+            expires_at=time.time() + self.ttl_seconds,
+        )
+        self._handles[(rfp_id, model)] = handle
+        self.stats.created += 1
+        logger.info(f"Contexto cacheado para RFP {rfp_id} ({model}, {handle.tokens:,} tokens)")
+        return handle
+
+    async def acquire(
+        self,
+        client,
+        rfp_id: str,
+        model: str,
+        content: str | None = None,
+    ) -> ContextHandle | None:
+        """
+        Retorna el handle del RFP para el modelo, renovando su TTL.
+
+        Si se entrega `content`, el handle solo se reutiliza si se creó con
+        ese mismo contenido; si no existe (o cambió), lo crea. Sin `content`
+        solo reutiliza un handle ya creado (no paga la subida).
+        """
+        self._sweep()
+        async with self._lock(rfp_id):
+            handle = self._handles.get((rfp_id, model))
+            if handle is not None and handle.expires_at <= time.time():
+                self._handles.pop((rfp_id, model), None)
+                handle = None
+            if handle is not None and content and handle.content_hash != hash_text(content):
+                # Los datos del RFP cambiaron: el handle ya no equivale al prompt
+                self._handles.pop((rfp_id, model), None)
+                await self._delete(client, handle)
+                handle = None
+
+            try:
+                if handle is not None:
+                    await self._refresh(client, handle)
+                    handle.uses += 1
+                    self.stats.reused += 1
+                    return handle
+                if content:
+                    return await self._create(client, rfp_id, model, content)
+            except Exception as e:
+                self.stats.failures += 1
+                self._handles.pop((rfp_id, model), None)
+                logger.warning(f"Context cache no disponible para RFP {rfp_id}: {e}")
+            return None
+
+    def invalidate(self, rfp_id: str, model: str) -> None:
+        """Olvida el handle local (p.ej. la API respondió que ya no existe)."""
+        self._handles.pop((rfp_id, model), None)
+
+    async def release(self, client, rfp_id: str) -> None:
+        """Elimina los contextos cacheados del RFP (al borrarlo)."""
+        async with self._lock(rfp_id):
+            for key in [k for k in self._handles if k[0] == rfp_id]:
+                await self._delete(client, self._handles.pop(key))
+
+    def get_stats(self) -> dict:
+        now = time.time()
+        active = [h for h in self._handles.values() if h.expires_at > now]
+        return {
+            **self.stats.to_dict(),
+            "active_handles": len(active),
+            "cached_tokens": sum(h.tokens for h in active),
+            "ttl_minutes": round(self.ttl_seconds / 60, 1),
+        }
+
+
+# Singleton instance
+_context_cache: RFPContextCache | None = None
+
+
+def get_context_cache() -> RFPContextCache | None:
+    """Get or create the context cache registry (None si está deshabilitado)."""
+    global _context_cache
+    if not settings.GEMINI_CONTEXT_CACHE_ENABLED:
+        return None
+    if _context_cache is None:
+        _context_cache = RFPContextCache(
+            ttl_seconds=int(settings.GEMINI_CONTEXT_CACHE_TTL_MINUTES * 60),
+            min_tokens=settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS,
+        )
+    return _context_cache
@@ -0,0 +1,266 @@
+"""
+Caché persistente de respuestas de Gemini (content-addressed).
+
+La clave es el hash de (modelo, configuración de generación, hash del prompt,
+hash del contenido), de modo que subir el mismo RFP, regenerar preguntas o
+recalcular recomendaciones con las mismas entradas no vuelve a pagar la llamada.
+
+Se persiste en SQLite (stdlib) con TTL y expulsión LRU por tamaño total:
+
+- `aget`/`aset` corren la consulta en un hilo (asyncio.to_thread) para no
+  bloquear el event loop
+- El tamaño y la cantidad de entradas se llevan en contadores en memoria;
+  no se recorre la tabla en cada escritura ni en get_stats
+- Los expirados se purgan a lo sumo cada PURGE_INTERVAL_SECONDS (al leer,
+  una entrada expirada se descarta igual)
+
+GEMINI_CACHE_PATH debe apuntar a un disco persistente: en Cloud Run el
+directorio temporal vive en memoria (cuenta contra la RAM de la instancia)
+y se pierde al reiniciarla.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo entre purgas de entradas expiradas
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def hash_text(value: str | bytes) -> str:
+    """SHA-256 hex de un texto o bytes."""
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    return hashlib.sha256(value).hexdigest()
+
+
+def make_cache_key(model: str, config: dict[str, Any], prompt: str, content: Any = "") -> str:
+    """
+    Clave determinista para una llamada.
+
+    Args:
+        model: Modelo de Gemini
+        config: Configuración de generación (solo valores serializables)
+        prompt: Instrucciones
+        content: Documento / datos (str o estructura JSON-serializable)
+    """
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, sort_keys=True, default=str)
+    material = json.dumps(
+        {
+            "model": model,
+            "config": config,
+            "prompt": hash_text(prompt),
+            "content": hash_text(content),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hash_text(material)
+
+
+@dataclass
+class CachedResponse:
+    """Respuesta almacenada con el consumo original (para contabilizar ahorro)."""
+    value: Any
+    model: str
+    input_tokens: int
+    output_tokens: int
+    thinking_tokens: int
+    cost_usd: float
+    created_at: float
+
+
+class GeminiResponseCache:
+    """Caché SQLite con TTL y expulsión LRU por tamaño."""
+
+    def __init__(self, path: Path, ttl_seconds: float, max_bytes: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                operation TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                input_tokens INTEGER DEFAULT 0,
+                output_tokens INTEGER DEFAULT 0,
+                thinking_tokens INTEGER DEFAULT 0,
+                cost_usd REAL DEFAULT 0,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses(created_at)")
+        self._conn.commit()
+        self._entries = 0
+        self._size_bytes = 0
+        self._hits = 0
+        self._next_purge = 0.0
+        self._load_totals()
+
+    def _load_totals(self) -> None:
+        """Recalcula los contadores (al abrir y tras purgar: corrige la deriva
+        si otro proceso escribe en el mismo archivo)."""
+        self._entries, self._size_bytes, self._hits = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0), COALESCE(SUM(hits), 0) FROM responses"
+        ).fetchone()
+
+    async def aget(self, key: str) -> CachedResponse | None:
+        """get sin bloquear el event loop."""
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, value: Any, model: str, operation: str, log: Any = None) -> None:
+        """set sin bloquear el event loop."""
+        await asyncio.to_thread(self.set, key, value, model, operation, log)
+
+    def get(self, key: str) -> CachedResponse | None:
+        """Retorna la respuesta si existe y no expiró."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, model, input_tokens, output_tokens, thinking_tokens, cost_usd, created_at, size_bytes "
+                "FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds and row[6] + self.ttl_seconds < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self._entries -= 1
+                self._size_bytes -= row[7]
+                return None
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?",
+                (now, key),
+            )
+            self._conn.commit()
+            self._hits += 1
+
+        return CachedResponse(
+            value=json.loads(row[0]),
+            model=row[1],
+            input_tokens=row[2],
+            output_tokens=row[3],
+            thinking_tokens=row[4],
+            cost_usd=row[5],
+            created_at=row[6],
+        )
+
+    def set(self, key: str, value: Any, model: str, operation: str, log: Any = None) -> None:
+        """Guarda una respuesta y aplica TTL/expulsión por tamaño."""
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        size = len(payload.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute(
+                "SELECT size_bytes, hits FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(key, model, operation, value, size_bytes, input_tokens, output_tokens, "
+                " thinking_tokens, cost_usd, created_at, last_access, hits) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                (
+                    key, model, operation, payload, size,
+                    getattr(log, "input_tokens", 0), getattr(log, "output_tokens", 0),
+                    getattr(log, "thinking_tokens", 0), getattr(log, "cost_usd", 0.0),
+                    now, now,
+                ),
+            )
+            if previous is None:
+                self._entries += 1
+            else:
+                self._size_bytes -= previous[0]
+                self._hits -= previous[1]
+            self._size_bytes += size
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """Purga expirados (cada PURGE_INTERVAL_SECONDS) y, si se excede
+        max_bytes, expulsa las entradas menos usadas."""
+        if self.ttl_seconds and now >= self._next_purge:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._load_totals()
+            self._next_purge = now + PURGE_INTERVAL_SECONDS
+
+        if self._size_bytes <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)  # Margen para no expulsar en cada escritura
+        evicted = 0
+        for key, size, hits in self._conn.execute(
+            "SELECT key, size_bytes, hits FROM responses ORDER BY last_access ASC"
+        ).fetchall():
+            if self._size_bytes <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._entries -= 1
+            self._size_bytes -= size
+            self._hits -= hits
+            evicted += 1
+        logger.info(f"Gemini cache: {evicted} entradas expulsadas por tamaño")
+
+    def get_stats(self) -> dict:
+        """Métricas desde los contadores en memoria (sin consultar la tabla)."""
+        return {
+            "entries": self._entries,
+            "size_mb": round(self._size_bytes / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "stored_hits": self._hits,
+            "ttl_hours": round(self.ttl_seconds / 3600, 1) if self.ttl_seconds else None,
+        }
+
+
+# Singleton instance
+_response_cache: GeminiResponseCache | None = None
+_cache_init_failed = False
+
+
+def get_response_cache() -> GeminiResponseCache | None:
+    """Get or create the response cache (None si está deshabilitada o no se pudo abrir)."""
+    global _response_cache, _cache_init_failed
+    if not settings.GEMINI_CACHE_ENABLED or _cache_init_failed:
+        return None
+    if _response_cache is None:
+        path = Path(settings.GEMINI_CACHE_PATH or Path(tempfile.gettempdir()) / "gemini_response_cache.sqlite3")
+        try:
+            _response_cache = GeminiResponseCache(
+                path=path,
+                ttl_seconds=settings.GEMINI_CACHE_TTL_HOURS * 3600,
+                max_bytes=settings.GEMINI_CACHE_MAX_MB * 1024 * 1024,
+            )
+            logger.info(f"Gemini response cache: {path}")
+            if not settings.GEMINI_CACHE_PATH:
+                logger.warning(
+                    "GEMINI_CACHE_PATH no configurado: la caché de respuestas queda en el directorio "
+                    "temporal (en Cloud Run vive en memoria y se pierde al reiniciar la instancia)"
+                )
+        except Exception as e:
+            _cache_init_failed = True
+            logger.warning(f"No se pudo abrir la caché de respuestas de Gemini: {e}")
+            return None
+    return _response_cache
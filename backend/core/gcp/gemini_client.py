@@ -5,20 +5,41 @@ Usa API Key para autenticación directa con Gemini 3 Pro.
 import json
 import logging
 import os
-import re
+import asyncio
 import time
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Literal
+from typing import Any, AsyncIterator, Awaitable, Literal
 
 from google import genai
 from google.genai import types
-import asyncio
 
 from core.config import settings
+from core.gcp.consumption_stats import ConsumptionWindows, LatencyHistogram
+from core.gcp.consumption_writer import get_consumption_writer
+from core.gcp.context_cache import ContextHandle, get_context_cache
+from core.gcp.prompt_context import build_prompt_context
+from core.gcp.gemini_cache import get_response_cache, hash_text, make_cache_key
+from core.gcp.model_cascade import CascadeScore, cascade_stats, score_analysis, should_escalate
+from core.gcp.response_schemas import QUESTIONS_SCHEMA, supports_response_schema
+from core.gcp.single_flight import make_flight_key, single_flight
+from core.gcp.token_budget import token_budget_stats
+from core.gcp.gemini_governor import (
+    error_status_code,
+    estimate_tokens,
+    get_gemini_governor,
+    get_rate_limiter,
+    get_retry_policy,
+    get_scheduling_stats,
+    is_retryable,
+)
 
 logger = logging.getLogger(__name__)
 
+# Decoder reutilizable para el scanner de JSON embebido en texto
+JSON_DECODER = json.JSONDecoder()
+
 
 # Precios por 1M de tokens (USD) - Gemini 3 y 2.5 (Enero 2026)
 # Fuente: https://ai.google.dev/gemini-api/docs/pricing
@@ -28,11 +49,13 @@ PRICING = {
         "input": 2.00,      # $2.00 / 1M input tokens (<=200K), $4.00 (>200K)
         "output": 12.00,    # $12.00 / 1M output tokens (<=200K), $18.00 (>200K)
         "thinking": 12.00,  # Tokens de pensamiento incluidos en output
+        "cached_input": 0.20,  # Tokens leídos desde context cache
     },
     "gemini-3-flash-preview": {
         "input": 0.50,      # $0.50 / 1M input tokens
         "output": 3.00,     # $3.00 / 1M output tokens
         "thinking": 3.00,   # Tokens de pensamiento incluidos en output
+        "cached_input": 0.05,  # Tokens leídos desde context cache
     },
     # Gemini 2.5 - Modelos estables
     "gemini-2.5-pro-preview": {
@@ -47,6 +70,11 @@ PRICING = {
         "input": 0.10,      # $0.10 / 1M input tokens
         "output": 0.40,     # $0.40 / 1M output tokens
     },
+    # Embeddings (pre-ranking de experiencias)
+    "gemini-embedding-001": {
+        "input": 0.15,      # $0.15 / 1M input tokens
+        "output": 0.0,
+    },
     # Fallback para modelos no listados
     "default": {
         "input": 2.00,
@@ -55,12 +83,33 @@ PRICING = {
 }
 
 
-def calculate_cost(model: str, input_tokens: int, output_tokens: int, thinking_tokens: int = 0) -> float:
-    """Calcula el costo en USD basado en tokens consumidos."""
+# Fracción del precio de input para tokens cacheados en modelos sin precio explícito
+CACHED_INPUT_PRICE_RATIO = 0.25
+
+# Textos por llamada a embed_content
+EMBED_BATCH_SIZE = 100
+
+
+def calculate_cost(
+    model: str,
+    input_tokens: int,
+    output_tokens: int,
+    thinking_tokens: int = 0,
+    cached_tokens: int = 0,
+) -> float:
+    """
+    Calcula el costo en USD basado en tokens consumidos.
+    
+    `cached_tokens` es la parte de `input_tokens` servida desde context cache
+    (se cobra a tarifa reducida; no incluye el costo de almacenamiento).
+    """
     pricing = PRICING.get(model, PRICING["default"])
+    cached_tokens = min(cached_tokens, input_tokens)
+    cached_price = pricing.get("cached_input", pricing["input"] * CACHED_INPUT_PRICE_RATIO)
     
     cost = (
-        (input_tokens / 1_000_000) * pricing["input"] +
+        ((input_tokens - cached_tokens) / 1_000_000) * pricing["input"] +
+        (cached_tokens / 1_000_000) * cached_price +
         (output_tokens / 1_000_000) * pricing["output"]
     )
     
@@ -81,10 +130,14 @@ class APIConsumptionLog:
     output_tokens: int = 0
     total_tokens: int = 0
     thinking_tokens: int = 0
+    cached_tokens: int = 0  # Parte del input servida desde context cache
     latency_ms: float = 0
+    queue_wait_ms: float = 0
+    retries: int = 0
     cost_usd: float = 0.0
     success: bool = True
     error: str | None = None
+    cache_hit: bool = False
     
     def to_dict(self) -> dict:
         return {
@@ -95,33 +148,72 @@ class APIConsumptionLog:
             "output_tokens": self.output_tokens,
             "total_tokens": self.total_tokens,
             "thinking_tokens": self.thinking_tokens,
+            "cached_tokens": self.cached_tokens,
             "latency_ms": round(self.latency_ms, 2),
+            "queue_wait_ms": round(self.queue_wait_ms, 2),
+            "retries": self.retries,
             "cost_usd": round(self.cost_usd, 6),
             "success": self.success,
             "error": self.error,
+            "cache_hit": self.cache_hit,
         }
 
 
+# Llamadas recientes que se conservan en memoria (ring buffer)
+RECENT_LOGS_SIZE = 200
+
+
 @dataclass
 class ConsumptionTracker:
-    """Tracker para monitorear consumo total de API."""
-    logs: list[APIConsumptionLog] = field(default_factory=list)
+    """
+    Tracker para monitorear consumo total de API.
+    
+    Memoria constante: solo las últimas RECENT_LOGS_SIZE llamadas se guardan
+    completas; los totales, las ventanas 1m/1h/24h y los histogramas de
+    latencia se actualizan de forma incremental en cada log.
+    """
+    logs: deque[APIConsumptionLog] = field(default_factory=lambda: deque(maxlen=RECENT_LOGS_SIZE))
+    windows: ConsumptionWindows = field(default_factory=ConsumptionWindows)
+    latency: LatencyHistogram = field(default_factory=LatencyHistogram)
     total_input_tokens: int = 0
     total_output_tokens: int = 0
     total_thinking_tokens: int = 0
+    total_cached_tokens: int = 0
     total_requests: int = 0
     failed_requests: int = 0
     total_cost_usd: float = 0.0
+    # Respuestas servidas desde caché (no cuentan como requests ni costo)
+    cache_hits: int = 0
+    cache_tokens_saved: int = 0
+    cache_cost_saved_usd: float = 0.0
+    
+    def add_cache_hit(self, log: APIConsumptionLog):
+        """Registra una respuesta servida desde la caché (sin llamada a la API)."""
+        self.logs.append(log)
+        self.windows.add(log)
+        get_consumption_writer().enqueue(log)
+        self.cache_hits += 1
+        self.cache_tokens_saved += log.total_tokens
+        self.cache_cost_saved_usd += log.cost_usd
+        logger.info(
+            f"💾 GEMINI CACHE HIT | {log.operation} | {log.model} | "
+            f"ahorro: {log.total_tokens:,} tokens, ${log.cost_usd:.6f} USD "
+            f"(sesión: {self.cache_hits} hits, ${self.cache_cost_saved_usd:.6f} USD)"
+        )
     
     def add_log(self, log: APIConsumptionLog):
         """Agrega un log y actualiza totales."""
         self.logs.append(log)
+        self.windows.add(log)
+        get_consumption_writer().enqueue(log)
+        self.latency.observe(log.latency_ms)
         self.total_requests += 1
         
         if log.success:
             self.total_input_tokens += log.input_tokens
             self.total_output_tokens += log.output_tokens
             self.total_thinking_tokens += log.thinking_tokens
+            self.total_cached_tokens += log.cached_tokens
             self.total_cost_usd += log.cost_usd
         else:
             self.failed_requests += 1
@@ -140,9 +232,9 @@ class ConsumptionTracker:
             f"🔧 Operation: {log.operation}\n"
             f"🤖 Model: {log.model}\n"
             f"📊 Status: {status}\n"
-            f"⏱️  Latency: {log.latency_ms:.2f}ms\n"
+            f"⏱️  Latency: {log.latency_ms:.2f}ms (queue: {log.queue_wait_ms:.2f}ms, retries: {log.retries})\n"
             f"{'─'*70}\n"
-            f"📥 Input Tokens:    {log.input_tokens:>10,}\n"
+            f"📥 Input Tokens:    {log.input_tokens:>10,} (cached: {log.cached_tokens:,})\n"
             f"📤 Output Tokens:   {log.output_tokens:>10,}\n"
             f"🧠 Thinking Tokens: {log.thinking_tokens:>10,}\n"
             f"📊 Total Tokens:    {log.total_tokens:>10,}\n"
@@ -160,6 +252,8 @@ class ConsumptionTracker:
     
     def get_summary(self) -> dict:
         """Retorna resumen de consumo."""
+        response_cache = get_response_cache()
+        context_cache = get_context_cache()
         return {
             "total_requests": self.total_requests,
             "failed_requests": self.failed_requests,
@@ -172,7 +266,28 @@ class ConsumptionTracker:
             "total_thinking_tokens": self.total_thinking_tokens,
             "total_tokens": self.total_input_tokens + self.total_output_tokens + self.total_thinking_tokens,
             "total_cost_usd": round(self.total_cost_usd, 6),
-            "recent_logs": [log.to_dict() for log in self.logs[-10:]],
+            "cache": {
+                "hits": self.cache_hits,
+                "hit_rate": (
+                    self.cache_hits / (self.cache_hits + self.total_requests) * 100
+                    if (self.cache_hits + self.total_requests) > 0 else 0
+                ),
+                "tokens_saved": self.cache_tokens_saved,
+                "cost_saved_usd": round(self.cache_cost_saved_usd, 6),
+                "store": response_cache.get_stats() if response_cache else None,
+            },
+            "context_cache": {
+                "cached_input_tokens": self.total_cached_tokens,
+                **(context_cache.get_stats() if context_cache else {"enabled": False}),
+            },
+            "latency": self.latency.to_dict(),
+            "windows": self.windows.summary(),
+            "persistence": get_consumption_writer().get_stats(),
+            "cascade": cascade_stats.to_dict(),
+            "coalescing": single_flight.get_stats(),
+            "token_budget": token_budget_stats.to_dict(),
+            "recent_logs": [log.to_dict() for log in list(self.logs)[-10:]],
+            **get_scheduling_stats(),
         }
 
 
@@ -200,8 +315,19 @@ ANALYSIS_MODES = {
         "max_output_tokens": 16384,
         "description": "Análisis profundo con Gemini 3 Pro (máxima calidad)",
     },
+    "cascade": {
+        "model": "gemini-3-flash-preview",
+        "temperature": 0.2,
+        "max_output_tokens": 8192,
+        # Modos que se ejecutan en orden hasta que el resultado supere el umbral
+        "tiers": ("fast", "balanced"),
+        "description": "Cascada: Gemini 3 Flash, escala a Gemini 3 Pro si el resultado es débil",
+    },
 }
 
+# Modelo para análisis con Google Search (mejor balance calidad/precio con grounding)
+GROUNDING_MODEL = "gemini-3-flash-preview"
+
 
 class GeminiClient:
     """Cliente para interactuar con Gemini via Google Gen AI SDK."""
@@ -226,61 +352,362 @@ class GeminiClient:
         """
         Extrae JSON válido de un texto que puede contener datos extra.
         Maneja casos donde Gemini devuelve JSON con texto adicional.
+        
+        Recorrido lineal: se intenta json.loads y luego JSONDecoder.raw_decode
+        desde cada '{' o '[' candidato; si un intento falla, el siguiente
+        candidato se busca después del punto donde falló (cada carácter se
+        decodifica a lo sumo una vez).
         """
         if text is None:
             raise ValueError("Response text is None - model may have returned empty response")
         
         text = text.strip()
         
-        # Primero intentar parsear directamente
+        # Primero intentar parsear directamente (caso normal con response_schema)
         try:
             return json.loads(text)
         except json.JSONDecodeError:
             pass
         
-        # Buscar array JSON
-        if '[' in text:
-            start = text.find('[')
-            # Encontrar el cierre correspondiente
-            depth = 0
-            for i, char in enumerate(text[start:], start):
-                if char == '[':
-                    depth += 1
-                elif char == ']':
-                    depth -= 1
-                    if depth == 0:
-                        try:
-                            return json.loads(text[start:i+1])
-                        except json.JSONDecodeError:
-                            break
-        
-        # Buscar objeto JSON
-        if '{' in text:
-            start = text.find('{')
-            depth = 0
-            for i, char in enumerate(text[start:], start):
-                if char == '{':
-                    depth += 1
-                elif char == '}':
-                    depth -= 1
-                    if depth == 0:
-                        try:
-                            return json.loads(text[start:i+1])
-                        except json.JSONDecodeError:
-                            break
-        
-        # Último intento: buscar con regex
-        json_pattern = r'(\[[\s\S]*\]|\{[\s\S]*\})'
-        matches = re.findall(json_pattern, text)
-        for match in matches:
+        position = 0
+        while True:
+            candidates = [i for i in (text.find("{", position), text.find("[", position)) if i != -1]
+            if not candidates:
+                break
+            start = min(candidates)
             try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
+                value, _ = JSON_DECODER.raw_decode(text, start)
+                return value
+            except json.JSONDecodeError as e:
+                position = max(e.pos, start + 1)
         
         # Si nada funciona, lanzar error
         raise json.JSONDecodeError("No valid JSON found", text, 0)
     
+    async def _generate_content(
+        self,
+        model: str,
+        contents: Any,
+        config: dict[str, Any],
+        log: APIConsumptionLog | None = None,
+    ):
+        """
+        Llamada nativa async a Gemini (client.aio) a través del gobernador de concurrencia.
+        No consume threads del executor por defecto.
+        
+        - Espera cuota RPM/TPM (token buckets) antes de ocupar un slot
+        - Reintenta 429/5xx/errores de red con backoff exponencial + jitter,
+          respetando retry-after; el slot se libera mientras se espera
+        """
+        governor = get_gemini_governor()
+        rate_limiter = get_rate_limiter()
+        retry_policy = get_retry_policy()
+        estimated = estimate_tokens(contents)
+        attempt = 0
+        
+        while True:
+            wait_ms = await rate_limiter.acquire(model, estimated)
+            try:
+                async with governor.slot(model) as slot_wait_ms:
+                    wait_ms += slot_wait_ms
+                    response = await self.client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+            except Exception as e:
+                if log is not None:
+                    log.queue_wait_ms += wait_ms
+                attempt += 1
+                if not is_retryable(e) or attempt > retry_policy.max_retries:
+                    if attempt > 1 and is_retryable(e):
+                        retry_policy.stats.exhausted += 1
+                    raise
+                
+                delay = retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    retry_policy.stats.exhausted += 1
+                    logger.warning(f"Gemini {model}: retry-after excede el presupuesto de reintentos ({e})")
+                    raise
+                retry_policy.record(attempt, e)
+                if log is not None:
+                    log.retries = attempt
+                logger.warning(
+                    f"Gemini {model} falló ({e}); reintento {attempt}/{retry_policy.max_retries} en {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            
+            if log is not None:
+                log.queue_wait_ms += wait_ms
+            input_tokens, _, _ = self._extract_token_counts(response)
+            rate_limiter.settle(model, estimated, input_tokens)
+            if "cached_content" not in config:
+                token_budget_stats.record_usage(estimated, input_tokens)
+            return response
+    
+    async def _generate_content_stream(
+        self,
+        model: str,
+        contents: Any,
+        config: dict[str, Any],
+        log: APIConsumptionLog | None = None,
+    ) -> AsyncIterator[Any]:
+        """
+        Variante streaming de `_generate_content` (generate_content_stream).
+        
+        Mantiene el slot del gobernador mientras se consumen los fragmentos.
+        Solo se reintenta si el error ocurre antes del primer fragmento
+        (después ya se entregó contenido parcial al consumidor).
+        """
+        governor = get_gemini_governor()
+        rate_limiter = get_rate_limiter()
+        retry_policy = get_retry_policy()
+        estimated = estimate_tokens(contents)
+        attempt = 0
+        
+        while True:
+            wait_ms = await rate_limiter.acquire(model, estimated)
+            started = False
+            last_chunk = None
+            try:
+                async with governor.slot(model) as slot_wait_ms:
+                    wait_ms += slot_wait_ms
+                    if log is not None:
+                        log.queue_wait_ms += wait_ms
+                    stream = await self.client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+                    async for chunk in stream:
+                        started = True
+                        last_chunk = chunk
+                        yield chunk
+            except Exception as e:
+                attempt += 1
+                if started or not is_retryable(e) or attempt > retry_policy.max_retries:
+                    if not started and attempt > 1 and is_retryable(e):
+                        retry_policy.stats.exhausted += 1
+                    raise
+                
+                delay = retry_policy.delay_for(attempt, e)
+                if delay is None:
+                    retry_policy.stats.exhausted += 1
+                    logger.warning(f"Gemini stream {model}: retry-after excede el presupuesto de reintentos ({e})")
+                    raise
+                retry_policy.record(attempt, e)
+                if log is not None:
+                    log.retries = attempt
+                logger.warning(
+                    f"Gemini stream {model} falló ({e}); reintento {attempt}/{retry_policy.max_retries} en {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            
+            input_tokens = self._extract_token_counts(last_chunk)[0] if last_chunk is not None else 0
+            rate_limiter.settle(model, estimated, input_tokens)
+            if "cached_content" not in config:
+                token_budget_stats.record_usage(estimated, input_tokens)
+            return
+    
+    async def count_tokens(self, model: str, contents: Any) -> int | None:
+        """Cuenta los tokens de entrada con la API (None si no se pudo)."""
+        try:
+            response = await self.client.aio.models.count_tokens(model=model, contents=contents)
+            return response.total_tokens
+        except Exception as e:
+            logger.warning(f"No se pudieron contar tokens con {model}: {e}")
+            return None
+    
+    async def embed_texts(self, texts: list[str], task_type: str = "RETRIEVAL_DOCUMENT") -> list[list[float]]:
+        """
+        Embeddings de `texts` con GEMINI_EMBEDDING_MODEL, en lotes.
+        
+        Args:
+            task_type: RETRIEVAL_DOCUMENT para la biblioteca, RETRIEVAL_QUERY
+                para el texto con que se busca (el RFP)
+        """
+        model = settings.GEMINI_EMBEDDING_MODEL
+        vectors: list[list[float]] = []
+        for start in range(0, len(texts), EMBED_BATCH_SIZE):
+            batch = texts[start:start + EMBED_BATCH_SIZE]
+            start_time = time.time()
+            # La API de embeddings no informa tokens: se estiman
+            tokens = estimate_tokens(batch)
+            log = APIConsumptionLog(
+                timestamp=datetime.now(),
+                model=model,
+                operation="embed_content",
+                input_tokens=tokens,
+                total_tokens=tokens,
+                cost_usd=calculate_cost(model, tokens, 0),
+            )
+            try:
+                response = await self.client.aio.models.embed_content(
+                    model=model,
+                    contents=batch,
+                    config=types.EmbedContentConfig(
+                        task_type=task_type,
+                        output_dimensionality=settings.EMBEDDING_DIMENSIONS,
+                    ),
+                )
+                vectors.extend(list(embedding.values) for embedding in response.embeddings)
+            except Exception as e:
+                log.success = False
+                log.error = str(e)
+                logger.error(f"Error generating embeddings: {e}")
+                raise
+            finally:
+                log.latency_ms = (time.time() - start_time) * 1000
+                consumption_tracker.add_log(log)
+        return vectors
+    
+    def _cache_key(
+        self,
+        use_cache: bool,
+        model: str,
+        config: dict[str, Any],
+        prompt: str,
+        content: Any = "",
+    ) -> str | None:
+        """Clave de caché de la llamada, o None si la caché no aplica."""
+        if not use_cache or get_response_cache() is None:
+            return None
+        return make_cache_key(model, config, prompt, content)
+    
+    async def _get_cached(self, cache_key: str | None, operation: str) -> Any | None:
+        """Busca la respuesta en caché y registra el hit en el tracker."""
+        if not cache_key:
+            return None
+        try:
+            cached = await get_response_cache().aget(cache_key)
+        except Exception as e:
+            logger.warning(f"Error leyendo caché de Gemini: {e}")
+            return None
+        if cached is None:
+            return None
+        
+        consumption_tracker.add_cache_hit(APIConsumptionLog(
+            timestamp=datetime.now(),
+            model=cached.model,
+            operation=operation,
+            input_tokens=cached.input_tokens,
+            output_tokens=cached.output_tokens,
+            thinking_tokens=cached.thinking_tokens,
+            total_tokens=cached.input_tokens + cached.output_tokens + cached.thinking_tokens,
+            cost_usd=cached.cost_usd,
+            cache_hit=True,
+        ))
+        return cached.value
+    
+    async def _store_cached(self, cache_key: str | None, value: Any, log: APIConsumptionLog) -> None:
+        """Guarda una respuesta exitosa en la caché."""
+        if not cache_key:
+            return
+        try:
+            await get_response_cache().aset(cache_key, value, log.model, log.operation, log)
+        except Exception as e:
+            logger.warning(f"Error guardando en caché de Gemini: {e}")
+    
+    async def release_rfp_context(self, rfp_id: Any) -> None:
+        """Elimina el contexto cacheado de un RFP (p.ej. al borrarlo)."""
+        context_cache = get_context_cache()
+        if context_cache is not None:
+            await context_cache.release(self.client, str(rfp_id))
+    
+    async def _rfp_context(self, rfp_id: Any, model: str, content: str | None = None) -> ContextHandle | None:
+        """Handle del contexto cacheado del RFP (lo crea si se entrega `content`)."""
+        context_cache = get_context_cache()
+        if context_cache is None or not rfp_id:
+            return None
+        return await context_cache.acquire(self.client, str(rfp_id), model, content)
+    
+    async def _prompt_context(self, model: str, prompt: str) -> tuple[str, ContextHandle | None]:
+        """
+        Prompt estático de análisis cacheado en Gemini (caching de prefijo explícito).
+        
+        Los prompts bajo el mínimo de la API no se cachean: para esos queda el
+        caching implícito de Gemini, que aprovecha que el prompt va primero y es
+        idéntico entre llamadas.
+        """
+        key = f"prompt-{hash_text(prompt)[:16]}"
+        if not settings.GEMINI_PROMPT_CACHE_ENABLED or estimate_tokens(prompt) < settings.GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            return key, None
+        return key, await self._rfp_context(key, model, prompt)
+    
+    async def _generate_with_context(
+        self,
+        model: str,
+        rfp_id: Any,
+        handle: ContextHandle | None,
+        cached_contents: Any,
+        full_contents: Any,
+        config: dict[str, Any],
+        log: APIConsumptionLog | None = None,
+    ):
+        """
+        Genera usando el contexto cacheado del RFP si hay handle.
+        Si la API lo rechaza (expirado/eliminado) se repite una vez sin caché.
+        """
+        if handle is None:
+            return await self._generate_content(model, full_contents, config, log)
+        try:
+            return await self._generate_content(
+                model, cached_contents, {**config, "cached_content": handle.name}, log
+            )
+        except Exception as e:
+            if error_status_code(e) not in (400, 403, 404):
+                raise
+            logger.warning(f"Contexto cacheado del RFP {rfp_id} rechazado ({e}); reintentando sin caché")
+            get_context_cache().invalidate(str(rfp_id), model)
+            return await self._generate_content(model, full_contents, config, log)
+    
+    def _extract_cached_tokens(self, response) -> int:
+        """Tokens del input servidos desde context cache."""
+        metadata = getattr(response, "usage_metadata", None)
+        if not metadata:
+            return 0
+        return getattr(metadata, "cached_content_token_count", 0) or 0
+    
+    def _extract_grounding_metadata(self, response) -> dict[str, Any] | None:
+        """Fuentes y búsquedas usadas por Google Search Grounding (si las hay)."""
+        if not (hasattr(response, 'candidates') and response.candidates):
+            return None
+        candidate = response.candidates[0]
+        if not (hasattr(candidate, 'grounding_metadata') and candidate.grounding_metadata):
+            return None
+        grounding_meta = candidate.grounding_metadata
+        
+        # Extraer web search queries
+        web_queries = []
+        if hasattr(grounding_meta, 'web_search_queries'):
+            web_queries = list(grounding_meta.web_search_queries or [])
+        elif hasattr(grounding_meta, 'search_entry_point'):
+            # Fallback para formato antiguo
+            web_queries = getattr(grounding_meta, 'search_queries', [])
+        
+        # Extraer grounding chunks (fuentes web)
+        chunks = []
+        if hasattr(grounding_meta, 'grounding_chunks'):
+            for chunk in (grounding_meta.grounding_chunks or []):
+                if hasattr(chunk, 'web') and chunk.web:
+                    chunks.append({
+                        'uri': getattr(chunk.web, 'uri', ''),
+                        'title': getattr(chunk.web, 'title', '')
+                    })
+        
+        # Extraer grounding supports
+        supports_count = 0
+        if hasattr(grounding_meta, 'grounding_supports'):
+            supports_count = len(grounding_meta.grounding_supports or [])
+        
+        return {
+            'web_search_queries': web_queries,
+            'grounding_chunks': chunks,
+            'grounding_supports_count': supports_count,
+        }
+    
     def _extract_token_counts(self, response) -> tuple[int, int, int]:
         """Extrae conteo de tokens de la respuesta."""
         input_tokens = 0
@@ -303,8 +730,11 @@ class GeminiClient:
         document_content: str,
         prompt: str,
         temperature: float = 0.1,
-        max_output_tokens: int = 8192,
-        analysis_mode: Literal["fast", "balanced", "deep"] = "balanced",
+        max_output_tokens: int | None = None,
+        analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced",
+        use_cache: bool = True,
+        response_schema: dict[str, Any] | None = None,
+        operation: str | None = None,
     ) -> dict[str, Any]:
         """
         Analiza un documento con Gemini via API Key.
@@ -313,30 +743,56 @@ class GeminiClient:
             document_content: Contenido del documento (texto extraído)
             prompt: Prompt para el análisis
             temperature: Temperatura para generación (ignorada si se usa analysis_mode)
-            max_output_tokens: Máximo de tokens de salida (ignorado si se usa analysis_mode)
-            analysis_mode: Modo de análisis (fast/balanced/deep)
+            max_output_tokens: Máximo de tokens de salida (por defecto el del analysis_mode)
+            analysis_mode: Modo de análisis (fast/balanced/deep/cascade)
+            use_cache: Si False, ignora la caché de respuestas (bypass)
+            response_schema: Schema de salida estructurada (ver response_schemas)
+            operation: Nombre de la operación en los logs de consumo
             
         Returns:
             Dict con el resultado del análisis parseado desde JSON
         """
         # Obtener configuración del modo
         mode_config = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES["balanced"])
+        if "tiers" in mode_config:
+            return await self.analyze_cascade(
+                document_content,
+                prompt,
+                use_grounding=False,
+                use_cache=use_cache,
+                response_schema=response_schema,
+                max_output_tokens=max_output_tokens,
+            )
         model_to_use = mode_config["model"]
         temp_to_use = mode_config["temperature"]
-        max_tokens = mode_config["max_output_tokens"]
+        max_tokens = max_output_tokens or mode_config["max_output_tokens"]
+        operation = operation or f"analyze_document ({analysis_mode})"
+        generation_config = {
+            "temperature": temp_to_use,
+            "max_output_tokens": max_tokens,
+            "response_mime_type": "application/json",
+        }
+        if response_schema:
+            generation_config["response_schema"] = response_schema
         
-        start_time = time.time()
-        log = APIConsumptionLog(
-            timestamp=datetime.now(),
-            model=model_to_use,
-            operation=f"analyze_document ({analysis_mode})",
-        )
+        cache_key = self._cache_key(use_cache, model_to_use, generation_config, prompt, document_content)
+        cached = await self._get_cached(cache_key, operation)
+        if cached is not None:
+            return cached
         
-        try:
-            # Construir prompt completo
-            full_prompt = f"""
-{prompt}
-
+        flight_key = make_flight_key("analyze_document", model_to_use, generation_config, prompt, document_content)
+        
+        async def call() -> dict[str, Any]:
+            start_time = time.time()
+            log = APIConsumptionLog(
+                timestamp=datetime.now(),
+                model=model_to_use,
+                operation=operation,
+            )
+            
+            try:
+                # Construir prompt completo (el prompt estático primero: prefijo cacheable)
+                document_part = f"""
 DOCUMENTO A ANALIZAR:
 ---
 {document_content}
@@ -344,64 +800,71 @@ DOCUMENTO A ANALIZAR:
 
 Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
 """
-            
-            logger.info(f"Analyzing document with Gemini API")
-            logger.info(f"  Mode: {analysis_mode} ({mode_config['description']})")
-            logger.info(f"  Model: {model_to_use}")
-            logger.info(f"  Temperature: {temp_to_use}")
-            
-            # Generar contenido usando la nueva API
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=model_to_use,
-                contents=full_prompt,
-                config={
-                    "temperature": temp_to_use,
-                    "max_output_tokens": max_tokens,
-                    "response_mime_type": "application/json",
-                },
-            )
-            
-            # Extraer tokens
-            input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
-            log.input_tokens = input_tokens
-            log.output_tokens = output_tokens
-            log.thinking_tokens = thinking_tokens
-            log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            
-            # Calcular costo
-            log.cost_usd = calculate_cost(model_to_use, input_tokens, output_tokens, thinking_tokens)
-            
-            # Parsear respuesta JSON
-            result = json.loads(response.text)
-            
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = True
-            consumption_tracker.add_log(log)
-            
-            logger.info("Document analysis completed successfully")
-            return result
-            
-        except json.JSONDecodeError as e:
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = False
-            log.error = f"Invalid JSON: {str(e)}"
-            consumption_tracker.add_log(log)
-            
-            logger.error(f"Failed to parse Gemini response as JSON: {e}")
-            # Intentar extraer JSON de la respuesta
-            if 'response' in dir() and hasattr(response, 'text'):
-                return {"raw_response": response.text, "error": "Invalid JSON response"}
-            return {"error": "Invalid JSON response"}
-            
-        except Exception as e:
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = False
-            log.error = str(e)
-            consumption_tracker.add_log(log)
-            
-            logger.error(f"Error analyzing document: {e}")
-            raise
+                full_prompt = f"\n{prompt}\n{document_part}"
+                
+                logger.info(f"Analyzing document with Gemini API")
+                logger.info(f"  Mode: {analysis_mode} ({mode_config['description']})")
+                logger.info(f"  Model: {model_to_use}")
+                logger.info(f"  Temperature: {temp_to_use}")
+                
+                # Generar contenido usando la nueva API
+                prompt_key, handle = await self._prompt_context(model_to_use, prompt)
+                response = await self._generate_with_context(
+                    model=model_to_use,
+                    rfp_id=prompt_key,
+                    handle=handle,
+                    cached_contents=document_part,
+                    full_contents=full_prompt,
+                    config=generation_config,
+                    log=log,
+                )
+                
+                # Extraer tokens
+                input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
+                log.input_tokens = input_tokens
+                log.output_tokens = output_tokens
+                log.thinking_tokens = thinking_tokens
+                log.cached_tokens = self._extract_cached_tokens(response)
+                log.total_tokens = input_tokens + output_tokens + thinking_tokens
+                
+                # Calcular costo (los tokens del prefijo cacheado se cobran con descuento)
+                log.cost_usd = calculate_cost(
+                    model_to_use, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+                )
+                
+                # Parsear respuesta JSON
+                result = self._extract_json_from_text(response.text)
+                
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = True
+                consumption_tracker.add_log(log)
+                await self._store_cached(cache_key, result, log)
+                
+                logger.info("Document analysis completed successfully")
+                return result
+                
+            except json.JSONDecodeError as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = f"Invalid JSON: {str(e)}"
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Failed to parse Gemini response as JSON: {e}")
+                # Intentar extraer JSON de la respuesta
+                if 'response' in dir() and hasattr(response, 'text'):
+                    return {"raw_response": response.text, "error": "Invalid JSON response"}
+                return {"error": "Invalid JSON response"}
+                
+            except Exception as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = str(e)
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Error analyzing document: {e}")
+                raise
+        
+        return await single_flight.run(flight_key, operation, call)
     
     async def analyze_pdf_bytes(
         self,
@@ -438,8 +901,7 @@ Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
                 mime_type="application/pdf",
             )
             
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+            response = await self._generate_content(
                 model=self.model_id,
                 contents=[pdf_part, prompt],
                 config={
@@ -447,16 +909,20 @@ Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
                     "max_output_tokens": max_output_tokens,
                     "response_mime_type": "application/json",
                 },
+                log=log,
             )
             
             input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
             log.input_tokens = input_tokens
             log.output_tokens = output_tokens
             log.thinking_tokens = thinking_tokens
+            log.cached_tokens = self._extract_cached_tokens(response)
             log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            log.cost_usd = calculate_cost(self.model_id, input_tokens, output_tokens, thinking_tokens)
+            log.cost_usd = calculate_cost(
+                self.model_id, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+            )
             
-            result = json.loads(response.text)
+            result = self._extract_json_from_text(response.text)
             
             log.latency_ms = (time.time() - start_time) * 1000
             log.success = True
@@ -478,6 +944,8 @@ Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
         rfp_data: dict[str, Any],
         prompt: str,
         temperature: float = 0.3,
+        use_cache: bool = True,
+        rfp_id: Any = None,
     ) -> list[dict[str, Any]]:
         """
         Genera preguntas basadas en el análisis del RFP.
@@ -486,72 +954,107 @@ Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
             rfp_data: Datos extraídos del RFP
             prompt: Prompt para generación de preguntas
             temperature: Temperatura para generación
+            use_cache: Si False, ignora la caché de respuestas (bypass)
+            rfp_id: Si se entrega, reutiliza (o crea) el contexto cacheado del
+                RFP con los mismos datos que se enviarían en el prompt
             
         Returns:
             Lista de preguntas generadas
         """
-        start_time = time.time()
-        log = APIConsumptionLog(
-            timestamp=datetime.now(),
-            model=self.model_id,
-            operation="generate_questions",
-        )
+        generation_config = {
+            "temperature": temperature,
+            "max_output_tokens": 4096,
+            "response_mime_type": "application/json",
+            "response_schema": QUESTIONS_SCHEMA,
+        }
+        # Solo los campos que usa el prompt, en JSON compacto (ver prompt_context)
+        rfp_context = build_prompt_context(rfp_data, "questions")
+        cache_key = self._cache_key(use_cache, self.model_id, generation_config, prompt, rfp_context)
+        cached = await self._get_cached(cache_key, "generate_questions")
+        if cached is not None:
+            return cached
         
-        try:
-            full_prompt = f"""
+        flight_key = make_flight_key("generate_questions", self.model_id, generation_config, prompt, rfp_context)
+        
+        async def call() -> list[dict[str, Any]]:
+            start_time = time.time()
+            log = APIConsumptionLog(
+                timestamp=datetime.now(),
+                model=self.model_id,
+                operation="generate_questions",
+            )
+            
+            try:
+                rfp_block = f"DATOS DEL RFP ANALIZADO:\n```json\n{rfp_context}\n```"
+                full_prompt = f"""
 {prompt}
 
-DATOS DEL RFP ANALIZADO:
-```json
-{json.dumps(rfp_data, ensure_ascii=False, indent=2)}
-```
+{rfp_block}
+
+Genera las preguntas en formato JSON como un array de objetos.
+"""
+                context_prompt = f"""
+{prompt}
+
+Los datos del RFP analizado están en el contexto.
 
 Genera las preguntas en formato JSON como un array de objetos.
 """
-            
-            logger.info("Generating questions with Gemini API")
-            
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=self.model_id,
-                contents=full_prompt,
-                config={
-                    "temperature": temperature,
-                    "max_output_tokens": 4096,
-                    "response_mime_type": "application/json",
-                },
-            )
-            
-            input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
-            log.input_tokens = input_tokens
-            log.output_tokens = output_tokens
-            log.thinking_tokens = thinking_tokens
-            log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            log.cost_usd = calculate_cost(self.model_id, input_tokens, output_tokens, thinking_tokens)
-            
-            # Usar el helper para extraer JSON válido (maneja datos extra)
-            result = self._extract_json_from_text(response.text)
-            
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = True
-            consumption_tracker.add_log(log)
-            
-            # Extraer lista de preguntas
-            if isinstance(result, dict) and "questions" in result:
-                return result["questions"]
-            elif isinstance(result, list):
-                return result
-            else:
-                return []
                 
-        except Exception as e:
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = False
-            log.error = str(e)
-            consumption_tracker.add_log(log)
-            
-            logger.error(f"Error generating questions: {e}")
-            raise
+                logger.info("Generating questions with Gemini API")
+                
+                # El contexto cacheado es el mismo bloque que va en línea: solo
+                # se reutiliza si coincide con lo que se enviaría
+                handle = await self._rfp_context(rfp_id, self.model_id, rfp_block)
+                response = await self._generate_with_context(
+                    model=self.model_id,
+                    rfp_id=rfp_id,
+                    handle=handle,
+                    cached_contents=context_prompt,
+                    full_contents=full_prompt,
+                    config=generation_config,
+                    log=log,
+                )
+                
+                input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
+                log.input_tokens = input_tokens
+                log.output_tokens = output_tokens
+                log.thinking_tokens = thinking_tokens
+                log.cached_tokens = self._extract_cached_tokens(response)
+                log.total_tokens = input_tokens + output_tokens + thinking_tokens
+                log.cost_usd = calculate_cost(
+                    self.model_id, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+                )
+                
+                # Usar el helper para extraer JSON válido (maneja datos extra)
+                result = self._extract_json_from_text(response.text)
+                
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = True
+                consumption_tracker.add_log(log)
+                
+                # Extraer lista de preguntas
+                if isinstance(result, dict) and "questions" in result:
+                    questions = result["questions"]
+                elif isinstance(result, list):
+                    questions = result
+                else:
+                    questions = []
+                
+                if questions:
+                    await self._store_cached(cache_key, questions, log)
+                return questions
+                    
+            except Exception as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = str(e)
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Error generating questions: {e}")
+                raise
+        
+        return await single_flight.run(flight_key, "generate_questions", call)
     
     async def chat(
         self,
@@ -582,22 +1085,25 @@ Genera las preguntas en formato JSON como un array de objetos.
             if context:
                 prompt = f"Contexto:\n{context}\n\nPregunta: {message}"
             
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+            response = await self._generate_content(
                 model=self.model_id,
                 contents=prompt,
                 config={
                     "temperature": temperature,
                     "max_output_tokens": 2048,
                 },
+                log=log,
             )
             
             input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
             log.input_tokens = input_tokens
             log.output_tokens = output_tokens
             log.thinking_tokens = thinking_tokens
+            log.cached_tokens = self._extract_cached_tokens(response)
             log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            log.cost_usd = calculate_cost(self.model_id, input_tokens, output_tokens, thinking_tokens)
+            log.cost_usd = calculate_cost(
+                self.model_id, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+            )
             
             log.latency_ms = (time.time() - start_time) * 1000
             log.success = True
@@ -619,55 +1125,82 @@ Genera las preguntas en formato JSON como un array de objetos.
         prompt: str,
         temperature: float = 0.1,
         max_output_tokens: int = 4096,
+        use_cache: bool = True,
+        response_schema: dict[str, Any] | None = None,
     ) -> Any:
         """
         Genera una respuesta en formato JSON a partir de un prompt libre.
+        
+        No adjunta el contexto cacheado del RFP: los prompts de relevancia ya
+        traen el resumen del RFP, y el contexto (documento completo) se
+        procesaría como input en cada llamada.
+        
+        Args:
+            use_cache: Si False, ignora la caché de respuestas (bypass)
+            response_schema: Schema de salida estructurada (ver response_schemas)
         """
-        start_time = time.time()
-        log = APIConsumptionLog(
-            timestamp=datetime.now(),
-            model=self.model_id,
-            operation="generate_json",
-        )
+        generation_config = {
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "response_mime_type": "application/json",
+        }
+        if response_schema:
+            generation_config["response_schema"] = response_schema
+        cache_key = self._cache_key(use_cache, self.model_id, generation_config, prompt)
+        cached = await self._get_cached(cache_key, "generate_json")
+        if cached is not None:
+            return cached
         
-        try:
-            logger.info("Generating JSON with Gemini API")
-            
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
+        flight_key = make_flight_key("generate_json", self.model_id, generation_config, prompt)
+        
+        async def call() -> Any:
+            start_time = time.time()
+            log = APIConsumptionLog(
+                timestamp=datetime.now(),
                 model=self.model_id,
-                contents=prompt,
-                config={
-                    "temperature": temperature,
-                    "max_output_tokens": max_output_tokens,
-                    "response_mime_type": "application/json",
-                },
+                operation="generate_json",
             )
             
-            input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
-            log.input_tokens = input_tokens
-            log.output_tokens = output_tokens
-            log.thinking_tokens = thinking_tokens
-            log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            log.cost_usd = calculate_cost(self.model_id, input_tokens, output_tokens, thinking_tokens)
-            
-            # Helper to extract valid JSON
-            result = self._extract_json_from_text(response.text)
-            
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = True
-            consumption_tracker.add_log(log)
-            
-            return result
-            
-        except Exception as e:
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = False
-            log.error = str(e)
-            consumption_tracker.add_log(log)
-            
-            logger.error(f"Error generating JSON: {e}")
-            raise
+            try:
+                logger.info("Generating JSON with Gemini API")
+                
+                response = await self._generate_content(
+                    model=self.model_id,
+                    contents=prompt,
+                    config=generation_config,
+                    log=log,
+                )
+                
+                input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
+                log.input_tokens = input_tokens
+                log.output_tokens = output_tokens
+                log.thinking_tokens = thinking_tokens
+                log.cached_tokens = self._extract_cached_tokens(response)
+                log.total_tokens = input_tokens + output_tokens + thinking_tokens
+                log.cost_usd = calculate_cost(
+                    self.model_id, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+                )
+                
+                # Helper to extract valid JSON
+                result = self._extract_json_from_text(response.text)
+                
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = True
+                consumption_tracker.add_log(log)
+                await self._store_cached(cache_key, result, log)
+                
+                return result
+                
+            except Exception as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = str(e)
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Error generating JSON: {e}")
+                raise
+        
+        return await single_flight.run(flight_key, "generate_json", call)
     
     async def analyze_with_grounding(
         self,
@@ -675,6 +1208,9 @@ Genera las preguntas en formato JSON como un array de objetos.
         prompt: str,
         temperature: float = 0.1,
         max_output_tokens: int = 16384,
+        response_schema: dict[str, Any] | None = None,
+        model: str = GROUNDING_MODEL,
+        operation: str = "analyze_with_grounding",
     ) -> dict[str, Any]:
         """
         Analiza un documento con Gemini usando Google Search Grounding.
@@ -687,23 +1223,34 @@ Genera las preguntas en formato JSON como un array de objetos.
             prompt: Prompt para el análisis (debe instruir a usar Google Search)
             temperature: Temperatura para generación
             max_output_tokens: Máximo de tokens de salida
+            response_schema: Schema de salida; solo se envía si el modelo acepta
+                salida estructurada junto con herramientas
+            model: Modelo a usar (por defecto GROUNDING_MODEL)
+            operation: Nombre de la operación en los logs de consumo
             
         Returns:
             Dict con el resultado del análisis parseado desde JSON
         """
-        # Usar Gemini 3 Flash para grounding (mejor balance calidad/precio con grounding)
-        grounding_model = "gemini-3-flash-preview"
+        grounding_model = model
         
-        start_time = time.time()
-        log = APIConsumptionLog(
-            timestamp=datetime.now(),
-            model=grounding_model,
-            operation="analyze_with_grounding",
-        )
+        grounding_config = {
+            "temperature": temperature,
+            "max_output_tokens": max_output_tokens,
+            "response_schema": response_schema,
+        }
+        flight_key = make_flight_key("analyze_with_grounding", grounding_model, grounding_config, prompt, document_content)
         
-        try:
-            # Construir prompt completo
-            full_prompt = f"""
+        async def call() -> dict[str, Any]:
+            start_time = time.time()
+            log = APIConsumptionLog(
+                timestamp=datetime.now(),
+                model=grounding_model,
+                operation=operation,
+            )
+            
+            try:
+                # Construir prompt completo
+                full_prompt = f"""
 {prompt}
 
 DOCUMENTO A ANALIZAR:
@@ -713,124 +1260,367 @@ DOCUMENTO A ANALIZAR:
 
 Responde UNICAMENTE con JSON valido siguiendo el schema indicado.
 """
-            
-            logger.info(f"Analyzing document with Grounding (Google Search)")
-            logger.info(f"  Model: {grounding_model}")
-            logger.info(f"  Temperature: {temperature}")
-            
-            # Configurar herramienta de Google Search para grounding
-            google_search_tool = types.Tool(
-                google_search=types.GoogleSearch()
-            )
-            
-            # Generar contenido con grounding habilitado
-            # NOTA: No usamos response_mime_type con grounding porque puede causar conflictos
-            response = await asyncio.to_thread(
-                self.client.models.generate_content,
-                model=grounding_model,
-                contents=full_prompt,
-                config={
+                
+                logger.info(f"Analyzing document with Grounding (Google Search)")
+                logger.info(f"  Model: {grounding_model}")
+                logger.info(f"  Temperature: {temperature}")
+                
+                # Configurar herramienta de Google Search para grounding
+                google_search_tool = types.Tool(
+                    google_search=types.GoogleSearch()
+                )
+                
+                # Generar contenido con grounding habilitado
+                # NOTA: response_mime_type/schema con herramientas solo en modelos que lo soportan;
+                # en los demás se parsea el texto con el scanner de JSON
+                generation_config = {
                     "temperature": temperature,
                     "max_output_tokens": max_output_tokens,
                     "tools": [google_search_tool],
-                    # No usar response_mime_type con grounding - parseamos manualmente
-                },
+                }
+                if response_schema and supports_response_schema(grounding_model, with_tools=True):
+                    generation_config["response_mime_type"] = "application/json"
+                    generation_config["response_schema"] = response_schema
+                
+                response = await self._generate_content(
+                    model=grounding_model,
+                    contents=full_prompt,
+                    config=generation_config,
+                    log=log,
+                )
+                
+                # Extraer tokens
+                input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
+                log.input_tokens = input_tokens
+                log.output_tokens = output_tokens
+                log.thinking_tokens = thinking_tokens
+                log.cached_tokens = self._extract_cached_tokens(response)
+                log.total_tokens = input_tokens + output_tokens + thinking_tokens
+                
+                # Calcular costo (el prefijo servido por caching implícito se cobra a tarifa reducida)
+                log.cost_usd = calculate_cost(
+                    grounding_model, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+                )
+                
+                # Obtener texto de respuesta - manejar diferentes formatos
+                response_text = None
+                
+                # Primero intentar .text
+                if hasattr(response, 'text') and response.text:
+                    response_text = response.text
+                # Luego intentar desde candidates
+                elif hasattr(response, 'candidates') and response.candidates:
+                    candidate = response.candidates[0]
+                    if hasattr(candidate, 'content') and candidate.content:
+                        if hasattr(candidate.content, 'parts') and candidate.content.parts:
+                            for part in candidate.content.parts:
+                                if hasattr(part, 'text') and part.text:
+                                    response_text = part.text
+                                    break
+                
+                if not response_text:
+                    logger.warning("Response text is empty, checking raw response...")
+                    logger.warning(f"Response type: {type(response)}")
+                    logger.warning(f"Response dir: {[attr for attr in dir(response) if not attr.startswith('_')]}")
+                    raise ValueError("Model returned empty response - no text content found")
+                
+                # Parsear respuesta JSON
+                result = self._extract_json_from_text(response_text)
+                
+                # Agregar metadata de grounding si está disponible
+                grounding_metadata = self._extract_grounding_metadata(response)
+                if grounding_metadata:
+                    result['_grounding_metadata'] = grounding_metadata
+                
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = True
+                consumption_tracker.add_log(log)
+                
+                logger.info("Document analysis with grounding completed successfully")
+                return result
+                
+            except json.JSONDecodeError as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = f"Invalid JSON: {str(e)}"
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Failed to parse Gemini grounding response as JSON: {e}")
+                if 'response' in dir() and response is not None:
+                    # Intentar extraer JSON de todas formas
+                    try:
+                        text = getattr(response, 'text', None)
+                        if text:
+                            return self._extract_json_from_text(text)
+                    except Exception:
+                        pass
+                    return {"raw_response": str(response), "error": "Invalid JSON response"}
+                return {"error": "Invalid JSON response"}
+                
+            except Exception as e:
+                log.latency_ms = (time.time() - start_time) * 1000
+                log.success = False
+                log.error = str(e)
+                consumption_tracker.add_log(log)
+                
+                logger.error(f"Error analyzing document with grounding: {e}")
+                raise
+        
+        return await single_flight.run(flight_key, operation, call)
+    
+    def _cascade_tier_call(
+        self,
+        document_content: str,
+        prompt: str,
+        tier: str,
+        use_grounding: bool,
+        use_cache: bool,
+        response_schema: dict[str, Any] | None,
+        max_output_tokens: int | None = None,
+    ) -> Awaitable[dict[str, Any]]:
+        """Llamada de un tier de la cascada (el tier es un modo de ANALYSIS_MODES)."""
+        if use_grounding:
+            return self.analyze_with_grounding(
+                document_content=document_content,
+                prompt=prompt,
+                max_output_tokens=max_output_tokens or 16384,
+                response_schema=response_schema,
+                model=ANALYSIS_MODES[tier]["model"],
+                operation=f"analyze_with_grounding (cascade:{tier})",
             )
+        return self.analyze_document(
+            document_content=document_content,
+            prompt=prompt,
+            analysis_mode=tier,
+            use_cache=use_cache,
+            response_schema=response_schema,
+            max_output_tokens=max_output_tokens,
+            operation=f"analyze_document (cascade:{tier})",
+        )
+    
+    def _cascade_result(
+        self,
+        result: Any,
+        tier: str,
+        escalated: bool,
+        first_score: CascadeScore,
+        score: CascadeScore,
+    ) -> Any:
+        """Registra el tier que sirvió la cascada y lo anota en el resultado."""
+        cascade_stats.record(tier, first_score, escalated)
+        model = ANALYSIS_MODES[tier]["model"]
+        logger.info(
+            f"🪜 CASCADE | servido por tier {tier} ({model}) | puntaje {score.score:.2f}"
+            f"{' (escalado)' if escalated else ''}"
+        )
+        if isinstance(result, dict):
+            result["_cascade"] = {
+                "tier": tier,
+                "model": model,
+                "escalated": escalated,
+                "score": round(score.score, 3),
+            }
+        return result
+    
+    async def analyze_cascade(
+        self,
+        document_content: str,
+        prompt: str,
+        use_grounding: bool = False,
+        use_cache: bool = True,
+        response_schema: dict[str, Any] | None = None,
+        max_output_tokens: int | None = None,
+    ) -> dict[str, Any]:
+        """
+        Analiza un documento en modo cascada.
+        
+        Ejecuta los tiers de ANALYSIS_MODES["cascade"] en orden (Flash y luego
+        Pro) y se queda con el primer resultado cuyo puntaje (confianza,
+        completitud y validez contra `response_schema`) supere
+        GEMINI_CASCADE_THRESHOLD. Un error en un tier intermedio también escala.
+        
+        Args:
+            document_content: Contenido del documento (texto extraído)
+            prompt: Prompt para el análisis
+            use_grounding: Si True, cada tier usa Google Search
+            use_cache: Si False, ignora la caché de respuestas (solo aplica sin grounding)
+            response_schema: Schema de salida estructurada (ver response_schemas)
+            max_output_tokens: Máximo de tokens de salida de cada tier (por defecto el del tier)
+        """
+        tiers = ANALYSIS_MODES["cascade"]["tiers"]
+        first_score: CascadeScore | None = None
+        for index, tier in enumerate(tiers):
+            is_last = index == len(tiers) - 1
+            try:
+                result = await self._cascade_tier_call(
+                    document_content, prompt, tier, use_grounding, use_cache, response_schema, max_output_tokens
+                )
+            except Exception as e:
+                if is_last:
+                    raise
+                cascade_stats.tier_failures += 1
+                first_score = first_score or CascadeScore(score=0.0, schema_errors=[str(e)])
+                logger.warning(f"Cascada: tier {tier} falló ({e}), escalando")
+                continue
             
-            # Extraer tokens
-            input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(response)
-            log.input_tokens = input_tokens
-            log.output_tokens = output_tokens
-            log.thinking_tokens = thinking_tokens
-            log.total_tokens = input_tokens + output_tokens + thinking_tokens
-            
-            # Calcular costo (usar pricing de flash para grounding)
-            log.cost_usd = calculate_cost(grounding_model, input_tokens, output_tokens, thinking_tokens)
-            
-            # Obtener texto de respuesta - manejar diferentes formatos
-            response_text = None
-            
-            # Primero intentar .text
-            if hasattr(response, 'text') and response.text:
-                response_text = response.text
-            # Luego intentar desde candidates
-            elif hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'content') and candidate.content:
-                    if hasattr(candidate.content, 'parts') and candidate.content.parts:
-                        for part in candidate.content.parts:
-                            if hasattr(part, 'text') and part.text:
-                                response_text = part.text
-                                break
-            
-            if not response_text:
-                logger.warning("Response text is empty, checking raw response...")
-                logger.warning(f"Response type: {type(response)}")
-                logger.warning(f"Response dir: {[attr for attr in dir(response) if not attr.startswith('_')]}")
-                raise ValueError("Model returned empty response - no text content found")
-            
-            # Parsear respuesta JSON
-            result = self._extract_json_from_text(response_text)
-            
-            # Agregar metadata de grounding si está disponible
-            if hasattr(response, 'candidates') and response.candidates:
-                candidate = response.candidates[0]
-                if hasattr(candidate, 'grounding_metadata') and candidate.grounding_metadata:
-                    grounding_meta = candidate.grounding_metadata
-                    
-                    # Extraer web search queries
-                    web_queries = []
-                    if hasattr(grounding_meta, 'web_search_queries'):
-                        web_queries = list(grounding_meta.web_search_queries or [])
-                    elif hasattr(grounding_meta, 'search_entry_point'):
-                        # Fallback para formato antiguo
-                        web_queries = getattr(grounding_meta, 'search_queries', [])
-                    
-                    # Extraer grounding chunks (fuentes web)
-                    chunks = []
-                    if hasattr(grounding_meta, 'grounding_chunks'):
-                        for chunk in (grounding_meta.grounding_chunks or []):
-                            if hasattr(chunk, 'web') and chunk.web:
-                                chunks.append({
-                                    'uri': getattr(chunk.web, 'uri', ''),
-                                    'title': getattr(chunk.web, 'title', '')
-                                })
-                    
-                    # Extraer grounding supports
-                    supports_count = 0
-                    if hasattr(grounding_meta, 'grounding_supports'):
-                        supports_count = len(grounding_meta.grounding_supports or [])
-                    
-                    result['_grounding_metadata'] = {
-                        'web_search_queries': web_queries,
-                        'grounding_chunks': chunks,
-                        'grounding_supports_count': supports_count,
-                    }
+            score = score_analysis(result, response_schema)
+            first_score = first_score or score
+            if is_last or not should_escalate(score):
+                return self._cascade_result(result, tier, index > 0, first_score, score)
+            logger.info(
+                f"Cascada: puntaje {score.score:.2f} bajo el umbral en tier {tier} "
+                f"(confianza {score.confidence:.2f}, completitud {score.completeness:.2f}, "
+                f"errores de schema {len(score.schema_errors)}), escalando"
+            )
+        raise RuntimeError("Cascada sin tiers configurados")
+    
+    async def analyze_document_stream(
+        self,
+        document_content: str,
+        prompt: str,
+        analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced",
+        use_grounding: bool = False,
+        use_cache: bool = True,
+        response_schema: dict[str, Any] | None = None,
+        model: str | None = None,
+        operation: str | None = None,
+        max_output_tokens: int | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Versión streaming de analyze_document / analyze_with_grounding.
+        
+        Emite eventos a medida que Gemini genera:
+        - {"type": "token", "text": str, "chars": int}: fragmento de la respuesta
+        - {"type": "result", "data": dict}: JSON final parseado
+        
+        En modo cascade, si el tier Flash no supera el umbral se emite
+        {"type": "progress", "stage": "escalating", ...} y se transmite el tier Pro.
+        
+        Args:
+            document_content: Contenido del documento (texto extraído)
+            prompt: Prompt para el análisis
+            analysis_mode: Modo de análisis (con grounding solo se considera cascade)
+            use_grounding: Si True, usa Google Search (mismo modelo que analyze_with_grounding)
+            use_cache: Si False, ignora la caché de respuestas (solo aplica sin grounding)
+            response_schema: Schema de salida estructurada (ver response_schemas)
+            model: Modelo a usar con grounding (por defecto GROUNDING_MODEL)
+            operation: Nombre de la operación en los logs de consumo
+            max_output_tokens: Máximo de tokens de salida (por defecto el del modo)
+        """
+        if "tiers" in ANALYSIS_MODES.get(analysis_mode, {}):
+            async for event in self._analyze_cascade_stream(
+                document_content, prompt, use_grounding, use_cache, response_schema, max_output_tokens
+            ):
+                yield event
+            return
+        
+        if use_grounding:
+            model_to_use = model or GROUNDING_MODEL
+            operation = operation or "analyze_with_grounding (stream)"
+            generation_config = {
+                "temperature": 0.1,
+                "max_output_tokens": max_output_tokens or 16384,
+                "tools": [types.Tool(google_search=types.GoogleSearch())],
+            }
+            if response_schema and supports_response_schema(model_to_use, with_tools=True):
+                generation_config["response_mime_type"] = "application/json"
+                generation_config["response_schema"] = response_schema
+            cache_key = None
+        else:
+            mode_config = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES["balanced"])
+            model_to_use = mode_config["model"]
+            operation = operation or f"analyze_document ({analysis_mode})"
+            generation_config = {
+                "temperature": mode_config["temperature"],
+                "max_output_tokens": max_output_tokens or mode_config["max_output_tokens"],
+                "response_mime_type": "application/json",
+            }
+            if response_schema:
+                generation_config["response_schema"] = response_schema
+            # Misma clave que analyze_document: ambos caminos comparten respuestas
+            cache_key = self._cache_key(use_cache, model_to_use, generation_config, prompt, document_content)
+            cached = await self._get_cached(cache_key, operation)
+            if cached is not None:
+                yield {"type": "result", "data": cached}
+                return
+        
+        start_time = time.time()
+        log = APIConsumptionLog(
+            timestamp=datetime.now(),
+            model=model_to_use,
+            operation=operation,
+        )
+        
+        document_part = f"""
+DOCUMENTO A ANALIZAR:
+---
+{document_content}
+---
+
+Responde ÚNICAMENTE con JSON válido siguiendo el schema indicado.
+"""
+        full_prompt = f"\n{prompt}\n{document_part}"
+        
+        logger.info(f"Streaming document analysis with Gemini API ({model_to_use})")
+        
+        # Prompt estático cacheado (grounding usa tools, incompatibles con cached_content)
+        attempts: list[tuple[str, dict[str, Any]]] = [(full_prompt, generation_config)]
+        prompt_key, handle = None, None
+        if not use_grounding:
+            prompt_key, handle = await self._prompt_context(model_to_use, prompt)
+            if handle is not None:
+                attempts.insert(0, (document_part, {**generation_config, "cached_content": handle.name}))
+        
+        text_parts: list[str] = []
+        chars = 0
+        last_chunk = None
+        grounding_metadata = None
+        try:
+            for index, (contents, config) in enumerate(attempts):
+                try:
+                    async for chunk in self._generate_content_stream(
+                        model=model_to_use,
+                        contents=contents,
+                        config=config,
+                        log=log,
+                    ):
+                        last_chunk = chunk
+                        grounding_metadata = self._extract_grounding_metadata(chunk) or grounding_metadata
+                        text = getattr(chunk, "text", None)
+                        if text:
+                            text_parts.append(text)
+                            chars += len(text)
+                            yield {"type": "token", "text": text, "chars": chars}
+                    break
+                except Exception as e:
+                    # Solo se reintenta sin caché si la API rechazó el handle antes de generar
+                    if last_chunk is not None or index == len(attempts) - 1 or error_status_code(e) not in (400, 403, 404):
+                        raise
+                    logger.warning(f"Prompt cacheado rechazado ({e}); reintentando sin caché")
+                    get_context_cache().invalidate(prompt_key, model_to_use)
             
-            log.latency_ms = (time.time() - start_time) * 1000
-            log.success = True
-            consumption_tracker.add_log(log)
+            if last_chunk is not None:
+                input_tokens, output_tokens, thinking_tokens = self._extract_token_counts(last_chunk)
+                log.input_tokens = input_tokens
+                log.output_tokens = output_tokens
+                log.thinking_tokens = thinking_tokens
+                log.cached_tokens = self._extract_cached_tokens(last_chunk)
+                log.total_tokens = input_tokens + output_tokens + thinking_tokens
+                log.cost_usd = calculate_cost(
+                    model_to_use, input_tokens, output_tokens, thinking_tokens, log.cached_tokens
+                )
             
-            logger.info("Document analysis with grounding completed successfully")
-            return result
+            result = self._extract_json_from_text("".join(text_parts) or None)
+            if grounding_metadata and isinstance(result, dict):
+                result['_grounding_metadata'] = grounding_metadata
             
-        except json.JSONDecodeError as e:
             log.latency_ms = (time.time() - start_time) * 1000
-            log.success = False
-            log.error = f"Invalid JSON: {str(e)}"
+            log.success = True
             consumption_tracker.add_log(log)
+            await self._store_cached(cache_key, result, log)
             
-            logger.error(f"Failed to parse Gemini grounding response as JSON: {e}")
-            if 'response' in dir() and response is not None:
-                # Intentar extraer JSON de todas formas
-                try:
-                    text = getattr(response, 'text', None)
-                    if text:
-                        return self._extract_json_from_text(text)
-                except Exception:
-                    pass
-                return {"raw_response": str(response), "error": "Invalid JSON response"}
-            return {"error": "Invalid JSON response"}
+            logger.info("Streaming document analysis completed successfully")
+            yield {"type": "result", "data": result}
             
         except Exception as e:
             log.latency_ms = (time.time() - start_time) * 1000
@@ -838,8 +1628,63 @@ Responde UNICAMENTE con JSON valido siguiendo el schema indicado.
             log.error = str(e)
             consumption_tracker.add_log(log)
             
-            logger.error(f"Error analyzing document with grounding: {e}")
+            logger.error(f"Error in streaming document analysis: {e}")
             raise
+    
+    async def _analyze_cascade_stream(
+        self,
+        document_content: str,
+        prompt: str,
+        use_grounding: bool,
+        use_cache: bool,
+        response_schema: dict[str, Any] | None,
+        max_output_tokens: int | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Versión streaming de analyze_cascade (transmite cada tier ejecutado)."""
+        tiers = ANALYSIS_MODES["cascade"]["tiers"]
+        first_score: CascadeScore | None = None
+        for index, tier in enumerate(tiers):
+            is_last = index == len(tiers) - 1
+            mode_config = ANALYSIS_MODES[tier]
+            label = "analyze_with_grounding" if use_grounding else "analyze_document"
+            result: Any = None
+            try:
+                async for event in self.analyze_document_stream(
+                    document_content,
+                    prompt,
+                    analysis_mode=tier,
+                    use_grounding=use_grounding,
+                    use_cache=use_cache,
+                    response_schema=response_schema,
+                    model=mode_config["model"],
+                    operation=f"{label} (cascade:{tier})",
+                    max_output_tokens=max_output_tokens,
+                ):
+                    if event["type"] == "result":
+                        result = event["data"]
+                    else:
+                        yield event
+            except Exception as e:
+                if is_last:
+                    raise
+                cascade_stats.tier_failures += 1
+                first_score = first_score or CascadeScore(score=0.0, schema_errors=[str(e)])
+                logger.warning(f"Cascada: tier {tier} falló ({e}), escalando")
+            else:
+                score = score_analysis(result, response_schema)
+                first_score = first_score or score
+                if is_last or not should_escalate(score):
+                    result = self._cascade_result(result, tier, index > 0, first_score, score)
+                    yield {"type": "result", "data": result}
+                    return
+                logger.info(f"Cascada: puntaje {score.score:.2f} bajo el umbral en tier {tier}, escalando")
+            
+            next_model = ANALYSIS_MODES[tiers[index + 1]]["model"]
+            yield {
+                "type": "progress",
+                "stage": "escalating",
+                "message": f"Resultado preliminar con baja confianza; reanalizando con {next_model}",
+            }
 
 
 # Singleton instance
@@ -0,0 +1,463 @@
+"""
+Gobernador de concurrencia para llamadas a Gemini.
+
+Limita cuántas llamadas simultáneas se hacen por modelo a nivel de proceso.
+Las llamadas que exceden el límite esperan en cola (FIFO del semáforo) y se
+registran métricas de espera para el dashboard de consumo.
+
+Incluye además:
+- Token buckets RPM/TPM por modelo para no exceder la cuota (las ráfagas esperan)
+- Política de reintentos con backoff exponencial + jitter que respeta retry-after
+"""
+import asyncio
+import logging
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class GeminiCapacityError(RuntimeError):
+    """La llamada esperó en cola más que el timeout configurado."""
+
+
+@dataclass
+class ModelSlotStats:
+    """Métricas de concurrencia de un modelo."""
+    limit: int
+    in_flight: int = 0
+    waiting: int = 0
+    peak_in_flight: int = 0
+    peak_waiting: int = 0
+    total_acquired: int = 0
+    queued_requests: int = 0  # Llamadas que tuvieron que esperar
+    timeouts: int = 0
+    total_wait_ms: float = 0.0
+    max_wait_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "peak_in_flight": self.peak_in_flight,
+            "peak_waiting": self.peak_waiting,
+            "total_acquired": self.total_acquired,
+            "queued_requests": self.queued_requests,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.total_wait_ms / self.total_acquired, 2) if self.total_acquired else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+        }
+
+
+def parse_model_limits(raw: str) -> dict[str, int]:
+    """
+    Parsea límites por modelo con formato "modelo=N,modelo2=M".
+    Entradas inválidas se ignoran con warning.
+    """
+    limits: dict[str, int] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, _, value = item.partition("=")
+        try:
+            limits[model.strip()] = max(1, int(value))
+        except ValueError:
+            logger.warning(f"Límite de concurrencia inválido ignorado: '{item}'")
+    return limits
+
+
+class ConcurrencyGovernor:
+    """Semáforos por modelo compartidos por todo el proceso."""
+
+    def __init__(
+        self,
+        default_limit: int,
+        model_limits: dict[str, int] | None = None,
+        queue_timeout_seconds: float | None = None,
+    ):
+        self.default_limit = max(1, default_limit)
+        self.model_limits = model_limits or {}
+        self.queue_timeout_seconds = queue_timeout_seconds
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+        self._stats: dict[str, ModelSlotStats] = {}
+
+    def _get_slot(self, model: str) -> tuple[asyncio.Semaphore, ModelSlotStats]:
+        if model not in self._semaphores:
+            limit = self.model_limits.get(model, self.default_limit)
+            self._semaphores[model] = asyncio.Semaphore(limit)
+            self._stats[model] = ModelSlotStats(limit=limit)
+        return self._semaphores[model], self._stats[model]
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[float]:
+        """
+        Reserva un slot para el modelo; espera en cola si no hay disponibles.
+
+        Yields:
+            Milisegundos esperados en cola
+
+        Raises:
+            GeminiCapacityError: si la espera supera queue_timeout_seconds
+        """
+        semaphore, stats = self._get_slot(model)
+        queued = semaphore.locked()
+        if queued:
+            stats.waiting += 1
+            stats.peak_waiting = max(stats.peak_waiting, stats.waiting)
+        start = time.perf_counter()
+
+        try:
+            if self.queue_timeout_seconds:
+                await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout_seconds)
+            else:
+                await semaphore.acquire()
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            raise GeminiCapacityError(
+                f"Timeout esperando capacidad para {model} "
+                f"({self.queue_timeout_seconds}s, {stats.in_flight} en curso)"
+            )
+        finally:
+            if queued:
+                stats.waiting -= 1
+
+        wait_ms = (time.perf_counter() - start) * 1000
+        stats.total_acquired += 1
+        stats.total_wait_ms += wait_ms
+        stats.max_wait_ms = max(stats.max_wait_ms, wait_ms)
+        stats.in_flight += 1
+        stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+        if queued:
+            stats.queued_requests += 1
+            logger.info(f"Gemini {model}: {wait_ms:.0f}ms en cola ({stats.in_flight}/{stats.limit} en curso)")
+
+        try:
+            yield wait_ms
+        finally:
+            stats.in_flight -= 1
+            semaphore.release()
+
+    def get_stats(self) -> dict:
+        """Métricas por modelo."""
+        return {
+            "default_limit": self.default_limit,
+            "models": {model: stats.to_dict() for model, stats in self._stats.items()},
+        }
+
+
+# ============================================================
+# RATE LIMITING (RPM / TPM)
+# ============================================================
+
+class TokenBucket:
+    """
+    Token bucket asíncrono con recarga continua.
+
+    Los waiters se atienden en orden FIFO (el lock se mantiene mientras se
+    espera la recarga), así una ráfaga queda en cola en lugar de fallar.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.refill_per_second = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.refill_per_second)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """
+        Consume `amount` tokens esperando lo necesario.
+
+        Returns:
+            Segundos esperados
+        """
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.refill_per_second
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, delta: float) -> None:
+        """Corrige el consumo estimado con el real (delta > 0 descuenta más tokens)."""
+        self._refill()
+        self.tokens = max(-self.capacity, min(self.capacity, self.tokens - delta))
+
+
+@dataclass
+class ModelRateStats:
+    """Métricas de rate limiting de un modelo."""
+    rpm_limit: int
+    tpm_limit: int
+    throttled_requests: int = 0
+    total_throttle_ms: float = 0.0
+    max_throttle_ms: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "rpm_limit": self.rpm_limit,
+            "tpm_limit": self.tpm_limit,
+            "throttled_requests": self.throttled_requests,
+            "total_throttle_ms": round(self.total_throttle_ms, 2),
+            "max_throttle_ms": round(self.max_throttle_ms, 2),
+        }
+
+
+def parse_rate_limits(raw: str) -> dict[str, tuple[int, int]]:
+    """
+    Parsea cuotas por modelo con formato "modelo=RPM:TPM,modelo2=RPM:TPM".
+    0 significa sin límite para esa dimensión.
+    """
+    limits: dict[str, tuple[int, int]] = {}
+    for item in (raw or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        model, _, value = item.partition("=")
+        rpm, _, tpm = value.partition(":")
+        try:
+            limits[model.strip()] = (int(rpm or 0), int(tpm or 0))
+        except ValueError:
+            logger.warning(f"Cuota RPM/TPM inválida ignorada: '{item}'")
+    return limits
+
+
+class RateLimiter:
+    """Buckets RPM y TPM por modelo dimensionados a la cuota del proyecto."""
+
+    def __init__(self, default_rpm: int, default_tpm: int, model_limits: dict[str, tuple[int, int]] | None = None):
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.model_limits = model_limits or {}
+        self._buckets: dict[str, tuple[TokenBucket | None, TokenBucket | None]] = {}
+        self._stats: dict[str, ModelRateStats] = {}
+
+    def _get_buckets(self, model: str) -> tuple[TokenBucket | None, TokenBucket | None]:
+        if model not in self._buckets:
+            rpm, tpm = self.model_limits.get(model, (self.default_rpm, self.default_tpm))
+            self._buckets[model] = (
+                TokenBucket(rpm) if rpm > 0 else None,
+                TokenBucket(tpm) if tpm > 0 else None,
+            )
+            self._stats[model] = ModelRateStats(rpm_limit=rpm, tpm_limit=tpm)
+        return self._buckets[model]
+
+    async def acquire(self, model: str, estimated_tokens: int) -> float:
+        """
+        Reserva 1 request y los tokens estimados. Espera si la cuota está agotada.
+
+        Returns:
+            Milisegundos esperados por cuota
+        """
+        rpm_bucket, tpm_bucket = self._get_buckets(model)
+        waited = 0.0
+        if rpm_bucket:
+            waited += await rpm_bucket.acquire(1)
+        if tpm_bucket and estimated_tokens > 0:
+            waited += await tpm_bucket.acquire(estimated_tokens)
+
+        wait_ms = waited * 1000
+        if wait_ms > 0:
+            stats = self._stats[model]
+            stats.throttled_requests += 1
+            stats.total_throttle_ms += wait_ms
+            stats.max_throttle_ms = max(stats.max_throttle_ms, wait_ms)
+            logger.info(f"Gemini {model}: {wait_ms:.0f}ms esperando cuota RPM/TPM")
+        return wait_ms
+
+    def settle(self, model: str, estimated_tokens: int, actual_tokens: int) -> None:
+        """Ajusta el bucket TPM con los tokens reales reportados por la API."""
+        _, tpm_bucket = self._get_buckets(model)
+        if tpm_bucket and actual_tokens > 0:
+            tpm_bucket.adjust(actual_tokens - estimated_tokens)
+
+    def get_stats(self) -> dict:
+        return {model: stats.to_dict() for model, stats in self._stats.items()}
+
+
+def estimate_tokens(contents: Any) -> int:
+    """Estimación rápida de tokens de entrada (~4 caracteres por token)."""
+    if isinstance(contents, str):
+        return len(contents) // 4
+    if isinstance(contents, (list, tuple)):
+        return sum(estimate_tokens(item) for item in contents)
+    text = getattr(contents, "text", None)
+    return len(text) // 4 if isinstance(text, str) else 0
+
+
+# ============================================================
+# REINTENTOS
+# ============================================================
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+@dataclass
+class RetryStats:
+    """Métricas globales de reintentos."""
+    retried_calls: int = 0
+    total_retries: int = 0
+    exhausted: int = 0
+    by_code: dict = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {
+            "retried_calls": self.retried_calls,
+            "total_retries": self.total_retries,
+            "exhausted": self.exhausted,
+            "by_code": dict(self.by_code),
+        }
+
+
+def error_status_code(exc: BaseException) -> int | None:
+    """Código HTTP de un error del SDK (google.genai.errors.APIError) si existe."""
+    code = getattr(exc, "code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429, 5xx transitorios y errores de red/timeout son reintentables."""
+    code = error_status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    if isinstance(exc, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    # Errores de transporte (httpx/aiohttp) sin dependencia directa
+    name = type(exc).__name__
+    return name in {"ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError", "ServerDisconnectedError"}
+
+
+def _parse_duration(value: Any) -> float | None:
+    """Parsea '12s', '1.5s' o segundos numéricos."""
+    if value is None:
+        return None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*s?\s*", str(value))
+    return float(match.group(1)) if match else None
+
+
+def retry_after_seconds(exc: BaseException) -> float | None:
+    """
+    Obtiene la pista de espera del servidor:
+    header Retry-After o google.rpc.RetryInfo.retryDelay en el cuerpo del error.
+    """
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        hinted = _parse_duration(headers.get("retry-after"))
+        if hinted is not None:
+            return hinted
+
+    details = getattr(exc, "details", None)
+    if isinstance(details, dict):
+        error = details.get("error", details)
+        for detail in error.get("details", []) or []:
+            if isinstance(detail, dict) and str(detail.get("@type", "")).endswith("RetryInfo"):
+                hinted = _parse_duration(detail.get("retryDelay"))
+                if hinted is not None:
+                    return hinted
+    return None
+
+
+class RetryPolicy:
+    """Backoff exponencial con full jitter, acotado y respetando retry-after."""
+
+    def __init__(self, max_retries: int, base_delay: float, max_delay: float):
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = RetryStats()
+
+    def delay_for(self, attempt: int, exc: BaseException) -> float | None:
+        """
+        Segundos a esperar antes del reintento número `attempt` (base 1).
+
+        Retorna None si el retry-after supera lo que queda del presupuesto de
+        espera (max_delay por cada reintento restante): reintentar antes de
+        la hora indicada solo gastaría intentos con otro 429.
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+        hinted = retry_after_seconds(exc)
+        if hinted is not None:
+            budget = self.max_delay * (self.max_retries - attempt + 1)
+            if hinted > budget:
+                return None
+            # El servidor sabe cuándo habrá cuota: esperar al menos eso (+ jitter
+            # pequeño), sin acotar a max_delay
+            return max(hinted, backoff) + random.uniform(0, 1)
+        return backoff
+
+    def record(self, attempt: int, exc: BaseException) -> None:
+        if attempt == 1:
+            self.stats.retried_calls += 1
+        self.stats.total_retries += 1
+        code = str(error_status_code(exc) or type(exc).__name__)
+        self.stats.by_code[code] = self.stats.by_code.get(code, 0) + 1
+
+
+# Singleton instances
+_governor: ConcurrencyGovernor | None = None
+_rate_limiter: RateLimiter | None = None
+_retry_policy: RetryPolicy | None = None
+
+
+def get_gemini_governor() -> ConcurrencyGovernor:
+    """Get or create the process-wide concurrency governor."""
+    global _governor
+    if _governor is None:
+        _governor = ConcurrencyGovernor(
+            default_limit=settings.GEMINI_MAX_CONCURRENCY,
+            model_limits=parse_model_limits(settings.GEMINI_MODEL_CONCURRENCY),
+            queue_timeout_seconds=settings.GEMINI_QUEUE_TIMEOUT_SECONDS or None,
+        )
+    return _governor
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get or create the process-wide RPM/TPM limiter."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter(
+            default_rpm=settings.GEMINI_RPM_LIMIT,
+            default_tpm=settings.GEMINI_TPM_LIMIT,
+            model_limits=parse_rate_limits(settings.GEMINI_MODEL_RATE_LIMITS),
+        )
+    return _rate_limiter
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Get or create the retry policy."""
+    global _retry_policy
+    if _retry_policy is None:
+        _retry_policy = RetryPolicy(
+            max_retries=settings.GEMINI_MAX_RETRIES,
+            base_delay=settings.GEMINI_RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.GEMINI_RETRY_MAX_DELAY_SECONDS,
+        )
+    return _retry_policy
+
+
+def get_scheduling_stats() -> dict:
+    """Métricas de concurrencia, cuota y reintentos para el dashboard."""
+    return {
+        "concurrency": get_gemini_governor().get_stats(),
+        "rate_limits": get_rate_limiter().get_stats(),
+        "retries": get_retry_policy().stats.to_dict(),
+    }
@@ -0,0 +1,184 @@
+"""
+Cascada de modelos para el análisis de RFPs.
+
+El modo `cascade` ejecuta primero el tier barato (Flash) y evalúa el resultado
+con tres señales:
+
+- Confianza: `confidence_score` (0-100) o `team_estimation.confidence` (0-1)
+  reportados por el propio modelo
+- Completitud: campos clave del análisis con contenido
+- Validez: el JSON cumple el `response_schema` (tipos, enums y requeridos)
+
+Si el puntaje queda bajo GEMINI_CASCADE_THRESHOLD se escala al tier siguiente
+(Pro). Cada resultado registra qué tier lo sirvió para medir en el dashboard
+cuántos análisis resuelve Flash.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Any
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Pesos del puntaje compuesto
+CONFIDENCE_WEIGHT = 0.4
+COMPLETENESS_WEIGHT = 0.4
+VALIDITY_WEIGHT = 0.2
+
+# Errores de schema tolerados antes de que la validez llegue a 0
+MAX_SCHEMA_ERRORS = 10
+
+# Campos que un análisis de RFP útil debe traer con contenido
+KEY_FIELDS = (
+    "title",
+    "client_name",
+    "summary",
+    "category",
+    "tech_stack",
+    "team_estimation",
+    "cost_estimation",
+    "risks",
+    "recommendation",
+    "recommendation_reasons",
+)
+
+SCHEMA_TYPES: dict[str, tuple[type, ...]] = {
+    "STRING": (str,),
+    "NUMBER": (int, float),
+    "INTEGER": (int,),
+    "BOOLEAN": (bool,),
+    "ARRAY": (list,),
+    "OBJECT": (dict,),
+}
+
+
+def validate_against_schema(value: Any, schema: dict[str, Any], path: str = "$") -> list[str]:
+    """Lista de errores de `value` contra un schema de Gemini (vacía si es válido)."""
+    if value is None:
+        return [] if schema.get("nullable") else [f"{path}: nulo"]
+
+    expected = SCHEMA_TYPES.get(schema.get("type", ""))
+    # bool es subclase de int: no cuenta como número
+    if expected and (not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected)):
+        return [f"{path}: se esperaba {schema['type']}"]
+
+    errors: list[str] = []
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: valor fuera del enum ({value!r})")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: menor que {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: mayor que {schema['maximum']}")
+    if isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate_against_schema(item, schema["items"], f"{path}[{i}]"))
+    if isinstance(value, dict):
+        for name in schema.get("required", []):
+            if value.get(name) is None:
+                errors.append(f"{path}.{name}: requerido")
+        for name, sub_schema in schema.get("properties", {}).items():
+            if name in value and value[name] is not None:
+                errors.extend(validate_against_schema(value[name], sub_schema, f"{path}.{name}"))
+    return errors
+
+
+def _filled(value: Any) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, (str, list, dict)):
+        return bool(value)
+    return True
+
+
+def _confidence(result: dict[str, Any]) -> float:
+    """
+    Confianza reportada por el modelo, normalizada a 0-1 (0 si no viene).
+
+    `confidence_score` es un entero 0-100 (un 1 es 1%, no 100%);
+    `team_estimation.confidence` ya viene en 0-1.
+    """
+    score = result.get("confidence_score")
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        return max(0.0, min(1.0, score / 100))
+    team = result.get("team_estimation")
+    if isinstance(team, dict) and isinstance(team.get("confidence"), (int, float)):
+        return max(0.0, min(1.0, float(team["confidence"])))
+    return 0.0
+
+
+@dataclass
+class CascadeScore:
+    """Evaluación del resultado de un tier."""
+    score: float
+    confidence: float = 0.0
+    completeness: float = 0.0
+    validity: float = 0.0
+    schema_errors: list[str] = field(default_factory=list)
+
+
+def score_analysis(result: Any, schema: dict[str, Any] | None = None) -> CascadeScore:
+    """Puntaje 0-1 de un resultado; un error o un requerido faltante puntúan 0."""
+    if not isinstance(result, dict) or "error" in result:
+        return CascadeScore(score=0.0, schema_errors=["respuesta inválida"])
+
+    errors = validate_against_schema(result, schema) if schema else []
+    confidence = _confidence(result)
+    fields = [name for name in KEY_FIELDS if not schema or name in schema.get("properties", {})]
+    if not fields and schema:
+        fields = list(schema.get("required", []))
+    completeness = sum(_filled(result.get(name)) for name in fields) / len(fields) if fields else 1.0
+    validity = max(0.0, 1 - len(errors) / MAX_SCHEMA_ERRORS)
+
+    score = (
+        CONFIDENCE_WEIGHT * confidence
+        + COMPLETENESS_WEIGHT * completeness
+        + VALIDITY_WEIGHT * validity
+    )
+    if any(error.endswith("requerido") for error in errors):
+        score = 0.0
+    return CascadeScore(
+        score=score,
+        confidence=confidence,
+        completeness=completeness,
+        validity=validity,
+        schema_errors=errors,
+    )
+
+
+@dataclass
+class CascadeStats:
+    """Métricas de la cascada: qué tier sirvió cada análisis."""
+    requests: int = 0
+    escalations: int = 0
+    served_by: dict[str, int] = field(default_factory=dict)
+    score_total: float = 0.0
+    tier_failures: int = 0
+
+    def record(self, tier: str, first_score: CascadeScore, escalated: bool) -> None:
+        self.requests += 1
+        self.served_by[tier] = self.served_by.get(tier, 0) + 1
+        self.score_total += first_score.score
+        if escalated:
+            self.escalations += 1
+
+    def to_dict(self) -> dict:
+        return {
+            "threshold": settings.GEMINI_CASCADE_THRESHOLD,
+            "requests": self.requests,
+            "served_by": dict(self.served_by),
+            "escalations": self.escalations,
+            "escalation_rate": self.escalations / self.requests * 100 if self.requests else 0,
+            "tier_failures": self.tier_failures,
+            "avg_first_tier_score": round(self.score_total / self.requests, 3) if self.requests else 0,
+        }
+
+
+# Métricas globales de la cascada
+cascade_stats = CascadeStats()
+
+
+def should_escalate(score: CascadeScore) -> bool:
+    """Indica si el resultado de un tier debe escalar al siguiente."""
+    return score.score < settings.GEMINI_CASCADE_THRESHOLD
@@ -0,0 +1,142 @@
+"""
+Contexto compacto del RFP para los prompts de seguimiento.
+
+El `extracted_data` guardado incluye metadatos internos (`_grounding_metadata`,
+`_cascade`, `_map_reduce`...), los candidatos de `suggested_team`, tarifas de
+mercado y tablas de costos. Reenviarlo completo (y con `indent=2`) en cada
+llamada de seguimiento multiplica los tokens de entrada sin mejorar la
+respuesta. Aquí cada prompt declara:
+
+- Los campos que necesita, en orden de prioridad
+- Un tope de tokens: los campos que no caben se recortan (listas y textos)
+  o se omiten, empezando por los de menor prioridad
+
+El JSON se serializa sin espacios y con los campos en el orden del perfil,
+de modo que el mismo análisis produce siempre el mismo texto (claves de caché
+y caching de prefijo).
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from core.gcp.gemini_governor import estimate_tokens
+
+# Largo máximo de cualquier texto dentro del contexto
+MAX_STRING_CHARS = 1500
+
+# Campos de cada perfil solicitado que se conservan
+ROLE_FIELDS = ("title", "quantity", "seniority", "dedication", "required_skills", "required_certifications")
+
+
+@dataclass(frozen=True)
+class PromptProfile:
+    """Campos (en orden de prioridad) y tope de tokens de un prompt."""
+    fields: tuple[str, ...]
+    max_tokens: int
+
+
+_BASE_FIELDS = (
+    "title",
+    "client_name",
+    "client_acronym",
+    "country",
+    "category",
+    "summary",
+    "budget",
+    "proposal_deadline",
+    "questions_deadline",
+    "project_duration",
+    "tech_stack",
+    "team_proposal",
+    "team_estimation",
+    "experience_required",
+    "sla",
+    "penalties",
+    "risks",
+)
+
+PROMPT_PROFILES: dict[str, PromptProfile] = {
+    # Preguntas al cliente: alcance, plazos, presupuesto y lo que falta o es ambiguo
+    "questions": PromptProfile(fields=_BASE_FIELDS, max_tokens=3000),
+}
+
+
+def _team_estimation(value: dict[str, Any]) -> dict[str, Any]:
+    roles = [
+        {name: role.get(name) for name in ROLE_FIELDS}
+        for role in value.get("roles") or [] if isinstance(role, dict)
+    ]
+    return {
+        "source": value.get("source"),
+        "total_headcount": value.get("total_headcount"),
+        "roles": roles,
+    }
+
+
+# Proyección de campos con detalle que los prompts de seguimiento no usan
+# (tarifas de mercado, justificaciones)
+FIELD_PROJECTIONS: dict[str, Callable[[dict[str, Any]], dict[str, Any]]] = {
+    "team_estimation": _team_estimation,
+}
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _prune(value: Any) -> Any:
+    """Quita claves internas (`_x`), valores vacíos y acorta textos largos."""
+    if isinstance(value, dict):
+        pruned = {k: _prune(v) for k, v in value.items() if not str(k).startswith("_")}
+        return {k: v for k, v in pruned.items() if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        items = [_prune(v) for v in value]
+        return [v for v in items if v not in (None, "", [], {})]
+    if isinstance(value, str) and len(value) > MAX_STRING_CHARS:
+        return value[:MAX_STRING_CHARS].rstrip() + "…"
+    return value
+
+
+def _fit(name: str, value: Any, budget: int) -> Any:
+    """El valor recortado para caber en `budget` tokens (None si no cabe)."""
+    if estimate_tokens(_dumps({name: value})) <= budget:
+        return value
+    if isinstance(value, list):
+        # Se conservan los primeros elementos (los más relevantes del análisis)
+        for size in range(len(value) - 1, 0, -1):
+            if estimate_tokens(_dumps({name: value[:size]})) <= budget:
+                return value[:size]
+        return None
+    if isinstance(value, str):
+        chars = (budget - estimate_tokens(_dumps({name: ""}))) * 4
+        return value[:chars].rstrip() + "…" if chars > 0 else None
+    return None
+
+
+def build_prompt_context(data: dict[str, Any] | None, prompt: str) -> str:
+    """
+    JSON compacto con los campos del análisis que necesita `prompt`.
+
+    Args:
+        data: `extracted_data` del RFP
+        prompt: Nombre del perfil en PROMPT_PROFILES
+    """
+    profile = PROMPT_PROFILES[prompt]
+    if not data:
+        return "{}"
+    selected: dict[str, Any] = {}
+    used = estimate_tokens("{}")
+    for name in profile.fields:
+        value = data.get(name)
+        projection = FIELD_PROJECTIONS.get(name)
+        if projection and isinstance(value, dict):
+            value = projection(value)
+        value = _prune(value)
+        if value in (None, "", [], {}):
+            continue
+        value = _fit(name, value, profile.max_tokens - used)
+        if value is None:
+            continue
+        selected[name] = value
+        used = estimate_tokens(_dumps(selected))
+    return _dumps(selected)
@@ -0,0 +1,245 @@
+"""
+Schemas de salida estructurada (`response_schema`) para Gemini.
+
+Con `response_schema` el modelo genera JSON que ya cumple el formato, por lo
+que no hace falta recuperar JSON de texto libre. Los schemas reflejan los
+formatos descritos en los prompts (prompts/*.txt); un campo que no esté aquí
+no será generado, así que cualquier campo nuevo del prompt debe agregarse.
+"""
+from typing import Any
+
+# Modelos que aceptan response_schema junto con herramientas (Google Search)
+SCHEMA_WITH_TOOLS_PREFIXES = ("gemini-3",)
+
+
+def supports_response_schema(model: str, with_tools: bool = False) -> bool:
+    """Indica si se puede enviar response_schema a este modelo."""
+    if not with_tools:
+        return True
+    return model.startswith(SCHEMA_WITH_TOOLS_PREFIXES)
+
+
+def _str(enum: list[str] | None = None) -> dict[str, Any]:
+    schema: dict[str, Any] = {"type": "STRING", "nullable": True}
+    if enum:
+        schema["enum"] = enum
+    return schema
+
+
+def _num() -> dict[str, Any]:
+    return {"type": "NUMBER", "nullable": True}
+
+
+def _int() -> dict[str, Any]:
+    return {"type": "INTEGER", "nullable": True}
+
+
+def _bool() -> dict[str, Any]:
+    return {"type": "BOOLEAN", "nullable": True}
+
+
+def _arr(items: dict[str, Any]) -> dict[str, Any]:
+    return {"type": "ARRAY", "items": items}
+
+
+def _obj(properties: dict[str, Any], required: list[str] | None = None) -> dict[str, Any]:
+    schema: dict[str, Any] = {"type": "OBJECT", "properties": properties, "nullable": True}
+    if required:
+        schema["required"] = required
+        schema["nullable"] = False
+    return schema
+
+
+SCENARIOS = ["A", "B", "C", "D"]
+
+MARKET_RATE_SCHEMA = _obj({
+    "min": _num(),
+    "max": _num(),
+    "average": _num(),
+    "currency": _str(),
+    "period": _str(),
+    "source": _str(),
+})
+
+TEAM_ROLE_SCHEMA = _obj({
+    "role_id": _str(),
+    "title": _str(),
+    "quantity": _int(),
+    "seniority": _str(["junior", "mid", "senior", "lead"]),
+    "required_skills": _arr(_str()),
+    "required_certifications": _arr(_str()),
+    "dedication": _str(["full_time", "part_time"]),
+    "duration_months": _num(),
+    "market_rate": MARKET_RATE_SCHEMA,
+    "subtotal_monthly": _num(),
+    "justification": _str(),
+}, required=["title", "quantity"])
+
+BUDGET_SCHEMA = _obj({
+    "amount_min": _num(),
+    "amount_max": _num(),
+    "currency": _str(),
+    "notes": _str(),
+    "is_specified": _bool(),
+})
+
+TEAM_ESTIMATION_SCHEMA = _obj({
+    "source": _str(["client_specified", "ai_estimated"]),
+    "scenario": _str(SCENARIOS),
+    "confidence": _num(),
+    "roles": _arr(TEAM_ROLE_SCHEMA),
+    "total_headcount": _int(),
+    "rationale": _str(),
+})
+
+COST_ESTIMATION_SCHEMA = _obj({
+    "scenario": _str(SCENARIOS),
+    "scenario_description": _str(),
+    "monthly_base": _num(),
+    "currency": _str(),
+    "source": _str(),
+    "breakdown": _arr(_obj({
+        "role": _str(),
+        "quantity": _num(),
+        "monthly_rate": _num(),
+        "subtotal": _num(),
+    })),
+    "margin_percent": _num(),
+    "margin_amount": _num(),
+    "suggested_monthly": _num(),
+    "duration_months": _num(),
+    "suggested_total": _num(),
+    "viability": _obj({
+        "client_budget": _num(),
+        "required_budget": _num(),
+        "gap": _num(),
+        "gap_percent": _num(),
+        "is_viable": _bool(),
+        "assessment": _str(["under_budget", "viable", "over_budget", "needs_review"]),
+        "recommendations": _arr(_str()),
+    }),
+})
+
+EXPERIENCE_REQUIRED_SCHEMA = _obj({
+    "required": _bool(),
+    "details": _str(),
+    "is_mandatory": _bool(),
+})
+
+SLA_SCHEMA = _obj({
+    "description": _str(),
+    "metric": _str(),
+    "is_aggressive": _bool(),
+})
+
+PENALTY_SCHEMA = _obj({
+    "description": _str(),
+    "amount": _str(),
+    "is_high": _bool(),
+})
+
+RISK_SCHEMA = _obj({
+    "category": _str(),
+    "description": _str(),
+    "severity": _str(["low", "medium", "high", "critical"]),
+})
+
+CATEGORIES = [
+    "mantencion_aplicaciones", "desarrollo_software", "analitica",
+    "ia_chatbot", "ia_documentos", "ia_video", "otro",
+]
+
+RECOMMENDATIONS = ["strong_go", "go", "conditional_go", "no_go", "strong_no_go"]
+
+RECOMMENDED_ISO_SCHEMA = _obj({
+    "id": _str(),
+    "level": _str(["high", "medium", "low"]),
+})
+
+RFP_ANALYSIS_SCHEMA = _obj({
+    "title": _str(),
+    "client_name": _str(),
+    "client_acronym": _str(),
+    "country": _str(),
+    "summary": _str(),
+    "category": _str(CATEGORIES),
+    "budget": BUDGET_SCHEMA,
+    "proposal_deadline": _str(),
+    "questions_deadline": _str(),
+    "project_duration": _str(),
+    "tech_stack": _arr(_str()),
+    "team_proposal": _obj({
+        "suggested": _bool(),
+        "details": _str(),
+    }),
+    "team_estimation": TEAM_ESTIMATION_SCHEMA,
+    "cost_estimation": COST_ESTIMATION_SCHEMA,
+    "experience_required": EXPERIENCE_REQUIRED_SCHEMA,
+    "sla": _arr(SLA_SCHEMA),
+    "penalties": _arr(PENALTY_SCHEMA),
+    "risks": _arr(RISK_SCHEMA),
+    "recommendation": _str(RECOMMENDATIONS),
+    "recommendation_reasons": _arr(_str()),
+    "confidence_score": _int(),
+    "recommended_isos": _arr(RECOMMENDED_ISO_SCHEMA),
+}, required=["summary", "recommendation", "confidence_score"])
+
+# Map-reduce: datos parciales de una sección (prompts/rfp_section_extraction.txt)
+RFP_SECTION_SCHEMA = _obj({
+    "section_summary": _str(),
+    "title": _str(),
+    "client_name": _str(),
+    "client_acronym": _str(),
+    "country": _str(),
+    "budget": BUDGET_SCHEMA,
+    "proposal_deadline": _str(),
+    "questions_deadline": _str(),
+    "project_duration": _str(),
+    "scope_points": _arr(_str()),
+    "tech_stack": _arr(_str()),
+    "team_requirements": _arr(_obj({
+        "title": _str(),
+        "quantity": _int(),
+        "seniority": _str(["junior", "mid", "senior", "lead"]),
+        "required_skills": _arr(_str()),
+        "required_certifications": _arr(_str()),
+    }, required=["title"])),
+    "experience_required": EXPERIENCE_REQUIRED_SCHEMA,
+    "sla": _arr(SLA_SCHEMA),
+    "penalties": _arr(PENALTY_SCHEMA),
+    "risks": _arr(RISK_SCHEMA),
+}, required=["section_summary"])
+
+# Map-reduce: síntesis final sobre los datos consolidados (prompts/rfp_synthesis.txt)
+RFP_SYNTHESIS_SCHEMA = _obj({
+    "summary": _str(),
+    "category": _str(CATEGORIES),
+    "team_estimation": TEAM_ESTIMATION_SCHEMA,
+    "cost_estimation": COST_ESTIMATION_SCHEMA,
+    "recommendation": _str(RECOMMENDATIONS),
+    "recommendation_reasons": _arr(_str()),
+    "confidence_score": _int(),
+    "recommended_isos": _arr(RECOMMENDED_ISO_SCHEMA),
+}, required=["summary", "recommendation", "confidence_score"])
+
+QUESTIONS_SCHEMA = _obj({
+    "questions": _arr(_obj({
+        "question": _str(),
+        "category": _str(["scope", "technical", "commercial", "timeline", "team", "sla", "legal"]),
+        "priority": _str(["high", "medium", "low"]),
+        "context": _str(),
+        "why_important": _str(),
+    }, required=["question", "category", "priority"])),
+}, required=["questions"])
+
+EXPERIENCE_RELEVANCE_SCHEMA = _arr(_obj({
+    "experience_id": _str(),
+    "score": {"type": "NUMBER", "minimum": 0, "maximum": 1},
+    "reason": _str(),
+}, required=["experience_id", "score"]))
+
+CHAPTER_RELEVANCE_SCHEMA = _arr(_obj({
+    "chapter_id": _str(),
+    "score": {"type": "NUMBER", "minimum": 0, "maximum": 1},
+    "reason": _str(),
+}, required=["chapter_id", "score"]))
@@ -0,0 +1,90 @@
+"""
+Coalescing (single-flight) de llamadas idénticas a Gemini en curso.
+
+Si dos requests disparan la misma llamada (mismo modelo, configuración, prompt
+y contenido) mientras la primera sigue en vuelo -doble submit del frontend,
+dos usuarios regenerando preguntas del mismo RFP- la segunda espera el
+resultado de la primera en vez de pagar otra llamada.
+
+- La llamada corre en su propia tarea: si el request que la originó se
+  cancela, los demás que la esperan igual reciben el resultado
+- Cada llamador recibe una copia del resultado (pueden mutarlo sin afectarse)
+- Los errores se propagan a todos los que esperaban
+- Complementa la caché de respuestas: la caché sirve llamadas ya terminadas,
+  el coalescing las que aún están en curso
+"""
+import asyncio
+import copy
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable
+
+from core.gcp.gemini_cache import make_cache_key
+
+logger = logging.getLogger(__name__)
+
+
+def make_flight_key(operation: str, model: str, config: dict[str, Any], prompt: str, content: Any = "") -> str:
+    """Clave de coalescing: operación + (modelo, config, hash de prompt y contenido)."""
+    return make_cache_key(model, {"operation": operation, **config}, prompt, content)
+
+
+@dataclass
+class SingleFlightStats:
+    """Llamadas ejecutadas vs. llamadas que se unieron a una en curso."""
+    executed: int = 0
+    coalesced: int = 0
+    by_operation: dict[str, dict[str, int]] = field(default_factory=dict)
+
+    def record(self, operation: str, coalesced: bool) -> None:
+        counters = self.by_operation.setdefault(operation, {"executed": 0, "coalesced": 0})
+        if coalesced:
+            self.coalesced += 1
+            counters["coalesced"] += 1
+        else:
+            self.executed += 1
+            counters["executed"] += 1
+
+    def to_dict(self) -> dict:
+        total = self.executed + self.coalesced
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "coalescing_rate": self.coalesced / total * 100 if total else 0,
+            "by_operation": {name: dict(counters) for name, counters in self.by_operation.items()},
+        }
+
+
+class SingleFlight:
+    """Registro de llamadas en vuelo por clave."""
+
+    def __init__(self):
+        self.stats = SingleFlightStats()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            self._inflight.pop(key, None)
+        # Marca la excepción como recuperada aunque nadie siga esperando
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, key: str, operation: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        """Ejecuta `call` o se une a la llamada en curso con la misma clave."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.stats.record(operation, coalesced=False)
+        else:
+            self.stats.record(operation, coalesced=True)
+            logger.info(f"🔗 GEMINI COALESCED | {operation} | esperando llamada idéntica en curso")
+        return copy.deepcopy(await asyncio.shield(task))
+
+    def get_stats(self) -> dict:
+        return {**self.stats.to_dict(), "in_flight": len(self._inflight)}
+
+
+# Registro global de llamadas en vuelo
+single_flight = SingleFlight()
@@ -71,6 +71,29 @@ class StorageClient:
             logger.error(f"Failed to upload file to GCS: {e}")
             raise
     
+    def upload_to_uri(self, gcs_uri: str, file_content: bytes, content_type: str) -> str:
+        """
+        Sube contenido a un URI exacto (p. ej. un archivo asociado a otro ya subido).
+        
+        Args:
+            gcs_uri: URI destino (gs://bucket/path/file)
+            file_content: Contenido en bytes
+            content_type: Tipo MIME
+            
+        Returns:
+            El mismo URI
+        """
+        try:
+            blob_name = gcs_uri.replace(f"gs://{self.bucket_name}/", "")
+            blob = self.bucket.blob(blob_name)
+            blob.upload_from_string(file_content, content_type=content_type)
+            logger.info(f"File uploaded successfully: {gcs_uri}")
+            return gcs_uri
+            
+        except GoogleCloudError as e:
+            logger.error(f"Failed to upload file to GCS: {e}")
+            raise
+    
     def download_file(self, gcs_uri: str) -> bytes:
         """
         Descarga un archivo desde Cloud Storage.
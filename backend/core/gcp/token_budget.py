@@ -0,0 +1,198 @@
+"""
+Presupuesto de tokens previo a analizar un RFP.
+
+Antes de llamar a Gemini se estima (o cuenta con la API) el tamaño del prompt
+más el documento y se elige la estrategia:
+
+- single: el documento completo en una sola llamada
+- section_selective: solo las secciones más relevantes que caben en el presupuesto
+- map_reduce: el documento se procesa por secciones y se combina
+
+Sobre RFP_MAX_DOCUMENT_TOKENS el documento se rechaza de inmediato
+(DocumentTooLargeError -> HTTP 413) en vez de gastar minutos en una llamada
+que fallará o quedará truncada.
+
+Las llamadas reales reportan los tokens de entrada; la relación real/estimado
+se acumula para calibrar las estimaciones siguientes.
+"""
+import logging
+from dataclasses import dataclass, field
+from typing import Literal
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Strategy = Literal["single", "section_selective", "map_reduce"]
+
+# Ventana de contexto y salida máxima por modelo (tokens)
+MODEL_LIMITS = {
+    "gemini-3-pro-preview": {"context": 1_048_576, "output": 65_536},
+    "gemini-3-flash-preview": {"context": 1_048_576, "output": 65_536},
+    "default": {"context": 1_048_576, "output": 8_192},
+}
+
+# Documentos desde este tamaño generan análisis más largos (más riesgos, SLAs, roles)
+LARGE_DOCUMENT_TOKENS = 60_000
+LARGE_DOCUMENT_OUTPUT_TOKENS = 16_384
+
+# Muestras mínimas antes de aplicar la calibración a las estimaciones
+MIN_CALIBRATION_SAMPLES = 5
+
+
+class DocumentTooLargeError(ValueError):
+    """El documento supera el máximo de tokens que se acepta analizar."""
+
+    def __init__(self, tokens: int, limit: int):
+        self.tokens = tokens
+        self.limit = limit
+        super().__init__(
+            f"El documento tiene ~{tokens:,} tokens y el máximo soportado es {limit:,}. "
+            "Divide el RFP en documentos más pequeños."
+        )
+
+
+@dataclass
+class TokenPlan:
+    """Resultado del pre-flight de un análisis."""
+    strategy: Strategy
+    model: str
+    prompt_tokens: int
+    document_tokens: int
+    input_budget: int
+    max_output_tokens: int
+    counted: bool = False  # True si los tokens vienen de count_tokens (no estimados)
+
+    @property
+    def input_tokens(self) -> int:
+        return self.prompt_tokens + self.document_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "document_tokens": self.document_tokens,
+            "input_budget": self.input_budget,
+            "max_output_tokens": self.max_output_tokens,
+            "counted": self.counted,
+        }
+
+
+@dataclass
+class TokenBudgetStats:
+    """Planes por estrategia, rechazos y precisión de las estimaciones."""
+    plans: dict[str, int] = field(default_factory=dict)
+    rejected: int = 0
+    samples: int = 0
+    estimated_tokens: int = 0
+    actual_tokens: int = 0
+    abs_error_tokens: int = 0
+
+    def record_plan(self, plan: TokenPlan) -> None:
+        self.plans[plan.strategy] = self.plans.get(plan.strategy, 0) + 1
+
+    def record_usage(self, estimated: int, actual: int) -> None:
+        """Registra tokens estimados vs. reales de una llamada."""
+        if estimated <= 0 or actual <= 0:
+            return
+        self.samples += 1
+        self.estimated_tokens += estimated
+        self.actual_tokens += actual
+        self.abs_error_tokens += abs(actual - estimated)
+
+    @property
+    def calibration(self) -> float:
+        """Factor real/estimado (1.0 hasta tener muestras suficientes)."""
+        if self.samples < MIN_CALIBRATION_SAMPLES or not self.estimated_tokens:
+            return 1.0
+        return min(2.0, max(0.5, self.actual_tokens / self.estimated_tokens))
+
+    def to_dict(self) -> dict:
+        return {
+            "plans": dict(self.plans),
+            "rejected": self.rejected,
+            "estimate_samples": self.samples,
+            "estimated_tokens": self.estimated_tokens,
+            "actual_tokens": self.actual_tokens,
+            "mean_abs_error_pct": (
+                round(self.abs_error_tokens / self.actual_tokens * 100, 2) if self.actual_tokens else 0
+            ),
+            "calibration": round(self.calibration, 3),
+        }
+
+
+# Métricas globales del presupuesto de tokens
+token_budget_stats = TokenBudgetStats()
+
+
+def calibrated(estimated: int) -> int:
+    """Aplica la calibración acumulada a una estimación de tokens."""
+    return int(estimated * token_budget_stats.calibration)
+
+
+def needs_exact_count(estimated: int) -> bool:
+    """
+    Indica si conviene contar tokens con la API: solo cuando la estimación cae
+    cerca (±25%) de algún umbral y podría cambiar la estrategia.
+    """
+    thresholds = (
+        settings.RFP_SINGLE_CALL_MAX_TOKENS,
+        settings.RFP_SELECTIVE_MAX_TOKENS,
+        settings.RFP_MAX_DOCUMENT_TOKENS,
+    )
+    return any(0.75 * limit <= estimated <= 1.25 * limit for limit in thresholds)
+
+
+def plan_analysis(
+    model: str,
+    prompt_tokens: int,
+    document_tokens: int,
+    mode_max_output_tokens: int,
+    counted: bool = False,
+) -> TokenPlan:
+    """
+    Elige estrategia y max_output_tokens para analizar un documento.
+
+    Raises:
+        DocumentTooLargeError: si el documento supera RFP_MAX_DOCUMENT_TOKENS
+    """
+    if document_tokens > settings.RFP_MAX_DOCUMENT_TOKENS:
+        token_budget_stats.rejected += 1
+        raise DocumentTooLargeError(document_tokens, settings.RFP_MAX_DOCUMENT_TOKENS)
+
+    limits = MODEL_LIMITS.get(model, MODEL_LIMITS["default"])
+    max_output_tokens = mode_max_output_tokens
+    if document_tokens >= LARGE_DOCUMENT_TOKENS:
+        max_output_tokens = max(max_output_tokens, LARGE_DOCUMENT_OUTPUT_TOKENS)
+    max_output_tokens = min(max_output_tokens, limits["output"])
+
+    # El documento debe caber junto al prompt y la salida en la ventana del modelo
+    input_budget = min(
+        settings.RFP_SINGLE_CALL_MAX_TOKENS,
+        limits["context"] - max_output_tokens,
+    ) - prompt_tokens
+
+    if document_tokens <= input_budget:
+        strategy: Strategy = "single"
+    elif document_tokens <= settings.RFP_SELECTIVE_MAX_TOKENS:
+        strategy = "section_selective"
+    else:
+        strategy = "map_reduce"
+
+    plan = TokenPlan(
+        strategy=strategy,
+        model=model,
+        prompt_tokens=prompt_tokens,
+        document_tokens=document_tokens,
+        input_budget=max(input_budget, 0),
+        max_output_tokens=max_output_tokens,
+        counted=counted,
+    )
+    token_budget_stats.record_plan(plan)
+    logger.info(
+        f"Pre-flight: ~{plan.input_tokens:,} tokens de entrada "
+        f"({'contados' if counted else 'estimados'}) -> {strategy}, "
+        f"max_output_tokens={max_output_tokens:,}"
+    )
+    return plan
@@ -0,0 +1,184 @@
+"""
+Combinación determinista de análisis parciales por sección (map-reduce).
+
+Cada sección de un RFP largo se extrae por separado (RFP_SECTION_SCHEMA). Aquí
+se combinan los resultados sin llamar al modelo:
+
+- Datos únicos (título, cliente, fechas, duración): el primero no vacío en el
+  orden del documento
+- Presupuesto: el primero con montos; si no hay, el primero marcado como
+  especificado
+- Listas (tecnologías, alcance, SLAs, multas, riesgos): unión sin duplicados
+  preservando el orden
+- Perfiles solicitados: unión por título, conservando la mayor cantidad
+- Experiencia requerida: basta que una sección la exija
+
+El resultado es el insumo de la llamada de síntesis y aporta los campos
+factuales del análisis final.
+"""
+import re
+import unicodedata
+from typing import Any
+
+SCALAR_FIELDS = (
+    "title",
+    "client_name",
+    "client_acronym",
+    "country",
+    "proposal_deadline",
+    "questions_deadline",
+    "project_duration",
+)
+
+# Campos que la síntesis aporta al análisis final
+SYNTHESIS_FIELDS = (
+    "summary",
+    "category",
+    "team_estimation",
+    "cost_estimation",
+    "recommendation",
+    "recommendation_reasons",
+    "confidence_score",
+    "recommended_isos",
+)
+
+SEVERITY_ORDER = {"low": 0, "medium": 1, "high": 2, "critical": 3}
+
+
+def _normalize(value: Any) -> str:
+    """Clave de comparación: minúsculas, sin acentos ni puntuación."""
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore").decode()
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _unique(values: list[Any], key=_normalize) -> list[Any]:
+    seen: set[str] = set()
+    result = []
+    for value in values:
+        marker = key(value)
+        if not marker or marker in seen:
+            continue
+        seen.add(marker)
+        result.append(value)
+    return result
+
+
+def _items(results: list[dict[str, Any]], name: str) -> list[Any]:
+    items: list[Any] = []
+    for result in results:
+        value = result.get(name)
+        if isinstance(value, list):
+            items.extend(value)
+    return items
+
+
+def _merge_budget(results: list[dict[str, Any]]) -> dict[str, Any] | None:
+    budgets = [r["budget"] for r in results if isinstance(r.get("budget"), dict)]
+    for budget in budgets:
+        if budget.get("amount_min") is not None or budget.get("amount_max") is not None:
+            return {**budget, "is_specified": True}
+    for budget in budgets:
+        if budget.get("is_specified"):
+            return budget
+    return budgets[0] if budgets else None
+
+
+def _merge_team(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    roles: dict[str, dict[str, Any]] = {}
+    for role in _items(results, "team_requirements"):
+        if not isinstance(role, dict) or not role.get("title"):
+            continue
+        key = _normalize(role["title"])
+        current = roles.get(key)
+        if current is None:
+            roles[key] = dict(role)
+            continue
+        current["quantity"] = max(current.get("quantity") or 0, role.get("quantity") or 0) or None
+        for name in ("required_skills", "required_certifications"):
+            current[name] = _unique((current.get(name) or []) + (role.get(name) or []))
+        current["seniority"] = current.get("seniority") or role.get("seniority")
+    return list(roles.values())
+
+
+def _merge_experience(results: list[dict[str, Any]]) -> dict[str, Any] | None:
+    experiences = [r["experience_required"] for r in results if isinstance(r.get("experience_required"), dict)]
+    if not experiences:
+        return None
+    details = _unique([e.get("details") for e in experiences if e.get("details")])
+    return {
+        "required": any(e.get("required") for e in experiences),
+        "details": " ".join(details) or None,
+        "is_mandatory": any(e.get("is_mandatory") for e in experiences),
+    }
+
+
+def _merge_risks(results: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    risks = [r for r in _items(results, "risks") if isinstance(r, dict)]
+    risks = _unique(risks, key=lambda r: _normalize(r.get("description")))
+    return sorted(risks, key=lambda r: -SEVERITY_ORDER.get(r.get("severity") or "", -1))
+
+
+def merge_section_results(
+    results: list[dict[str, Any]],
+    titles: list[str] | None = None,
+) -> dict[str, Any]:
+    """
+    Combina los resultados por sección (en el orden del documento).
+
+    Args:
+        results: Salidas de la extracción por sección (las fallidas se omiten)
+        titles: Título de cada sección, para el resumen por sección
+    """
+    titles = titles or [f"Sección {i}" for i in range(1, len(results) + 1)]
+    valid = [(title, r) for title, r in zip(titles, results) if isinstance(r, dict) and "error" not in r]
+    sections = [r for _, r in valid]
+
+    merged: dict[str, Any] = {}
+    for name in SCALAR_FIELDS:
+        merged[name] = next((r[name] for r in sections if r.get(name)), None)
+    merged["budget"] = _merge_budget(sections)
+    merged["tech_stack"] = _unique([t for t in _items(sections, "tech_stack") if isinstance(t, str)])
+    merged["scope_points"] = _unique([p for p in _items(sections, "scope_points") if isinstance(p, str)])
+    merged["team_requirements"] = _merge_team(sections)
+    merged["experience_required"] = _merge_experience(sections)
+    merged["sla"] = _unique(
+        [s for s in _items(sections, "sla") if isinstance(s, dict)],
+        key=lambda s: _normalize(f"{s.get('description')} {s.get('metric')}"),
+    )
+    merged["penalties"] = _unique(
+        [p for p in _items(sections, "penalties") if isinstance(p, dict)],
+        key=lambda p: _normalize(f"{p.get('description')} {p.get('amount')}"),
+    )
+    merged["risks"] = _merge_risks(sections)
+    merged["section_summaries"] = [
+        {"section": title, "summary": r.get("section_summary")}
+        for title, r in valid if r.get("section_summary")
+    ]
+    return merged
+
+
+def build_final_analysis(merged: dict[str, Any], synthesis: dict[str, Any]) -> dict[str, Any]:
+    """Análisis final con el formato de RFP_ANALYSIS_SCHEMA (hechos + síntesis)."""
+    team = merged.get("team_requirements") or []
+    result: dict[str, Any] = {name: merged.get(name) for name in SCALAR_FIELDS}
+    result.update({
+        "budget": merged.get("budget"),
+        "tech_stack": merged.get("tech_stack") or [],
+        "team_proposal": {
+            "suggested": bool(team),
+            "details": "; ".join(
+                f"{role.get('quantity') or 1} x {role['title']}" for role in team
+            ) or None,
+        },
+        "experience_required": merged.get("experience_required"),
+        "sla": merged.get("sla") or [],
+        "penalties": merged.get("penalties") or [],
+        "risks": merged.get("risks") or [],
+    })
+    for name in SYNTHESIS_FIELDS:
+        result[name] = synthesis.get(name)
+    if synthesis.get("_grounding_metadata"):
+        result["_grounding_metadata"] = synthesis["_grounding_metadata"]
+    if synthesis.get("_cascade"):
+        result["_cascade"] = synthesis["_cascade"]
+    return result
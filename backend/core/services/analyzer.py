@@ -3,19 +3,45 @@ Servicio de análisis de RFPs usando Gemini via Google AI API.
 Trabaja con archivos locales extrayendo texto primero.
 Soporta grounding para obtener tarifas de mercado actuales.
 """
+import asyncio
+import json
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Literal
+from typing import Any, AsyncIterator, Literal
 
-from pypdf import PdfReader
 from docx import Document
 import io
 
-from core.gcp.gemini_client import get_gemini_client
+from core.config import settings
+from core.gcp.gemini_client import ANALYSIS_MODES, GROUNDING_MODEL, get_gemini_client
+from core.gcp.gemini_governor import estimate_tokens
+from core.gcp.response_schemas import (
+    CHAPTER_RELEVANCE_SCHEMA,
+    EXPERIENCE_RELEVANCE_SCHEMA,
+    RFP_ANALYSIS_SCHEMA,
+    RFP_SECTION_SCHEMA,
+    RFP_SYNTHESIS_SCHEMA,
+)
+from core.gcp.token_budget import (
+    TokenPlan,
+    calibrated,
+    needs_exact_count,
+    plan_analysis,
+    token_budget_stats,
+)
+from core.services.analysis_merge import build_final_analysis, merge_section_results
+from core.services.certification_catalog import certification_catalog
+from core.services.document_sections import (
+    join_sections,
+    pack_sections,
+    select_sections,
+    split_sections,
+)
+from core.services.pdf_extractor import extract_pdf_text, extract_pdf_text_sync
+from core.services.text_normalizer import normalize_document_text
+from core.services.text_sidecar import load_sidecar, save_sidecar
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from models.certification import Certification
 
 logger = logging.getLogger(__name__)
 
@@ -123,6 +149,18 @@ class RFPAnalyzerService:
         except FileNotFoundError:
             self.questions_prompt = DEFAULT_QUESTIONS_PROMPT
         
+        try:
+            self.section_prompt = load_prompt("rfp_section_extraction")
+        except FileNotFoundError:
+            logger.warning("Section extraction prompt not found, using fallback")
+            self.section_prompt = "Extrae de esta SECCIÓN de un RFP solo los datos que aparecen en ella (cliente, presupuesto, fechas, alcance, tecnologías, perfiles, SLAs, multas, riesgos) en JSON."
+        
+        try:
+            self.synthesis_prompt = load_prompt("rfp_synthesis")
+        except FileNotFoundError:
+            logger.warning("Synthesis prompt not found, using fallback")
+            self.synthesis_prompt = self.analysis_prompt
+        
         try:
             self.certification_prompt = load_prompt("certification_analysis")
         except FileNotFoundError:
@@ -150,7 +188,7 @@ class RFPAnalyzerService:
         Analiza un documento de certificación.
         """
         logger.info(f"Analyzing certification: {filename}")
-        document_text = self.extract_text(content, filename)
+        document_text = await self.extract_text(content, filename)
         
         if not document_text.strip():
             return {"name": filename, "description": "No text extracted"}
@@ -167,7 +205,7 @@ class RFPAnalyzerService:
         Analiza un documento de capítulo.
         """
         logger.info(f"Analyzing chapter: {filename}")
-        document_text = self.extract_text(content, filename)
+        document_text = await self.extract_text(content, filename)
         
         if not document_text.strip():
             return {"name": filename, "description": "No text extracted"}
@@ -187,15 +225,9 @@ class RFPAnalyzerService:
         return self._gemini
     
     def extract_text_from_pdf(self, content: bytes) -> str:
-        """Extrae texto de un PDF."""
+        """Extrae texto de un PDF en el proceso actual (ver pdf_extractor)."""
         try:
-            reader = PdfReader(io.BytesIO(content))
-            text_parts = []
-            for page in reader.pages:
-                text = page.extract_text()
-                if text:
-                    text_parts.append(text)
-            return "\n\n".join(text_parts)
+            return extract_pdf_text_sync(content)
         except Exception as e:
             logger.error(f"Error extracting PDF text: {e}")
             raise
@@ -221,25 +253,274 @@ class RFPAnalyzerService:
             logger.error(f"Error extracting DOCX text: {e}")
             raise
     
-    def extract_text(self, content: bytes, filename: str) -> str:
-        """Extrae texto de un archivo según su extensión."""
+    async def extract_text(self, content: bytes, filename: str) -> str:
+        """
+        Extrae texto de un archivo según su extensión, sin bloquear el event loop.
+        
+        Los PDFs se procesan en el pool de procesos (por rangos de páginas si
+        son grandes) y los DOCX en un thread.
+        """
         filename_lower = filename.lower()
         
         if filename_lower.endswith(".pdf"):
-            return self.extract_text_from_pdf(content)
+            try:
+                return await extract_pdf_text(content)
+            except Exception as e:
+                logger.error(f"Error extracting PDF text: {e}")
+                raise
         elif filename_lower.endswith(".docx"):
-            return self.extract_text_from_docx(content)
+            return await asyncio.to_thread(self.extract_text_from_docx, content)
         else:
             # Asumir texto plano
             return content.decode("utf-8", errors="ignore")
     
+    async def _build_analysis_prompt(self, db: AsyncSession | None = None, template: str | None = None) -> str:
+        """Prompt de análisis (o `template`) con las certificaciones disponibles inyectadas."""
+        prompt_to_use = template or self.analysis_prompt
+        
+        if db:
+            try:
+                # Bloque de certificaciones activas (cacheado y versionado)
+                catalog = await certification_catalog.get(db)
+                prompt_to_use = prompt_to_use.replace("{{available_certifications}}", catalog.text)
+                logger.info(f"Injected {catalog.count} certifications into prompt (catalog v{catalog.version})")
+            except Exception as e:
+                logger.error(f"Error fetching certifications for prompt: {e}")
+                prompt_to_use = prompt_to_use.replace("{{available_certifications}}", "Error al recuperar certificaciones.")
+        else:
+            prompt_to_use = prompt_to_use.replace("{{available_certifications}}", "No disponible (sin conexión a DB).")
+        
+        return prompt_to_use
+    
+    async def _normalize(self, document_text: str) -> tuple[str, dict[str, Any] | None]:
+        """Quita encabezados, pies, índices y párrafos repetidos (ver text_normalizer)."""
+        if not settings.RFP_NORMALIZE_TEXT:
+            return document_text, None
+        normalized, report = await asyncio.to_thread(normalize_document_text, document_text)
+        logger.info(
+            f"Normalización: {report.original_tokens:,} -> {report.normalized_tokens:,} tokens "
+            f"(-{report.saved_pct:.1f}%, {report.repeated_lines} líneas repetidas, "
+            f"{report.duplicate_paragraphs} párrafos duplicados)"
+        )
+        return normalized, report.to_dict()
+    
+    async def prepare_document_text(self, content: bytes, filename: str) -> tuple[str, dict[str, Any] | None]:
+        """
+        Extrae y normaliza el texto de un RFP.
+        
+        Returns:
+            (texto normalizado, reporte de normalización o None si está desactivada)
+        """
+        document_text = await self.extract_text(content, filename)
+        if not document_text.strip():
+            return document_text, None
+        logger.info(f"Extracted {len(document_text)} characters from document")
+        return await self._normalize(document_text)
+    
+    async def load_document_text(self, file_uri: str, filename: str) -> tuple[str, dict[str, Any] | None]:
+        """
+        Texto normalizado de un RFP ya subido.
+        
+        Lee el sidecar `<uri>.text.json.gz` si existe; si no, descarga el
+        original, extrae el texto y deja el sidecar para la próxima vez.
+        """
+        from core.storage import get_storage_service
+        storage = get_storage_service()
+        
+        prepared = await asyncio.to_thread(load_sidecar, storage, file_uri)
+        if prepared is not None:
+            logger.info(f"Texto de {filename} leído desde el sidecar ({len(prepared[0]):,} caracteres)")
+            return prepared
+        
+        content = await asyncio.to_thread(storage.download_file, file_uri)
+        prepared = await self.prepare_document_text(content, filename)
+        if prepared[0].strip():
+            await asyncio.to_thread(save_sidecar, storage, file_uri, *prepared)
+        return prepared
+    
+    async def _preflight(
+        self,
+        prompt: str,
+        document_text: str,
+        analysis_mode: str,
+        use_grounding: bool,
+    ) -> tuple[TokenPlan, str]:
+        """
+        Pre-flight de tokens: elige estrategia y max_output_tokens, y con
+        section_selective recorta el documento a sus secciones más relevantes.
+        
+        Raises:
+            DocumentTooLargeError: si el documento supera RFP_MAX_DOCUMENT_TOKENS
+        """
+        mode_config = ANALYSIS_MODES.get(analysis_mode, ANALYSIS_MODES["balanced"])
+        if use_grounding and analysis_mode != "cascade":
+            model = GROUNDING_MODEL
+        else:
+            model = mode_config["model"]
+        mode_max_output = 16384 if use_grounding else mode_config["max_output_tokens"]
+        
+        prompt_tokens = calibrated(estimate_tokens(prompt))
+        document_tokens = calibrated(estimate_tokens(document_text))
+        counted = False
+        if settings.GEMINI_PREFLIGHT_COUNT_TOKENS and needs_exact_count(document_tokens):
+            exact = await self.gemini.count_tokens(model, document_text)
+            if exact:
+                document_tokens, counted = exact, True
+        
+        plan = plan_analysis(model, prompt_tokens, document_tokens, mode_max_output, counted)
+        if plan.strategy in ("single", "map_reduce"):
+            return plan, document_text
+        
+        # Las secciones se miden con la estimación sin calibrar
+        sections = split_sections(document_text)
+        kept, omitted = select_sections(sections, int(plan.input_budget / token_budget_stats.calibration))
+        logger.info(
+            f"Estrategia {plan.strategy}: se envían {len(kept)} de {len(sections)} secciones "
+            f"({len(omitted)} omitidas)"
+        )
+        return plan, join_sections(kept, omitted)
+    
+    async def _map_reduce_events(
+        self,
+        document_text: str,
+        analysis_mode: str,
+        use_grounding: bool,
+        db: AsyncSession | None,
+        max_output_tokens: int | None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Pipeline map-reduce para RFPs que no caben en una llamada.
+        
+        1. Divide el documento en secciones (títulos y páginas) agrupadas en
+           bloques de ~RFP_MAP_SECTION_TOKENS
+        2. Extrae datos parciales de cada bloque en paralelo con el modelo rápido
+        3. Combina los resultados de forma determinista (analysis_merge)
+        4. Una llamada de síntesis sobre los datos consolidados decide equipo,
+           costos y recomendación
+        
+        La latencia queda dominada por el bloque más lento más la síntesis.
+        Emite progreso por cada bloque terminado y al final {"type": "result"}.
+        """
+        sections = split_sections(document_text, max_section_tokens=settings.RFP_MAP_SECTION_TOKENS)
+        total_tokens = sum(section.tokens for section in sections)
+        target_tokens = max(settings.RFP_MAP_SECTION_TOKENS, -(-total_tokens // settings.RFP_MAP_MAX_SECTIONS))
+        groups = pack_sections(sections, target_tokens)
+        titles = [
+            group[0].title if len(group) == 1 else f"{group[0].title} - {group[-1].title}"
+            for group in groups
+        ]
+        logger.info(f"Map-reduce: {len(sections)} secciones en {len(groups)} bloques de ~{target_tokens:,} tokens")
+        yield {
+            "type": "progress",
+            "stage": "mapping",
+            "message": f"Analizando {len(groups)} secciones en paralelo",
+            "done": 0,
+            "total": len(groups),
+        }
+        
+        async def extract(index: int, group: list) -> tuple[int, dict[str, Any]]:
+            try:
+                result = await self.gemini.analyze_document(
+                    document_content="\n\n".join(section.text for section in group),
+                    prompt=self.section_prompt,
+                    analysis_mode="fast",
+                    response_schema=RFP_SECTION_SCHEMA,
+                    operation="rfp_map_section",
+                )
+            except Exception as e:
+                logger.warning(f"Map-reduce: falló la sección '{titles[index]}': {e}")
+                result = {"error": str(e)}
+            return index, result
+        
+        tasks = [asyncio.create_task(extract(i, group)) for i, group in enumerate(groups)]
+        results: list[dict[str, Any]] = [{} for _ in groups]
+        try:
+            for done, next_result in enumerate(asyncio.as_completed(tasks), start=1):
+                index, result = await next_result
+                results[index] = result
+                yield {
+                    "type": "progress",
+                    "stage": "mapping",
+                    "message": f"Sección {done}/{len(groups)} analizada",
+                    "done": done,
+                    "total": len(groups),
+                }
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        failed = sum(1 for result in results if not isinstance(result, dict) or "error" in result)
+        if failed == len(groups):
+            raise RuntimeError("No se pudo analizar ninguna sección del documento")
+        merged = merge_section_results(results, titles)
+        
+        yield {"type": "progress", "stage": "synthesizing", "message": "Consolidando equipo, costos y recomendación"}
+        prompt_to_use = await self._build_analysis_prompt(db, self.synthesis_prompt)
+        merged_text = json.dumps(merged, ensure_ascii=False, indent=2, default=str)
+        if analysis_mode == "cascade":
+            synthesis = await self.gemini.analyze_cascade(
+                document_content=merged_text,
+                prompt=prompt_to_use,
+                use_grounding=use_grounding,
+                response_schema=RFP_SYNTHESIS_SCHEMA,
+                max_output_tokens=max_output_tokens,
+            )
+        elif use_grounding:
+            synthesis = await self.gemini.analyze_with_grounding(
+                document_content=merged_text,
+                prompt=prompt_to_use,
+                max_output_tokens=max_output_tokens or 16384,
+                response_schema=RFP_SYNTHESIS_SCHEMA,
+                operation="rfp_synthesis",
+            )
+        else:
+            synthesis = await self.gemini.analyze_document(
+                document_content=merged_text,
+                prompt=prompt_to_use,
+                analysis_mode=analysis_mode,
+                response_schema=RFP_SYNTHESIS_SCHEMA,
+                max_output_tokens=max_output_tokens,
+                operation="rfp_synthesis",
+            )
+        
+        result = build_final_analysis(merged, synthesis if isinstance(synthesis, dict) else {})
+        result["_map_reduce"] = {"sections": len(groups), "failed_sections": failed}
+        yield {"type": "result", "data": result}
+    
+    async def analyze_rfp_map_reduce(
+        self,
+        document_text: str,
+        analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced",
+        use_grounding: bool = True,
+        db: AsyncSession | None = None,
+        max_output_tokens: int | None = None,
+    ) -> dict[str, Any]:
+        """
+        Analiza un RFP extenso por secciones (map-reduce, ver _map_reduce_events).
+        
+        Args:
+            document_text: Texto completo extraído del documento
+            analysis_mode: Modo de análisis de la síntesis final
+            use_grounding: Si True, la síntesis usa Google Search para tarifas
+            db: Sesión de base de datos para obtener certificaciones
+            max_output_tokens: Máximo de tokens de salida de la síntesis
+        """
+        result: dict[str, Any] = {}
+        async for event in self._map_reduce_events(
+            document_text, analysis_mode, use_grounding, db, max_output_tokens
+        ):
+            if event["type"] == "result":
+                result = event["data"]
+        return result
+    
     async def analyze_rfp_from_content(
         self, 
         content: bytes, 
         filename: str,
-        analysis_mode: Literal["fast", "balanced", "deep"] = "balanced",
+        analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced",
         use_grounding: bool = True,
         db: AsyncSession | None = None,
+        prepared: tuple[str, dict[str, Any] | None] | None = None,
     ) -> dict[str, Any]:
         """
         Analiza un RFP desde su contenido en bytes.
@@ -247,64 +528,149 @@ class RFPAnalyzerService:
         Args:
             content: Contenido del archivo en bytes
             filename: Nombre del archivo (para determinar tipo)
-            analysis_mode: Modo de análisis (fast/balanced/deep)
+            analysis_mode: Modo de análisis (fast/balanced/deep/cascade)
             use_grounding: Si True, usa Google Search para tarifas de mercado
             db: Sesión de base de datos para obtener certificaciones
+            prepared: Resultado de prepare_document_text si ya se extrajo el
+                texto (p. ej. para calcular el hash de deduplicación)
             
         Returns:
             Datos extraídos del RFP incluyendo team_estimation y cost_estimation
+            
+        Raises:
+            DocumentTooLargeError: si el documento supera el máximo de tokens
         """
         logger.info(f"Starting RFP analysis for: {filename}")
         logger.info(f"Analysis mode: {analysis_mode}, Grounding: {use_grounding}")
         
-        # Extraer texto del documento
-        document_text = self.extract_text(content, filename)
+        # Extraer y normalizar el texto del documento
+        document_text, normalization = prepared or await self.prepare_document_text(content, filename)
         
         if not document_text.strip():
             logger.error("No text extracted from document")
             return {"error": "No se pudo extraer texto del documento"}
         
-        logger.info(f"Extracted {len(document_text)} characters from document")
-        
-        # Preparar prompt con certificaciones si hay DB
-        prompt_to_use = self.analysis_prompt
-        
-        if db:
-            try:
-                # Obtener certificaciones activas
-                result = await db.execute(select(Certification).where(Certification.is_active == True))
-                certs = result.scalars().all()
-                if certs:
-                    cert_list_str = "\n".join([f"- {c.name} (ID: {c.id}): {c.description[:100]}..." for c in certs])
-                    prompt_to_use = prompt_to_use.replace("{{available_certifications}}", cert_list_str)
-                    logger.info(f"Injected {len(certs)} certifications into prompt")
-                else:
-                    prompt_to_use = prompt_to_use.replace("{{available_certifications}}", "No hay certificaciones disponibles.")
-            except Exception as e:
-                logger.error(f"Error fetching certifications for prompt: {e}")
-                prompt_to_use = prompt_to_use.replace("{{available_certifications}}", "Error al recuperar certificaciones.")
-        else:
-            prompt_to_use = prompt_to_use.replace("{{available_certifications}}", "No disponible (sin conexión a DB).")
+        prompt_to_use = await self._build_analysis_prompt(db)
+        plan, analysis_text = await self._preflight(prompt_to_use, document_text, analysis_mode, use_grounding)
 
         # Analizar con Gemini - usar grounding si está habilitado
-        if use_grounding:
+        if plan.strategy == "map_reduce":
+            result = await self.analyze_rfp_map_reduce(
+                document_text,
+                analysis_mode=analysis_mode,
+                use_grounding=use_grounding,
+                db=db,
+                max_output_tokens=plan.max_output_tokens,
+            )
+        elif analysis_mode == "cascade":
+            result = await self.gemini.analyze_cascade(
+                document_content=analysis_text,
+                prompt=prompt_to_use,
+                use_grounding=use_grounding,
+                response_schema=RFP_ANALYSIS_SCHEMA,
+                max_output_tokens=plan.max_output_tokens,
+            )
+        elif use_grounding:
             logger.info("Using Gemini with Google Search Grounding for market rates")
             result = await self.gemini.analyze_with_grounding(
-                document_content=document_text,
+                document_content=analysis_text,
                 prompt=prompt_to_use,
                 temperature=0.1,
-                max_output_tokens=16384,
+                max_output_tokens=plan.max_output_tokens,
+                response_schema=RFP_ANALYSIS_SCHEMA,
             )
         else:
             result = await self.gemini.analyze_document(
-                document_content=document_text,
+                document_content=analysis_text,
                 prompt=prompt_to_use,
                 analysis_mode=analysis_mode,
+                response_schema=RFP_ANALYSIS_SCHEMA,
+                max_output_tokens=plan.max_output_tokens,
             )
         
+        if isinstance(result, dict):
+            result["_token_plan"] = plan.to_dict()
+            if normalization:
+                result["_normalization"] = normalization
         logger.info(f"RFP analysis completed: {result}")
         return result
     
+    async def analyze_rfp_stream(
+        self,
+        content: bytes,
+        filename: str,
+        analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced",
+        use_grounding: bool = True,
+        db: AsyncSession | None = None,
+        prepared: tuple[str, dict[str, Any] | None] | None = None,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Versión streaming de analyze_rfp_from_content.
+        
+        Emite eventos de progreso ({"type": "progress", "stage": ..., "message": ...}),
+        los fragmentos generados por Gemini ({"type": "token", ...}) y por último
+        {"type": "result", "data": dict} con el análisis completo.
+        """
+        if prepared is None:
+            yield {"type": "progress", "stage": "extracting", "message": "Extrayendo texto del documento"}
+        document_text, normalization = prepared or await self.prepare_document_text(content, filename)
+        
+        if not document_text.strip():
+            logger.error("No text extracted from document")
+            yield {"type": "result", "data": {"error": "No se pudo extraer texto del documento"}}
+            return
+        
+        yield {
+            "type": "progress",
+            "stage": "extracted",
+            "message": f"Texto extraído ({len(document_text):,} caracteres)",
+            "chars": len(document_text),
+        }
+        if normalization:
+            yield {
+                "type": "progress",
+                "stage": "normalized",
+                "message": f"Texto normalizado: {normalization['saved_tokens']:,} tokens menos ({normalization['saved_pct']}%)",
+                "saved_tokens": normalization["saved_tokens"],
+            }
+        
+        prompt_to_use = await self._build_analysis_prompt(db)
+        plan, analysis_text = await self._preflight(prompt_to_use, document_text, analysis_mode, use_grounding)
+        yield {
+            "type": "progress",
+            "stage": "planned",
+            "message": f"Documento de ~{plan.input_tokens:,} tokens (estrategia: {plan.strategy})",
+            "strategy": plan.strategy,
+            "tokens": plan.input_tokens,
+        }
+        
+        result: dict[str, Any] = {}
+        if plan.strategy == "map_reduce":
+            events = self._map_reduce_events(
+                document_text, analysis_mode, use_grounding, db, plan.max_output_tokens
+            )
+        else:
+            yield {"type": "progress", "stage": "analyzing", "message": "Analizando documento con Gemini"}
+            events = self.gemini.analyze_document_stream(
+                document_content=analysis_text,
+                prompt=prompt_to_use,
+                analysis_mode=analysis_mode,
+                use_grounding=use_grounding,
+                response_schema=RFP_ANALYSIS_SCHEMA,
+                max_output_tokens=plan.max_output_tokens,
+            )
+        async for event in events:
+            if event["type"] == "result":
+                result = event["data"]
+            else:
+                yield event
+        
+        if isinstance(result, dict):
+            result["_token_plan"] = plan.to_dict()
+            if normalization:
+                result["_normalization"] = normalization
+        yield {"type": "result", "data": result}
+    
     async def analyze_rfp(self, gcs_uri: str, use_grounding: bool = True, db: AsyncSession | None = None) -> dict[str, Any]:
         """
         Analiza un RFP desde GCS o local.
@@ -319,37 +685,30 @@ class RFPAnalyzerService:
         """
         logger.info(f"Starting RFP analysis: {gcs_uri}")
         
-        # Si es un URI local, leer el archivo
-        if gcs_uri.startswith("local://"):
-            from core.storage import get_storage_service
-            storage = get_storage_service()
-            content = storage.download_file(gcs_uri)
-            filename = gcs_uri.split("/")[-1]
-            return await self.analyze_rfp_from_content(
-                content, 
-                filename, 
-                use_grounding=use_grounding,
-                db=db
-            )
-        
-        # Para GCS, descargar y analizar
-        from core.storage import get_storage_service
-        storage = get_storage_service()
-        content = storage.download_file(gcs_uri)
+        # Texto desde el sidecar (sin descargar ni re-extraer el original si ya existe)
         filename = gcs_uri.split("/")[-1]
+        prepared = await self.load_document_text(gcs_uri, filename)
         return await self.analyze_rfp_from_content(
-            content, 
-            filename, 
+            b"",
+            filename,
             use_grounding=use_grounding,
-            db=db
+            db=db,
+            prepared=prepared,
         )
     
-    async def generate_questions(self, rfp_data: dict[str, Any]) -> list[dict[str, Any]]:
+    async def generate_questions(
+        self,
+        rfp_data: dict[str, Any],
+        use_cache: bool = True,
+        rfp_id: Any = None,
+    ) -> list[dict[str, Any]]:
         """
         Genera preguntas basadas en el análisis del RFP.
         
         Args:
             rfp_data: Datos extraídos del análisis
+            use_cache: Si False, fuerza una nueva llamada a Gemini (ignora la caché)
+            rfp_id: ID del RFP para reutilizar su contexto cacheado en Gemini
             
         Returns:
             Lista de preguntas generadas
@@ -360,6 +719,8 @@ class RFPAnalyzerService:
             rfp_data=rfp_data,
             prompt=self.questions_prompt,
             temperature=0.3,
+            use_cache=use_cache,
+            rfp_id=rfp_id,
         )
         
         logger.info(f"Generated {len(questions)} questions")
@@ -427,19 +788,24 @@ class RFPAnalyzerService:
     async def analyze_experience_relevance(
         self, 
         rfp_summary: str,
-        experiences: list[dict[str, Any]]
+        experiences: list[dict[str, Any]],
+        shortlist: set[str] | None = None,
     ) -> list[dict[str, Any]]:
         """
         Analiza la relevancia de las experiencias para un RFP.
+        Con `shortlist` (pre-ranking por embeddings) solo esas experiencias
+        van en el prompt; el resto recibe el puntaje mínimo.
         Ref: Step Id: 2289
         """
         if not experiences:
             return []
 
+        candidates = [exp for exp in experiences if shortlist is None or str(exp["id"]) in shortlist]
+
         # Prepare prompt
         experiences_text = "\n".join([
             f"ID: {exp['id']}\nCliente: {exp.get('propietario_servicio')}\nDescripción: {exp.get('descripcion_servicio')}\nMonto: {exp.get('monto_final')}\n---"
-            for exp in experiences
+            for exp in candidates
         ])
 
         # Prepare prompt using the loaded template
@@ -454,8 +820,10 @@ class RFPAnalyzerService:
             prompt = f"Analiza relevancia RFP: {rfp_summary} vs Experiencias: {experiences_text}. JSON array."
 
         try:
-            # Use the new helper method directly
-            ai_recommendations = await self.gemini.generate_json(prompt)
+            # Use the new helper method directly (sin candidatos no hay nada que evaluar)
+            ai_recommendations = await self.gemini.generate_json(
+                prompt, response_schema=EXPERIENCE_RELEVANCE_SCHEMA
+            ) if candidates else []
             
             # Ensure it's a list
             if isinstance(ai_recommendations, dict):
@@ -479,6 +847,12 @@ class RFPAnalyzerService:
                 if exp_id in ai_map:
                     # Use AI's evaluation
                     final_recommendations.append(ai_map[exp_id])
+                elif shortlist is not None and exp_id not in shortlist:
+                    final_recommendations.append({
+                        "experience_id": exp_id,
+                        "score": 0.05,
+                        "reason": "Fuera de las experiencias más afines al RFP (pre-ranking)."
+                    })
                 else:
                     # Provide default low score for items the AI ignored
                     final_recommendations.append({
@@ -497,7 +871,7 @@ class RFPAnalyzerService:
     async def analyze_chapter_relevance(
         self, 
         rfp_summary: str,
-        chapters: list[dict[str, Any]]
+        chapters: list[dict[str, Any]],
     ) -> list[dict[str, Any]]:
         """
         Analiza la relevancia de los capítulos para un RFP.
@@ -532,7 +906,9 @@ class RFPAnalyzerService:
         """
 
         try:
-            recommendations = await self.gemini.generate_json(prompt)
+            recommendations = await self.gemini.generate_json(
+                prompt, response_schema=CHAPTER_RELEVANCE_SCHEMA
+            )
             
             if isinstance(recommendations, dict):
                 recommendations = [recommendations]
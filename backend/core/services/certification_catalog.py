@@ -0,0 +1,116 @@
+"""
+Catálogo de certificaciones para los prompts de análisis.
+
+Cada análisis de RFP inyecta en `{{available_certifications}}` la lista de
+certificaciones activas. En vez de consultar la BD y re-armar el bloque en
+cada análisis, el bloque renderizado se guarda en memoria con un número de
+versión:
+
+- Las rutas que crean o eliminan certificaciones llaman a `invalidate()`
+- Con varias instancias, cada una refresca su copia tras
+  CERT_CATALOG_TTL_SECONDS aunque no haya recibido la invalidación
+- El bloque se arma en orden estable (nombre, id): el prompt resultante es
+  idéntico entre análisis, lo que permite el caching de prefijo en Gemini
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.certification import Certification
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER = "{{available_certifications}}"
+
+# Largo de la descripción de cada certificación en el bloque
+DESCRIPTION_CHARS = 100
+
+EMPTY_CATALOG = "No hay certificaciones disponibles."
+
+
+@dataclass
+class CatalogBlock:
+    """Bloque de certificaciones renderizado."""
+    text: str
+    version: int
+    count: int
+    loaded_at: float
+
+
+def render_catalog(certs: list[Certification]) -> str:
+    """Bloque de texto con las certificaciones, en orden estable."""
+    if not certs:
+        return EMPTY_CATALOG
+    ordered = sorted(certs, key=lambda c: ((c.name or "").lower(), str(c.id)))
+    return "\n".join(
+        f"- {c.name} (ID: {c.id}): {(c.description or '')[:DESCRIPTION_CHARS]}..."
+        for c in ordered
+    )
+
+
+class CertificationCatalogCache:
+    """Bloque de certificaciones renderizado, versionado e invalidable."""
+
+    def __init__(self):
+        self.version = 0
+        self.hits = 0
+        self.loads = 0
+        self._block: CatalogBlock | None = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> CatalogBlock | None:
+        block = self._block
+        if block is None or block.version != self.version:
+            return None
+        if time.time() - block.loaded_at > settings.CERT_CATALOG_TTL_SECONDS:
+            return None
+        return block
+
+    async def get(self, db: AsyncSession) -> CatalogBlock:
+        """Bloque vigente; lo carga desde la BD si se invalidó o expiró."""
+        block = self._fresh()
+        if block is not None:
+            self.hits += 1
+            return block
+        async with self._lock:
+            block = self._fresh()
+            if block is not None:
+                self.hits += 1
+                return block
+            version = self.version
+            result = await db.execute(select(Certification).where(Certification.is_active == True))
+            certs = list(result.scalars().all())
+            block = CatalogBlock(
+                text=render_catalog(certs),
+                version=version,
+                count=len(certs),
+                loaded_at=time.time(),
+            )
+            # Si se invalidó durante la consulta, no se guarda (la próxima recarga)
+            if version == self.version:
+                self._block = block
+            self.loads += 1
+            logger.info(f"Catálogo de certificaciones cargado (v{version}, {len(certs)} certificaciones)")
+            return block
+
+    def invalidate(self) -> None:
+        """Marca el catálogo como desactualizado (alta o baja de certificaciones)."""
+        self.version += 1
+        self._block = None
+
+    def get_stats(self) -> dict:
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "loads": self.loads,
+            "certifications": self._block.count if self._block else None,
+        }
+
+
+# Catálogo global (por proceso)
+certification_catalog = CertificationCatalogCache()
@@ -0,0 +1,201 @@
+"""
+División de documentos RFP en secciones.
+
+Los RFPs largos (bases de licitación, anexos técnicos) se dividen por títulos
+(numeración, CAPÍTULO/ANEXO, líneas en mayúsculas, markdown); las secciones
+demasiado grandes se parten por páginas y luego por párrafos. Las secciones
+sirven para elegir solo las partes relevantes de un documento que no cabe en
+una llamada, o para procesarlas por separado (map-reduce).
+"""
+import re
+from dataclasses import dataclass
+
+from core.gcp.gemini_governor import estimate_tokens
+
+# Separador de páginas en el texto extraído de PDFs
+PAGE_BREAK = "\f"
+
+# Largo máximo de una línea para considerarla título
+MAX_HEADING_CHARS = 120
+
+# Secciones más chicas que esto se unen a la siguiente
+MIN_SECTION_TOKENS = 150
+
+HEADING_PATTERNS = (
+    re.compile(r"^#{1,6}\s+\S"),
+    re.compile(r"^\d{1,2}(?:\.\d{1,2}){0,3}[.)]?\s+[A-ZÁÉÍÓÚÑ]"),
+    re.compile(r"^(?:CAP[IÍ]TULO|SECCI[OÓ]N|ANEXO|ART[IÍ]CULO|T[IÍ]TULO|PARTE)\b", re.IGNORECASE),
+    re.compile(r"^[A-ZÁÉÍÓÚÑ][A-ZÁÉÍÓÚÑ0-9 ,.:;()/-]{3,}$"),
+)
+
+# Términos que delatan secciones con información clave para el análisis
+SECTION_KEYWORDS = (
+    "alcance", "objetivo", "presupuesto", "monto", "precio", "plazo", "fecha",
+    "cronograma", "duración", "sla", "nivel de servicio", "penalidad", "multa",
+    "garantía", "equipo", "perfil", "experiencia", "requisito", "requerimiento",
+    "tecnolog", "evaluación", "criterio", "entregable", "propuesta", "oferta",
+    "consulta", "pregunta", "certificación", "iso",
+)
+
+
+@dataclass
+class DocumentSection:
+    """Sección contigua de un documento."""
+    index: int
+    title: str
+    text: str
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+
+def is_heading(line: str) -> bool:
+    """Indica si una línea parece un título de sección."""
+    line = line.strip()
+    if not line or len(line) > MAX_HEADING_CHARS:
+        return False
+    return any(pattern.match(line) for pattern in HEADING_PATTERNS)
+
+
+def _units(text: str, max_tokens: int) -> list[str]:
+    """Unidades de corte de una sección: páginas, o párrafos si la página es grande."""
+    units: list[str] = []
+    for page in text.split(PAGE_BREAK):
+        if estimate_tokens(page) <= max_tokens:
+            units.append(page)
+        else:
+            units.extend(page.split("\n\n"))
+    return [unit for unit in units if unit.strip()]
+
+
+def _split_large(title: str, text: str, max_tokens: int) -> list[tuple[str, str]]:
+    """Divide una sección grande en partes por páginas y párrafos."""
+    if estimate_tokens(text) <= max_tokens:
+        return [(title, text)]
+    parts: list[tuple[str, str]] = []
+    current: list[str] = []
+    current_tokens = 0
+    for unit in _units(text, max_tokens):
+        unit_tokens = estimate_tokens(unit)
+        if current and current_tokens + unit_tokens > max_tokens:
+            parts.append((title, "\n\n".join(current)))
+            current, current_tokens = [], 0
+        current.append(unit)
+        current_tokens += unit_tokens
+    if current:
+        parts.append((title, "\n\n".join(current)))
+    if len(parts) > 1:
+        parts = [(f"{title} (parte {i})", body) for i, (_, body) in enumerate(parts, start=1)]
+    return parts
+
+
+def split_sections(text: str, max_section_tokens: int = 20_000) -> list[DocumentSection]:
+    """
+    Divide el texto en secciones por títulos.
+
+    Las secciones muy chicas se unen a la siguiente y las que superan
+    `max_section_tokens` se parten por páginas y párrafos.
+    """
+    raw: list[tuple[str, list[str]]] = [("Inicio", [])]
+    # split("\n") y no splitlines(): splitlines también corta en PAGE_BREAK
+    for line in text.split("\n"):
+        if is_heading(line) and any(l.strip() for l in raw[-1][1]):
+            raw.append((line.strip(), [line]))
+        elif is_heading(line) and len(raw) == 1:
+            # El documento empieza con un título: la primera sección lo usa
+            raw[0] = (line.strip(), raw[0][1] + [line])
+        else:
+            raw[-1][1].append(line)
+
+    merged: list[tuple[str, str]] = []
+    pending_title: str | None = None
+    pending_text = ""
+    for title, lines in raw:
+        body = "\n".join(lines).strip()
+        if not body:
+            continue
+        if pending_title is None:
+            pending_title, pending_text = title, body
+        else:
+            pending_text = f"{pending_text}\n\n{body}"
+        if estimate_tokens(pending_text) >= MIN_SECTION_TOKENS:
+            merged.append((pending_title, pending_text))
+            pending_title, pending_text = None, ""
+    if pending_title is not None:
+        if merged:
+            title, body = merged.pop()
+            merged.append((title, f"{body}\n\n{pending_text}"))
+        else:
+            merged.append((pending_title, pending_text))
+
+    sections: list[DocumentSection] = []
+    for title, body in merged:
+        for part_title, part_text in _split_large(title, body, max_section_tokens):
+            sections.append(DocumentSection(index=len(sections), title=part_title, text=part_text))
+    return sections
+
+
+def pack_sections(sections: list[DocumentSection], target_tokens: int) -> list[list[DocumentSection]]:
+    """Agrupa secciones contiguas en bloques de hasta ~`target_tokens`."""
+    groups: list[list[DocumentSection]] = []
+    current_tokens = 0
+    for section in sections:
+        if groups and current_tokens + section.tokens <= target_tokens:
+            groups[-1].append(section)
+            current_tokens += section.tokens
+        else:
+            groups.append([section])
+            current_tokens = section.tokens
+    return groups
+
+
+def section_relevance(section: DocumentSection) -> float:
+    """Densidad de términos clave por cada 1K tokens (los títulos pesan doble)."""
+    title = section.title.lower()
+    body = section.text.lower()
+    hits = sum(body.count(keyword) + 2 * title.count(keyword) for keyword in SECTION_KEYWORDS)
+    return hits / max(section.tokens, 1) * 1000
+
+
+def select_sections(
+    sections: list[DocumentSection],
+    budget_tokens: int,
+    keep_first: int = 1,
+) -> tuple[list[DocumentSection], list[DocumentSection]]:
+    """
+    Elige las secciones más relevantes que caben en `budget_tokens`.
+
+    Las primeras `keep_first` secciones (portada, identificación del cliente)
+    se conservan siempre que quepan. Retorna (elegidas, omitidas), ambas en
+    el orden original del documento.
+    """
+    chosen: set[int] = set()
+    used = 0
+    ranked = sections[:keep_first] + sorted(sections[keep_first:], key=section_relevance, reverse=True)
+    for section in ranked:
+        if used + section.tokens <= budget_tokens:
+            chosen.add(section.index)
+            used += section.tokens
+    kept = [s for s in sections if s.index in chosen]
+    omitted = [s for s in sections if s.index not in chosen]
+    return kept, omitted
+
+
+def join_sections(kept: list[DocumentSection], omitted: list[DocumentSection]) -> str:
+    """Texto de las secciones elegidas, marcando dónde se omitió contenido."""
+    if not omitted:
+        return "\n\n".join(s.text for s in kept)
+    omitted_indexes = {s.index for s in omitted}
+    parts: list[str] = []
+    previous = -1
+    for section in kept:
+        if any(i in omitted_indexes for i in range(previous + 1, section.index)):
+            parts.append("[... secciones omitidas por extensión ...]")
+        parts.append(section.text)
+        previous = section.index
+    if any(i > previous for i in omitted_indexes):
+        parts.append("[... secciones omitidas por extensión ...]")
+    titles = ", ".join(s.title for s in omitted[:20])
+    parts.append(f"[Secciones omitidas: {titles}{'...' if len(omitted) > 20 else ''}]")
+    return "\n\n".join(parts)
@@ -0,0 +1,110 @@
+"""
+Pre-ranking local de experiencias para las recomendaciones.
+
+Las recomendaciones enviaban toda la biblioteca de experiencias en un solo
+prompt, que crece con cada experiencia cargada. Aquí:
+
+- Cada experiencia guarda su embedding (columnas `embedding` y
+  `embedding_hash`), calculado al crearla o editarla; las que no lo tienen o
+  quedaron desactualizadas se embeben en lote al recomendar
+- El RFP se embebe como consulta y las experiencias se ordenan por similitud
+  coseno en memoria (no requiere pgvector)
+- Solo las EXPERIENCE_PRERANK_TOP_K más afines van a Gemini para el puntaje
+  final
+"""
+import logging
+import math
+from typing import Any
+
+from core.config import settings
+from core.gcp.gemini_cache import hash_text
+from models.experience import Experience
+
+logger = logging.getLogger(__name__)
+
+# Largo máximo del texto que se embebe por experiencia y por RFP
+EMBEDDING_TEXT_CHARS = 4000
+
+
+def experience_text(experience: Experience) -> str:
+    """Texto que representa a la experiencia en el embedding."""
+    text = (
+        f"Cliente: {experience.propietario_servicio}\n"
+        f"Ubicación: {experience.ubicacion}\n"
+        f"Descripción: {experience.descripcion_servicio}"
+    )
+    return text[:EMBEDDING_TEXT_CHARS]
+
+
+def embedding_hash(text: str) -> str:
+    """Hash del texto embebido y del modelo/dimensiones con que se embebió."""
+    return hash_text(f"{settings.GEMINI_EMBEDDING_MODEL}:{settings.EMBEDDING_DIMENSIONS}:{text}")
+
+
+def needs_embedding(experience: Experience) -> bool:
+    """True si la experiencia no tiene embedding o cambió desde que se calculó."""
+    return (
+        not experience.embedding
+        or experience.embedding_hash != embedding_hash(experience_text(experience))
+    )
+
+
+async def embed_experiences(gemini, experiences: list[Experience]) -> int:
+    """
+    Calcula el embedding de las experiencias que lo necesitan (en lote).
+
+    Solo asigna los atributos; el commit queda a cargo de quien llama.
+
+    Returns:
+        Cantidad de experiencias embebidas
+    """
+    stale = [e for e in experiences if needs_embedding(e)]
+    if not stale:
+        return 0
+    texts = [experience_text(e) for e in stale]
+    vectors = await gemini.embed_texts(texts, task_type="RETRIEVAL_DOCUMENT")
+    for experience, text, vector in zip(stale, texts, vectors):
+        experience.embedding = vector
+        experience.embedding_hash = embedding_hash(text)
+    logger.info(f"Embeddings de experiencias calculados: {len(stale)}")
+    return len(stale)
+
+
+def rfp_query_text(rfp: Any) -> str:
+    """Texto del RFP con que se buscan experiencias afines."""
+    data = rfp.extracted_data or {}
+    parts = [
+        f"Título: {rfp.title or rfp.file_name}",
+        f"Cliente: {rfp.client_name or data.get('client_name') or ''}",
+        f"Categoría: {rfp.category or data.get('category') or ''}",
+        f"Resumen: {rfp.summary or data.get('summary') or ''}",
+    ]
+    tech_stack = data.get("tech_stack")
+    if isinstance(tech_stack, list) and tech_stack:
+        parts.append(f"Tecnologías: {', '.join(str(t) for t in tech_stack)}")
+    return "\n".join(parts)[:EMBEDDING_TEXT_CHARS]
+
+
+def cosine_similarity(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def rank_experiences(query: list[float], experiences: list[Experience]) -> list[tuple[float, Experience]]:
+    """Experiencias con embedding ordenadas por similitud con la consulta."""
+    scored = [(cosine_similarity(query, e.embedding), e) for e in experiences if e.embedding]
+    return sorted(scored, key=lambda item: item[0], reverse=True)
+
+
+async def shortlist_experiences(gemini, rfp: Any, experiences: list[Experience], top_k: int) -> set[str]:
+    """
+    IDs de las `top_k` experiencias más afines al RFP.
+
+    Embebe antes las experiencias sin embedding vigente (quien llama debe
+    hacer commit para conservarlos).
+    """
+    await embed_experiences(gemini, experiences)
+    [query] = await gemini.embed_texts([rfp_query_text(rfp)], task_type="RETRIEVAL_QUERY")
+    ranked = rank_experiences(query, experiences)
+    return {str(e.id) for _, e in ranked[:top_k]}
@@ -0,0 +1,174 @@
+"""
+Extracción de texto de PDFs fuera del event loop.
+
+La extracción es CPU-bound (decenas de ms por página): hecha dentro de un
+handler async bloquea a todos los requests mientras dura. Aquí corre en un
+pool de procesos compartido:
+
+- Motor: PyMuPDF (fitz), varias veces más rápido que pypdf; si no está
+  instalado o falla con un archivo, se usa pypdf
+- PDFs con al menos PDF_PARALLEL_MIN_PAGES páginas se reparten en rangos de
+  páginas entre los workers del pool
+- Las páginas se unen con PAGE_BREAK, igual que antes, para que el
+  pre-flight y el map-reduce puedan cortar por páginas
+- Los procesos se crean con forkserver (spawn si no existe), no con fork: el
+  worker ya tiene threads (to_thread, httpx, writer de consumo) y un fork
+  puede heredar un lock tomado. El pool se crea y precalienta al iniciar la
+  aplicación, fuera de los requests
+- Si un worker muere (OOM, crash de la librería nativa) el pool queda roto:
+  se descarta, se crea uno nuevo y el PDF se reintenta una vez
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.config import settings
+from core.services.document_sections import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    fitz = None
+    PYMUPDF_AVAILABLE = False
+
+
+def _pypdf_pages(content: bytes, start: int, end: int | None) -> list[str]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(content))
+    pages = reader.pages[start:end]
+    return [page.extract_text() or "" for page in pages]
+
+
+def _extract_range(content: bytes, start: int = 0, end: int | None = None) -> list[str]:
+    """Texto de las páginas [start, end) (corre dentro del pool de procesos)."""
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(stream=content, filetype="pdf") as doc:
+                stop = doc.page_count if end is None else min(end, doc.page_count)
+                return [doc[i].get_text("text") for i in range(start, stop)]
+        except Exception as e:
+            logger.warning(f"PyMuPDF falló, usando pypdf: {e}")
+    return _pypdf_pages(content, start, end)
+
+
+def _page_count(content: bytes) -> int:
+    if PYMUPDF_AVAILABLE:
+        try:
+            with fitz.open(stream=content, filetype="pdf") as doc:
+                return doc.page_count
+        except Exception:
+            pass
+    from pypdf import PdfReader
+
+    return len(PdfReader(io.BytesIO(content)).pages)
+
+
+def _join_pages(pages: list[str]) -> str:
+    # Salto de página explícito: permite dividir RFPs largos por páginas
+    return f"\n{PAGE_BREAK}\n".join(text for text in pages if text.strip())
+
+
+def extract_pdf_text_sync(content: bytes) -> str:
+    """Extrae el texto de un PDF en el proceso actual (scripts, tests)."""
+    return _join_pages(_extract_range(content))
+
+
+# Singleton instance
+_pool: ProcessPoolExecutor | None = None
+
+
+def _pool_size() -> int:
+    return settings.PDF_EXTRACTION_WORKERS or min(4, os.cpu_count() or 1)
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _warmup() -> bool:
+    return PYMUPDF_AVAILABLE
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido para la extracción."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=_pool_size(), mp_context=_mp_context())
+        logger.info(f"Pool de extracción de PDFs iniciado ({_pool_size()} procesos)")
+    return _pool
+
+
+async def start_pdf_pool() -> None:
+    """Crea el pool y levanta sus procesos (se llama al iniciar la aplicación)."""
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _warmup) for _ in range(_pool_size())))
+
+
+def _discard_pool(broken: ProcessPoolExecutor) -> None:
+    """Descarta un pool roto (si otro request no lo reemplazó ya)."""
+    global _pool
+    broken.shutdown(wait=False, cancel_futures=True)
+    if _pool is broken:
+        _pool = None
+        logger.warning("Pool de extracción de PDFs roto (un worker terminó); se recrea")
+
+
+def shutdown_pdf_pool() -> None:
+    """Detiene el pool (se llama al apagar la aplicación)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def extract_pdf_text(content: bytes) -> str:
+    """
+    Extrae el texto de un PDF sin bloquear el event loop.
+
+    Los PDFs grandes se dividen en rangos de páginas que se procesan en
+    paralelo; el resultado conserva el orden de las páginas.
+
+    Si el pool está roto se recrea y se reintenta una vez. No se cae a
+    extraer en el proceso del servidor: si el PDF es lo que mata al worker,
+    ahí tumbaría la aplicación.
+    """
+    pool = get_pdf_pool()
+    try:
+        return await _extract_in_pool(pool, content)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+    pool = get_pdf_pool()
+    try:
+        return await _extract_in_pool(pool, content)
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+
+
+async def _extract_in_pool(pool: ProcessPoolExecutor, content: bytes) -> str:
+    loop = asyncio.get_running_loop()
+    workers = _pool_size()
+
+    page_count = await loop.run_in_executor(pool, _page_count, content)
+    if workers == 1 or page_count < settings.PDF_PARALLEL_MIN_PAGES:
+        pages = await loop.run_in_executor(pool, _extract_range, content, 0, None)
+        return _join_pages(pages)
+
+    chunk = -(-page_count // workers)
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, _extract_range, content, start, end)
+        for start, end in ranges
+    ))
+    logger.info(f"PDF de {page_count} páginas extraído en {len(ranges)} rangos paralelos")
+    return _join_pages([page for pages in results for page in pages])
@@ -0,0 +1,139 @@
+"""
+Resultados de relevancia de experiencias y capítulos persistidos por RFP.
+
+Cada apertura del generador de propuestas volvía a evaluar con Gemini toda la
+biblioteca contra el mismo RFP. Aquí cada puntaje se guarda en
+`relevance_results` junto con:
+
+- El hash del contenido del elemento evaluado: la versión de la biblioteca
+  es el conjunto de estos hashes, y solo se recalculan los elementos nuevos
+  o modificados desde la última evaluación
+- El hash del contexto del RFP (y de RELEVANCE_VERSION): si el RFP se
+  re-analiza o cambian los prompts, se recalcula todo
+
+Los elementos eliminados de la biblioteca se limpian al guardar.
+"""
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.gcp.gemini_cache import hash_text
+from models.relevance import RelevanceResult
+
+logger = logging.getLogger(__name__)
+
+KIND_EXPERIENCE = "experience"
+KIND_CHAPTER = "chapter"
+
+# Campo del id en la respuesta de cada tipo (ver *_schemas.*Recommendation)
+ID_FIELDS = {
+    KIND_EXPERIENCE: "experience_id",
+    KIND_CHAPTER: "chapter_id",
+}
+
+# Subir la versión al cambiar los prompts de relevancia: los resultados
+# guardados se ignoran y se recalculan
+RELEVANCE_VERSION = 1
+
+
+def item_hash(*values: Any) -> str:
+    """Hash de los campos de un elemento que se envían al prompt."""
+    return hash_text("\x1f".join("" if v is None else str(v) for v in values))
+
+
+def context_hash(kind: str, rfp_context: str) -> str:
+    """Hash del contexto del RFP con que se evaluó."""
+    return hash_text(f"{kind}:{RELEVANCE_VERSION}:{rfp_context}")
+
+
+def _to_response(kind: str, row: RelevanceResult) -> dict[str, Any]:
+    return {ID_FIELDS[kind]: str(row.item_id), "score": row.score, "reason": row.reason or ""}
+
+
+async def load_relevance(
+    db: AsyncSession,
+    rfp_id: uuid.UUID,
+    kind: str,
+    items: dict[str, str],
+    rfp_context: str,
+) -> tuple[dict[str, dict[str, Any]], list[str]]:
+    """
+    Resultados vigentes de un RFP para la biblioteca actual.
+
+    Args:
+        items: id del elemento -> item_hash de su contenido actual
+        rfp_context: Texto del RFP que se envía al prompt
+
+    Returns:
+        (resultados vigentes por id, ids que hay que evaluar)
+    """
+    current_context = context_hash(kind, rfp_context)
+    result = await db.execute(
+        select(RelevanceResult).where(RelevanceResult.rfp_id == rfp_id, RelevanceResult.kind == kind)
+    )
+    stored: dict[str, dict[str, Any]] = {}
+    for row in result.scalars().all():
+        item_id = str(row.item_id)
+        if row.context_hash == current_context and items.get(item_id) == row.item_hash:
+            stored[item_id] = _to_response(kind, row)
+    pending = [item_id for item_id in items if item_id not in stored]
+    return stored, pending
+
+
+async def save_relevance(
+    db: AsyncSession,
+    rfp_id: uuid.UUID,
+    kind: str,
+    results: list[dict[str, Any]],
+    items: dict[str, str],
+    rfp_context: str,
+) -> int:
+    """
+    Guarda (reemplaza) los resultados evaluados y limpia los de elementos que
+    ya no están en la biblioteca. El commit queda a cargo de quien llama.
+
+    Returns:
+        Cantidad de resultados guardados
+    """
+    id_field = ID_FIELDS[kind]
+    current_context = context_hash(kind, rfp_context)
+    rows: dict[str, dict[str, Any]] = {}
+    for rec in results:
+        item_id = str(rec.get(id_field) or "")
+        if item_id not in items or rec.get("score") is None:
+            continue
+        rows[item_id] = {
+            "id": uuid.uuid4(),
+            "rfp_id": rfp_id,
+            "kind": kind,
+            "item_id": uuid.UUID(item_id),
+            "item_hash": items[item_id],
+            "context_hash": current_context,
+            "score": float(rec["score"]),
+            "reason": rec.get("reason"),
+            "created_at": datetime.now(timezone.utc),
+        }
+
+    if rows:
+        # Upsert: dos aperturas simultáneas del mismo RFP no chocan con
+        # uq_relevance_rfp_kind_item; gana la última escritura
+        stmt = insert(RelevanceResult).values(list(rows.values()))
+        await db.execute(stmt.on_conflict_do_update(
+            index_elements=["rfp_id", "kind", "item_id"],
+            set_={
+                name: stmt.excluded[name]
+                for name in ("item_hash", "context_hash", "score", "reason", "created_at")
+            },
+        ))
+    await db.execute(delete(RelevanceResult).where(
+        RelevanceResult.rfp_id == rfp_id,
+        RelevanceResult.kind == kind,
+        RelevanceResult.item_id.not_in([uuid.UUID(item_id) for item_id in items]),
+    ))
+    logger.info(f"Relevancia ({kind}) del RFP {rfp_id}: {len(rows)} resultados guardados")
+    return len(rows)
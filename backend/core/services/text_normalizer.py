@@ -0,0 +1,203 @@
+"""
+Normalización del texto extraído antes de enviarlo a Gemini.
+
+Las bases de licitación repiten en cada página encabezados, pies, numeración
+y avisos legales, e incluyen índices con líneas de puntos. Todo eso se paga
+como tokens de entrada en cada análisis. Esta etapa:
+
+- Elimina la primera y la última línea de cada página cuando se repiten en
+  muchas páginas (encabezados y pies) o cuando numeran la página: con marca
+  ("Pág. 3", "3 de 40") o con un número que sigue al índice de la página
+  (con el mismo desfase en todo el documento). Un número suelto que no
+  calza con la página es contenido (la última fila de una tabla)
+- Colapsa espacios y las líneas de puntos de los índices
+- Elimina párrafos idénticos repetidos (avisos legales, notas)
+
+Conserva PAGE_BREAK entre páginas para el corte por secciones.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+from core.gcp.gemini_governor import estimate_tokens
+from core.services.document_sections import PAGE_BREAK
+
+# Páginas mínimas para detectar encabezados y pies repetidos
+MIN_PAGES_FOR_REPEATS = 3
+
+# Fracción de páginas en que debe aparecer una línea para considerarla repetida
+REPEATED_LINE_RATIO = 0.5
+
+# Largo máximo de una línea de encabezado o pie
+MAX_REPEATED_LINE_CHARS = 200
+
+# Párrafos más cortos que esto no se deduplican ("Sí", "N/A", montos)
+MIN_DEDUP_PARAGRAPH_CHARS = 40
+
+# Numeración con marca: "Pág. 3", "Página 3 de 40", "- 3 de 40 -"
+PAGE_NUMBER_PATTERN = re.compile(
+    r"^(?:p[aá]g(?:ina)?\.?\s*[-–—]?\s*\d{1,4}(?:\s*(?:de|of)\s*\d{1,4})?"
+    r"|[-–—]?\s*\d{1,4}\s*(?:de|of)\s*\d{1,4}\s*[-–—]?)$",
+    re.IGNORECASE,
+)
+# Número suelto ("3", "- 3 -"): solo es numeración si sigue al índice de la página
+BARE_NUMBER_PATTERN = re.compile(r"^[-–—]?\s*(\d{1,4})\s*[-–—]?$")
+TOC_LEADER_PATTERN = re.compile(r"\s*(?:\.\s?){4,}\s*|\s*_{4,}\s*|\s*(?:-\s?){6,}\s*")
+SPACES_PATTERN = re.compile(r"[ \t ]+")
+
+
+@dataclass
+class NormalizationReport:
+    """Ahorro de la normalización de un documento."""
+    original_chars: int
+    normalized_chars: int
+    original_tokens: int
+    normalized_tokens: int
+    repeated_lines: int = 0
+    page_numbers: int = 0
+    toc_leaders: int = 0
+    duplicate_paragraphs: int = 0
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.original_tokens - self.normalized_tokens
+
+    @property
+    def saved_pct(self) -> float:
+        return self.saved_tokens / self.original_tokens * 100 if self.original_tokens else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "original_tokens": self.original_tokens,
+            "normalized_tokens": self.normalized_tokens,
+            "saved_tokens": self.saved_tokens,
+            "saved_pct": round(self.saved_pct, 2),
+            "original_chars": self.original_chars,
+            "normalized_chars": self.normalized_chars,
+            "repeated_lines": self.repeated_lines,
+            "page_numbers": self.page_numbers,
+            "toc_leaders": self.toc_leaders,
+            "duplicate_paragraphs": self.duplicate_paragraphs,
+        }
+
+
+def _key(text: str) -> str:
+    """
+    Clave de comparación de líneas y párrafos. No ignora números: dos títulos
+    ("CAPÍTULO 3" / "CAPÍTULO 4") o cláusulas que solo difieren en montos son
+    distintos; la numeración de páginas se detecta aparte.
+    """
+    return SPACES_PATTERN.sub(" ", text).strip().lower()
+
+
+def _edge_indexes(lines: list[str]) -> set[int]:
+    """Índices de la primera y la última línea no vacía de una página."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return {filled[0], filled[-1]} if filled else set()
+
+
+def _min_pages(pages: list[list[str]]) -> int:
+    return max(MIN_PAGES_FOR_REPEATS, int(len(pages) * REPEATED_LINE_RATIO))
+
+
+def _bare_number(line: str) -> int | None:
+    match = BARE_NUMBER_PATTERN.match(line.strip())
+    return int(match.group(1)) if match else None
+
+
+def _repeated_lines(pages: list[list[str]]) -> set[str]:
+    """Claves de las líneas de borde presentes en al menos la mitad de las páginas."""
+    if len(pages) < MIN_PAGES_FOR_REPEATS:
+        return set()
+    counts: Counter[str] = Counter()
+    for lines in pages:
+        counts.update({
+            _key(lines[i]) for i in _edge_indexes(lines)
+            if len(lines[i].strip()) <= MAX_REPEATED_LINE_CHARS
+        })
+    min_pages = _min_pages(pages)
+    return {key for key, count in counts.items() if count >= min_pages}
+
+
+def _page_number_offset(pages: list[list[str]]) -> int | None:
+    """
+    Desfase entre el número impreso y el índice de la página, si se repite en
+    al menos la mitad de las páginas (None si los números no numeran páginas).
+    """
+    if len(pages) < MIN_PAGES_FOR_REPEATS:
+        return None
+    counts: Counter[int] = Counter()
+    for index, lines in enumerate(pages):
+        counts.update({
+            number - index for number in (_bare_number(lines[i]) for i in _edge_indexes(lines))
+            if number is not None
+        })
+    if not counts:
+        return None
+    offset, count = counts.most_common(1)[0]
+    return offset if count >= _min_pages(pages) else None
+
+
+def _is_page_number(line: str, index: int, offset: int | None) -> bool:
+    if PAGE_NUMBER_PATTERN.match(line):
+        return True
+    number = _bare_number(line)
+    return number is not None and offset is not None and number - index == offset
+
+
+def normalize_document_text(text: str) -> tuple[str, NormalizationReport]:
+    """
+    Limpia el texto extraído de un documento.
+
+    Returns:
+        (texto normalizado, reporte con el ahorro de tokens)
+    """
+    report = NormalizationReport(
+        original_chars=len(text),
+        normalized_chars=0,
+        original_tokens=estimate_tokens(text),
+        normalized_tokens=0,
+    )
+    # split("\n") y no splitlines(): splitlines también corta en PAGE_BREAK
+    pages = [page.split("\n") for page in text.split(PAGE_BREAK)]
+    repeated = _repeated_lines(pages)
+    offset = _page_number_offset(pages)
+
+    seen_paragraphs: set[str] = set()
+    normalized_pages: list[str] = []
+    for index, lines in enumerate(pages):
+        kept: list[str] = []
+        edges = _edge_indexes(lines)
+        for i, line in enumerate(lines):
+            stripped = line.strip()
+            # Solo en los bordes: dentro de la página puede ser contenido (una celda, un título)
+            if stripped and i in edges and _key(stripped) in repeated:
+                report.repeated_lines += 1
+                continue
+            if stripped and i in edges and _is_page_number(stripped, index, offset):
+                report.page_numbers += 1
+                continue
+            if TOC_LEADER_PATTERN.search(stripped):
+                report.toc_leaders += 1
+                stripped = TOC_LEADER_PATTERN.sub(" ", stripped).strip()
+            kept.append(SPACES_PATTERN.sub(" ", stripped))
+
+        paragraphs: list[str] = []
+        for paragraph in re.split(r"\n\s*\n", "\n".join(kept)):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if len(paragraph) >= MIN_DEDUP_PARAGRAPH_CHARS:
+                key = _key(paragraph)
+                if key in seen_paragraphs:
+                    report.duplicate_paragraphs += 1
+                    continue
+                seen_paragraphs.add(key)
+            paragraphs.append(paragraph)
+        if paragraphs:
+            normalized_pages.append("\n\n".join(paragraphs))
+
+    normalized = f"\n{PAGE_BREAK}\n".join(normalized_pages)
+    report.normalized_chars = len(normalized)
+    report.normalized_tokens = estimate_tokens(normalized)
+    return normalized, report
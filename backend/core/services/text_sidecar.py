@@ -0,0 +1,103 @@
+"""
+Texto extraído de un RFP guardado junto al archivo original.
+
+En la primera subida se guarda `<uri>.text.json.gz` con el texto normalizado,
+el mapa de páginas y el reporte de normalización. Los re-análisis y demás
+procesos leen ese archivo (unos KB comprimidos) en vez de descargar el
+original y volver a extraer el texto.
+
+El sidecar es una optimización: si no existe, está corrupto o es de otra
+versión del formato, se ignora y se extrae el texto del original.
+"""
+import gzip
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any
+
+from core.gcp.gemini_cache import hash_text
+from core.services.document_sections import PAGE_BREAK
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".text.json.gz"
+
+# Subir la versión al cambiar la extracción o la normalización: los sidecars
+# anteriores se ignoran y se regeneran
+SIDECAR_VERSION = 1
+
+
+def sidecar_uri(file_uri: str) -> str:
+    """URI del sidecar de un archivo."""
+    return f"{file_uri}{SIDECAR_SUFFIX}"
+
+
+def page_map(text: str) -> list[list[int]]:
+    """Rango [inicio, fin) de caracteres de cada página en el texto."""
+    pages: list[list[int]] = []
+    start = 0
+    for page in text.split(PAGE_BREAK):
+        pages.append([start, start + len(page)])
+        start += len(page) + len(PAGE_BREAK)
+    return pages
+
+
+def build_sidecar(text: str, normalization: dict[str, Any] | None = None) -> bytes:
+    """Contenido comprimido del sidecar."""
+    payload = {
+        "version": SIDECAR_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "text_sha256": hash_text(text),
+        "pages": page_map(text),
+        "normalization": normalization,
+        "text": text,
+    }
+    return gzip.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+
+def parse_sidecar(data: bytes) -> tuple[str, dict[str, Any] | None] | None:
+    """(texto, reporte de normalización) del sidecar, o None si no es utilizable."""
+    try:
+        payload = json.loads(gzip.decompress(data).decode("utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Sidecar de texto ilegible: {e}")
+        return None
+    if payload.get("version") != SIDECAR_VERSION or not isinstance(payload.get("text"), str):
+        return None
+    if payload.get("text_sha256") != hash_text(payload["text"]):
+        logger.warning("Sidecar de texto con hash inválido")
+        return None
+    return payload["text"], payload.get("normalization")
+
+
+def save_sidecar(storage, file_uri: str, text: str, normalization: dict[str, Any] | None = None) -> str | None:
+    """Guarda el sidecar junto al archivo; los errores solo se registran."""
+    try:
+        data = build_sidecar(text, normalization)
+        uri = storage.upload_to_uri(sidecar_uri(file_uri), data, "application/gzip")
+        logger.info(f"Sidecar de texto guardado: {uri} ({len(data):,} bytes, {len(text):,} caracteres)")
+        return uri
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el sidecar de {file_uri}: {e}")
+        return None
+
+
+def load_sidecar(storage, file_uri: str) -> tuple[str, dict[str, Any] | None] | None:
+    """Lee el sidecar de un archivo (None si no existe o no es utilizable)."""
+    uri = sidecar_uri(file_uri)
+    # En local se verifica antes para no registrar como error un sidecar que no existe
+    if uri.startswith("local://") and not storage.file_exists(uri):
+        return None
+    try:
+        data = storage.download_file(uri)
+    except Exception:
+        return None
+    return parse_sidecar(data)
+
+
+def delete_sidecar(storage, file_uri: str) -> None:
+    """Elimina el sidecar de un archivo (si existe)."""
+    try:
+        storage.delete_file(sidecar_uri(file_uri))
+    except Exception as e:
+        logger.debug(f"No se pudo eliminar el sidecar de {file_uri}: {e}")
@@ -23,6 +23,8 @@ class StorageBackend(Protocol):
         folder: str,
     ) -> str: ...
     
+    def upload_to_uri(self, uri: str, file_content: bytes, content_type: str) -> str: ...
+    
     def download_file(self, uri: str) -> bytes: ...
     
     def delete_file(self, uri: str) -> bool: ...
@@ -197,6 +199,29 @@ class HybridStorageService:
             logger.error(f"GCS upload failed: {e}")
             raise RuntimeError(f"Failed to upload file to GCS: {e}")
     
+    def upload_to_uri(self, uri: str, file_content: bytes, content_type: str = "application/octet-stream") -> str:
+        """
+        Sube contenido a un URI exacto, en el mismo almacenamiento del URI.
+        
+        Args:
+            uri: URI destino (gs:// o local://)
+            file_content: Contenido en bytes
+            content_type: Tipo MIME
+            
+        Returns:
+            El mismo URI
+        """
+        if uri.startswith("gs://"):
+            if not self._gcs_available or not self._gcs_client:
+                raise RuntimeError("Cannot upload to GCS: client not available")
+            return self._gcs_client.upload_to_uri(uri, file_content, content_type)
+        
+        elif uri.startswith("local://"):
+            return self._local_storage.upload_to_uri(uri, file_content, content_type)
+        
+        else:
+            raise ValueError(f"Unknown URI scheme: {uri}")
+    
     def download_file(self, uri: str) -> bytes:
         """
         Descarga un archivo desde su URI.
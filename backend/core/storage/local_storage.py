@@ -126,6 +126,30 @@ class LocalStorageService:
         content = file_obj.read()
         return self.upload_file(content, file_name, content_type, folder)
     
+    def upload_to_uri(self, local_uri: str, file_content: bytes, content_type: str) -> str:
+        """
+        Guarda contenido en un URI exacto (p. ej. un archivo asociado a otro ya subido).
+        
+        Args:
+            local_uri: URI destino (local://path/to/file)
+            file_content: Contenido en bytes
+            content_type: Tipo MIME (no se usa en local)
+            
+        Returns:
+            El mismo URI
+        """
+        try:
+            full_path = self.get_file_path(local_uri)
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(full_path, "wb") as f:
+                f.write(file_content)
+            logger.info(f"File saved locally: {local_uri} ({len(file_content)} bytes)")
+            return local_uri
+            
+        except Exception as e:
+            logger.error(f"Failed to save file locally: {e}")
+            raise
+    
     def download_file(self, local_uri: str) -> bytes:
         """
         Lee un archivo del almacenamiento local.
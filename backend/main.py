@@ -9,6 +9,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from core.config import settings
 from core.database import engine, Base
+from core.gcp.consumption_writer import get_consumption_writer
+from core.services.pdf_extractor import shutdown_pdf_pool, start_pdf_pool
 from api.routes import rfp_router, dashboard_router, auth_router, proposal_router, certifications_router, experiences_router, chapters_router
 
 # Configurar logging
@@ -31,9 +33,18 @@ async def lifespan(app: FastAPI):
             await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created/verified")
     
+    # Persistencia por lotes del consumo de Gemini
+    if settings.CONSUMPTION_PERSIST_ENABLED:
+        get_consumption_writer().start()
+    
+    # Pool de extracción de PDFs: se crea aquí y no en el primer upload
+    await start_pdf_pool()
+    
     yield
     
     logger.info("Shutting down application")
+    await get_consumption_writer().stop()
+    shutdown_pdf_pool()
     await engine.dispose()
 
 
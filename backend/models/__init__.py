@@ -3,5 +3,7 @@ from .rfp import RFPSubmission, RFPQuestion, RFPStatus, RFPCategory, Recommendat
 from .user import User
 from .certification import Certification
 from .experience import Experience
+from .consumption import APIConsumptionRecord
+from .relevance import RelevanceResult
 
-__all__ = ["RFPSubmission", "RFPQuestion", "RFPStatus", "RFPCategory", "Recommendation", "User", "Certification", "Experience"]
+__all__ = ["RFPSubmission", "RFPQuestion", "RFPStatus", "RFPCategory", "Recommendation", "User", "Certification", "Experience", "APIConsumptionRecord", "RelevanceResult"]
@@ -0,0 +1,48 @@
+"""
+Modelo de consumo de la API de Gemini (persistencia de APIConsumptionLog).
+"""
+from datetime import datetime
+from sqlalchemy import BigInteger, String, Integer, Float, Boolean, DateTime, Text, Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.database import Base
+
+
+class APIConsumptionRecord(Base):
+    """Una llamada a Gemini (o respuesta servida desde caché)."""
+    
+    __tablename__ = "api_consumption_logs"
+    
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    
+    # Instancia que registró la llamada (Cloud Run escala a varias)
+    instance: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    operation: Mapped[str] = mapped_column(String(100), nullable=False)
+    
+    # Tokens
+    input_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    thinking_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    cached_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    total_tokens: Mapped[int] = mapped_column(Integer, default=0)
+    
+    # Latencia y scheduling
+    latency_ms: Mapped[float] = mapped_column(Float, default=0)
+    queue_wait_ms: Mapped[float] = mapped_column(Float, default=0)
+    retries: Mapped[int] = mapped_column(Integer, default=0)
+    
+    cost_usd: Mapped[float] = mapped_column(Float, default=0)
+    success: Mapped[bool] = mapped_column(Boolean, default=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    cache_hit: Mapped[bool] = mapped_column(Boolean, default=False)
+    
+    __table_args__ = (
+        Index("idx_consumption_created", "created_at"),
+        Index("idx_consumption_model_created", "model", "created_at"),
+    )
+    
+    def __repr__(self):
+        return f"<APIConsumptionRecord {self.model} {self.operation} {self.created_at}>"
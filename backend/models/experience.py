@@ -1,8 +1,8 @@
 import uuid
 from datetime import datetime, date
-from sqlalchemy import String, Text, Date, Numeric, DateTime
+from sqlalchemy import String, Text, Date, Numeric, DateTime, Float
 from sqlalchemy.orm import Mapped, mapped_column
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import ARRAY, UUID
 
 from core.database import Base
 
@@ -18,6 +18,11 @@ class Experience(Base):
     fecha_fin: Mapped[date] = mapped_column(Date, nullable=True)
     monto_final: Mapped[float] = mapped_column(Numeric(15, 2), nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # Embedding para el pre-ranking de recomendaciones (ver experience_index);
+    # diferido: solo se carga donde se usa
+    embedding: Mapped[list[float] | None] = mapped_column(ARRAY(Float), nullable=True, deferred=True)
+    # Hash del texto y modelo embebidos: si cambia, el embedding está desactualizado
+    embedding_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     def __repr__(self):
         return f"<Experience {self.propietario_servicio} - {self.descripcion_servicio[:30]}>"
@@ -0,0 +1,49 @@
+"""
+Modelo de resultados de relevancia (experiencias y capítulos) por RFP.
+"""
+import uuid
+from datetime import datetime
+from sqlalchemy import String, Float, DateTime, Text, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.dialects.postgresql import UUID
+
+from core.database import Base
+
+
+class RelevanceResult(Base):
+    """Puntaje de relevancia de un elemento de la biblioteca para un RFP."""
+    
+    __tablename__ = "relevance_results"
+    
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    rfp_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True),
+        ForeignKey("rfp_submissions.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    
+    # "experience" o "chapter", e id del elemento en su tabla
+    kind: Mapped[str] = mapped_column(String(20), nullable=False)
+    item_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    
+    # Hash del contenido del elemento y del contexto del RFP al evaluarlo:
+    # si alguno cambia, el resultado se recalcula
+    item_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    context_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    
+    score: Mapped[float] = mapped_column(Float, nullable=False)
+    reason: Mapped[str | None] = mapped_column(Text, nullable=True)
+    
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=datetime.utcnow,
+        nullable=False
+    )
+    
+    __table_args__ = (
+        UniqueConstraint("rfp_id", "kind", "item_id", name="uq_relevance_rfp_kind_item"),
+        Index("idx_relevance_rfp_kind", "rfp_id", "kind"),
+    )
+    
+    def __repr__(self):
+        return f"<RelevanceResult {self.kind} {self.item_id} rfp={self.rfp_id} score={self.score}>"
@@ -80,6 +80,10 @@ class RFPSubmission(Base):
     file_gcs_path: Mapped[str] = mapped_column(String(500), nullable=False)
     file_size_bytes: Mapped[int | None] = mapped_column(Integer, nullable=True)
     
+    # Hashes SHA-256 para detectar re-subidas (bytes del archivo y texto normalizado)
+    file_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    text_sha256: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    
     # Status
     status: Mapped[str] = mapped_column(
         String(20), 
@@ -147,6 +151,8 @@ class RFPSubmission(Base):
         Index("idx_rfp_client", "client_name"),
         Index("idx_rfp_category", "category"),
         Index("idx_rfp_deadline", "proposal_deadline"),
+        Index("idx_rfp_file_sha256", "file_sha256"),
+        Index("idx_rfp_text_sha256", "text_sha256"),
     )
     
     def __repr__(self) -> str:
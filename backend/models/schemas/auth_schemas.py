@@ -27,7 +27,7 @@ class UserLogin(BaseModel):
 
 class UserPreferences(BaseModel):
     """Schema for user preferences."""
-    analysis_mode: Literal["fast", "balanced", "deep"] = "balanced"
+    analysis_mode: Literal["fast", "balanced", "deep", "cascade"] = "balanced"
 
 
 class UserResponse(UserBase):
@@ -55,4 +55,4 @@ class TokenPayload(BaseModel):
 
 class UpdatePreferencesRequest(BaseModel):
     """Schema for updating user preferences."""
-    analysis_mode: Literal["fast", "balanced", "deep"]
+    analysis_mode: Literal["fast", "balanced", "deep", "cascade"]
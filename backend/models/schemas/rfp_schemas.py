@@ -256,6 +256,7 @@ class UploadResponse(BaseModel):
     file_name: str
     status: RFPStatusEnum
     message: str = "RFP uploaded successfully. Analysis in progress."
+    reused_from: UUID | None = None  # RFP idéntico cuyo análisis se reutilizó
 
 
 # ============ TEAM & COST ESTIMATION SCHEMAS ============
@@ -2,9 +2,10 @@
  * Modal para subir RFPs
  */
 import React, { useState } from 'react';
-import { Modal, Upload, message, Typography, Spin, Steps } from 'antd';
-import { InboxOutlined, LoadingOutlined, CheckCircleOutlined, FileSearchOutlined, CloudUploadOutlined } from '@ant-design/icons';
+import { Modal, Upload, message, Typography, Spin, Steps, Button, Space } from 'antd';
+import { InboxOutlined, LoadingOutlined, CheckCircleOutlined, FileSearchOutlined, CloudUploadOutlined, CopyOutlined } from '@ant-design/icons';
 import type { UploadProps } from 'antd';
+import type { UploadResponse } from '../../types';
 import { rfpApi } from '../../lib/api';
 
 const { Dragger } = Upload;
@@ -16,17 +17,87 @@ interface UploadModalProps {
   onSuccess: () => void;
 }
 
-type UploadStep = 'idle' | 'uploading' | 'analyzing' | 'complete' | 'error';
+type UploadStep = 'idle' | 'uploading' | 'analyzing' | 'complete' | 'reused' | 'error';
 
 const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess }) => {
   const [step, setStep] = useState<UploadStep>('idle');
   const [fileName, setFileName] = useState<string>('');
   const [errorMessage, setErrorMessage] = useState<string>('');
+  const [progressMessage, setProgressMessage] = useState<string>('');
+  const [generatedChars, setGeneratedChars] = useState<number>(0);
+  // Archivo y resultado cuando se reutilizó el análisis de un RFP idéntico
+  const [lastFile, setLastFile] = useState<File | null>(null);
+  const [reused, setReused] = useState<UploadResponse | null>(null);
 
   const resetState = () => {
     setStep('idle');
     setFileName('');
     setErrorMessage('');
+    setProgressMessage('');
+    setGeneratedChars(0);
+    setLastFile(null);
+    setReused(null);
+  };
+
+  const runUpload = async (file: File, forceReanalysis = false) => {
+    setFileName(file.name);
+    setLastFile(file);
+    setStep('uploading');
+    setErrorMessage('');
+
+    try {
+      // El análisis llega por SSE: progreso y fragmentos generados por Gemini
+      const result = await rfpApi.uploadStream(file, (event) => {
+        if (event.type === 'accepted') {
+          setStep('analyzing');
+        } else if (event.type === 'progress') {
+          setProgressMessage(event.message);
+        } else if (event.type === 'token') {
+          setGeneratedChars(event.chars);
+        }
+      }, forceReanalysis);
+
+      if (result.reused_from) {
+        // Análisis reutilizado al instante: el usuario decide si lo conserva
+        setReused(result);
+        setStep('reused');
+        return;
+      }
+
+      setStep('complete');
+      message.success('RFP analizado exitosamente');
+      
+      // Esperar un momento para mostrar el estado de éxito
+      setTimeout(() => {
+        resetState();
+        onSuccess();
+      }, 1500);
+      
+    } catch (error: any) {
+      setStep('error');
+      const errorMsg = error?.response?.data?.detail || error?.message || 'Error al procesar el archivo';
+      setErrorMessage(errorMsg);
+      message.error(errorMsg);
+    }
+  };
+
+  const handleKeepReused = () => {
+    resetState();
+    onSuccess();
+  };
+
+  const handleForceReanalysis = async () => {
+    if (!lastFile || !reused) return;
+    try {
+      // Reemplaza la copia por un análisis nuevo
+      await rfpApi.delete(reused.id);
+    } catch {
+      // Si no se pudo borrar, igual se analiza; la copia queda en la lista
+    }
+    setReused(null);
+    setProgressMessage('');
+    setGeneratedChars(0);
+    await runUpload(lastFile, true);
   };
 
   const handleCancel = () => {
@@ -35,6 +106,11 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
       message.warning('Por favor espera a que termine el análisis');
       return;
     }
+    if (step === 'reused') {
+      // El RFP con el análisis reutilizado ya fue creado
+      handleKeepReused();
+      return;
+    }
     resetState();
     onCancel();
   };
@@ -53,33 +129,7 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
         return false;
       }
 
-      setFileName(file.name);
-      setStep('uploading');
-      setErrorMessage('');
-
-      try {
-        // Cambiar a analyzing después de un momento
-        setTimeout(() => setStep('analyzing'), 1000);
-
-        // El endpoint ahora es síncrono - espera al análisis
-        await rfpApi.upload(file);
-        
-        setStep('complete');
-        message.success('RFP analizado exitosamente');
-        
-        // Esperar un momento para mostrar el estado de éxito
-        setTimeout(() => {
-          resetState();
-          onSuccess();
-        }, 1500);
-        
-      } catch (error: any) {
-        setStep('error');
-        const errorMsg = error?.response?.data?.detail || error?.message || 'Error al procesar el archivo';
-        setErrorMessage(errorMsg);
-        message.error(errorMsg);
-      }
-
+      await runUpload(file);
       return false; // Prevenir upload automático
     },
   };
@@ -88,7 +138,8 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
     switch (step) {
       case 'uploading': return 0;
       case 'analyzing': return 1;
-      case 'complete': return 2;
+      case 'complete':
+      case 'reused': return 2;
       default: return -1;
     }
   };
@@ -130,6 +181,26 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
       );
     }
 
+    if (step === 'reused' && reused) {
+      return (
+        <div style={{ textAlign: 'center', padding: '40px 20px' }}>
+          <CopyOutlined style={{ fontSize: 48, color: '#1890ff', marginBottom: 16 }} />
+          <Title level={4}>RFP ya analizado</Title>
+          <Text type="secondary">{reused.message}</Text>
+          <div style={{ marginTop: 24 }}>
+            <Space>
+              <Button type="primary" onClick={handleKeepReused}>
+                Usar análisis existente
+              </Button>
+              <Button onClick={handleForceReanalysis}>
+                Analizar de nuevo
+              </Button>
+            </Space>
+          </div>
+        </div>
+      );
+    }
+
     // Estados de progreso
     return (
       <div style={{ padding: '20px 0' }}>
@@ -173,11 +244,13 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
               />
               <div style={{ marginTop: 16 }}>
                 <Text type="secondary">
-                  Analizando documento con Gemini...
+                  {progressMessage || 'Analizando documento con Gemini'}...
                 </Text>
                 <br />
                 <Text type="secondary" style={{ fontSize: 12 }}>
-                  Esto puede tomar entre 30 segundos y 2 minutos
+                  {generatedChars > 0
+                    ? `${generatedChars.toLocaleString()} caracteres generados`
+                    : 'Esto puede tomar entre 30 segundos y 2 minutos'}
                 </Text>
               </div>
             </>
@@ -203,7 +276,7 @@ const UploadModal: React.FC<UploadModalProps> = ({ open, onCancel, onSuccess })
       onCancel={handleCancel}
       footer={null}
       width={500}
-      closable={step === 'idle' || step === 'error' || step === 'complete'}
+      closable={step === 'idle' || step === 'error' || step === 'complete' || step === 'reused'}
       maskClosable={step === 'idle' || step === 'error'}
     >
       {renderContent()}
@@ -14,6 +14,7 @@ import type {
   RFPDecision,
   RFPUpdate,
   UploadResponse,
+  RFPAnalysisStreamEvent,
   TeamSuggestionResponse,
   TeamEstimation,
   CostEstimation,
@@ -75,13 +76,13 @@ export const authApi = {
     return data;
   },
 
-  getPreferences: async (): Promise<{ analysis_mode: 'fast' | 'balanced' | 'deep' }> => {
-    const { data } = await api.get<{ analysis_mode: 'fast' | 'balanced' | 'deep' }>('/auth/preferences');
+  getPreferences: async (): Promise<{ analysis_mode: 'fast' | 'balanced' | 'deep' | 'cascade' }> => {
+    const { data } = await api.get<{ analysis_mode: 'fast' | 'balanced' | 'deep' | 'cascade' }>('/auth/preferences');
     return data;
   },
 
-  updatePreferences: async (prefs: { analysis_mode: 'fast' | 'balanced' | 'deep' }): Promise<{ analysis_mode: 'fast' | 'balanced' | 'deep' }> => {
-    const { data } = await api.put<{ analysis_mode: 'fast' | 'balanced' | 'deep' }>('/auth/preferences', prefs);
+  updatePreferences: async (prefs: { analysis_mode: 'fast' | 'balanced' | 'deep' | 'cascade' }): Promise<{ analysis_mode: 'fast' | 'balanced' | 'deep' | 'cascade' }> => {
+    const { data } = await api.put<{ analysis_mode: 'fast' | 'balanced' | 'deep' | 'cascade' }>('/auth/preferences', prefs);
     return data;
   },
 };
@@ -139,14 +140,87 @@ export const rfpApi = {
     return data;
   },
 
-  upload: async (file: File): Promise<UploadResponse> => {
+  upload: async (file: File, forceReanalysis = false): Promise<UploadResponse> => {
     const formData = new FormData();
     formData.append('file', file);
 
-    const { data } = await api.post<UploadResponse>('/rfp/upload', formData);
+    const { data } = await api.post<UploadResponse>('/rfp/upload', formData, {
+      params: forceReanalysis ? { force_reanalysis: true } : {},
+    });
     return data;
   },
 
+  /**
+   * Sube un RFP y recibe el progreso del análisis por SSE.
+   * Usa fetch porque axios no expone el stream de la respuesta en el navegador.
+   * Si ya existe un RFP idéntico analizado, el resultado trae `reused_from`;
+   * `forceReanalysis` analiza de todas formas.
+   */
+  uploadStream: async (
+    file: File,
+    onEvent: (event: RFPAnalysisStreamEvent) => void,
+    forceReanalysis = false,
+  ): Promise<UploadResponse> => {
+    const formData = new FormData();
+    formData.append('file', file);
+
+    const token = localStorage.getItem('access_token');
+    const query = forceReanalysis ? '?force_reanalysis=true' : '';
+    const response = await fetch(`${API_BASE_URL}/rfp/upload/stream${query}`, {
+      method: 'POST',
+      body: formData,
+      headers: token ? { Authorization: `Bearer ${token}` } : undefined,
+    });
+
+    if (!response.ok || !response.body) {
+      const detail = await response.json().catch(() => null);
+      throw new Error(detail?.detail || `Error ${response.status} al subir el archivo`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let result: UploadResponse | null = null;
+
+    while (true) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Los eventos SSE se separan por línea en blanco
+      let boundary = buffer.indexOf('\n\n');
+      while (boundary !== -1) {
+        const raw = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        boundary = buffer.indexOf('\n\n');
+
+        let eventType = 'message';
+        let data = '';
+        for (const line of raw.split('\n')) {
+          if (line.startsWith('event:')) eventType = line.slice(6).trim();
+          else if (line.startsWith('data:')) data += line.slice(5).trim();
+        }
+        if (!data) continue; // keep-alive
+
+        const event = { type: eventType, ...JSON.parse(data) } as RFPAnalysisStreamEvent;
+        onEvent(event);
+        if (event.type === 'error') throw new Error(event.detail);
+        if (event.type === 'done') {
+          result = {
+            id: event.id,
+            file_name: event.file_name,
+            status: event.status,
+            message: event.message,
+            reused_from: event.reused_from,
+          };
+        }
+      }
+    }
+
+    if (!result) throw new Error('El análisis terminó sin resultado');
+    return result;
+  },
+
   makeDecision: async (id: string, decision: RFPDecision): Promise<RFPDetail> => {
     const { data } = await api.post<RFPDetail>(`/rfp/${id}/decision`, decision);
     return data;
@@ -157,8 +231,10 @@ export const rfpApi = {
     return data;
   },
 
-  regenerateQuestions: async (id: string): Promise<RFPQuestion[]> => {
-    const { data } = await api.post<RFPQuestion[]>(`/rfp/${id}/questions/regenerate`);
+  regenerateQuestions: async (id: string, force = true): Promise<RFPQuestion[]> => {
+    const { data } = await api.post<RFPQuestion[]>(`/rfp/${id}/questions/regenerate`, null, {
+      params: { force },
+    });
     return data;
   },
 
@@ -8,6 +8,7 @@ import {
   ThunderboltOutlined,
   StarOutlined,
   ExperimentOutlined,
+  RiseOutlined,
   CheckCircleFilled,
 } from '@ant-design/icons';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
@@ -18,7 +19,7 @@ const { Title, Text, Paragraph } = Typography;
 const { Content } = Layout;
 
 interface AnalysisMode {
-  key: 'fast' | 'balanced' | 'deep';
+  key: 'fast' | 'balanced' | 'deep' | 'cascade';
   icon: React.ReactNode;
   title: string;
   description: string;
@@ -53,6 +54,14 @@ const analysisModes: AnalysisMode[] = [
     details: 'Para RFPs importantes o complejos donde necesitas el máximo detalle. Toma más tiempo pero no deja nada sin revisar.',
     color: '#52c41a',
   },
+  {
+    key: 'cascade',
+    icon: <RiseOutlined style={{ fontSize: 48 }} />,
+    title: 'Inteligente',
+    description: 'Rápido cuando se puede, profundo cuando hace falta',
+    details: 'Empieza con el análisis rápido y, si el resultado no es lo bastante confiable o completo, lo repite automáticamente en modo profundo.',
+    color: '#722ed1',
+  },
 ];
 
 const SettingsPage: React.FC = () => {
@@ -77,7 +86,7 @@ const SettingsPage: React.FC = () => {
     },
   });
 
-  const handleSelectMode = (mode: 'fast' | 'balanced' | 'deep') => {
+  const handleSelectMode = (mode: 'fast' | 'balanced' | 'deep' | 'cascade') => {
     updatePreferences.mutate({ analysis_mode: mode });
   };
 
@@ -115,7 +124,7 @@ const SettingsPage: React.FC = () => {
               {analysisModes.map((mode) => {
                 const isSelected = currentMode === mode.key;
                 return (
-                  <Col xs={24} md={8} key={mode.key}>
+                  <Col xs={24} md={12} xl={6} key={mode.key}>
                     <Card
                       hoverable
                       onClick={() => handleSelectMode(mode.key)}
@@ -184,8 +184,27 @@ export interface UploadResponse {
   file_name: string;
   status: RFPStatus;
   message: string;
+  reused_from?: string | null; // RFP idéntico cuyo análisis se reutilizó
 }
 
+// Eventos SSE de /rfp/upload/stream
+export type RFPAnalysisStreamEvent =
+  | { type: 'accepted'; id: string; file_name: string }
+  | {
+      type: 'progress';
+      stage: string;
+      message: string;
+      chars?: number;
+      strategy?: string;
+      tokens?: number;
+      saved_tokens?: number;
+      done?: number;
+      total?: number;
+    }
+  | { type: 'token'; text: string; chars: number }
+  | ({ type: 'done' } & UploadResponse)
+  | { type: 'error'; id: string; detail: string; status?: number };
+
 // ============ TEAM & COST ESTIMATION ============
 
 export type Scenario = 'A' | 'B' | 'C' | 'D';
@@ -5,7 +5,9 @@ Proceso:
 1. Lee el archivo (PDF o DOCX)
 2. Extrae el texto por pagina
 3. [NUEVO] Extrae texto de imagenes usando Gemini Vision (certificaciones, badges, etc.)
+   solo en las paginas dominadas por imagenes o escaneadas (gating por densidad de texto)
 4. Divide el texto en chunks con overlap para busqueda semantica
+   (por caracteres o por tokens del modelo de embeddings, cortando en oraciones)
 5. Retorna lista de chunks listos para vectorizar
 
 Version 2.0 - Ahora con soporte Vision OCR para imagenes en CVs
@@ -13,7 +15,7 @@ Version 2.0 - Ahora con soporte Vision OCR para imagenes en CVs
 
 import re
 from pathlib import Path
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional, Tuple, Dict, Any
 from dataclasses import dataclass
 import logging
 
@@ -42,6 +44,17 @@ except ImportError:
     VISION_AVAILABLE = False
     logger.info("Vision OCR no disponible (cv_vision.py no encontrado)")
 
+# Gating de Vision OCR por pagina
+OCR_MIN_TEXT_CHARS = 200  # Paginas con menos caracteres se consideran escaneadas
+OCR_MIN_IMAGE_COVERAGE = 0.35  # Fraccion del area de la pagina cubierta por imagenes
+OCR_MIN_BADGE_IMAGES = 3  # Paginas con varias imagenes (badges/logos de certificaciones)
+OCR_MIN_IMAGE_AREA_RATIO = 0.005  # Imagenes mas pequenas (bullets, iconos) no cuentan
+
+# Chunking
+CHUNK_MODES = ("chars", "tokens")
+VISION_CHUNK_PREFIX = "[IMAGEN] "
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?;])\s+|\n+')
+
 
 @dataclass
 class CVChunk:
@@ -62,6 +75,95 @@ class CVChunk:
     cv_filename: str
 
 
+@dataclass
+class PageProfile:
+    """
+    Perfil de una pagina PDF usado para decidir si enviarla a Vision OCR.
+    
+    Attributes:
+        page_num: Numero de pagina (base 1)
+        text_chars: Caracteres no blancos de la capa de texto
+        text_coverage: Fraccion del area cubierta por bloques de texto
+        image_count: Imagenes visibles de tamano relevante
+        image_coverage: Fraccion del area cubierta por imagenes
+    """
+    page_num: int
+    text_chars: int
+    text_coverage: float
+    image_count: int
+    image_coverage: float
+    
+    @property
+    def needs_ocr(self) -> bool:
+        """La pagina parece escaneada o dominada por imagenes."""
+        if self.image_count == 0:
+            return False  # Vision solo procesa imagenes embebidas
+        return (
+            self.text_chars < OCR_MIN_TEXT_CHARS
+            or self.image_coverage >= OCR_MIN_IMAGE_COVERAGE
+            or self.image_coverage > self.text_coverage
+            or self.image_count >= OCR_MIN_BADGE_IMAGES
+        )
+
+
+def _rect_area(rect) -> float:
+    """Area de un rectangulo fitz (0 si es vacio o invalido)."""
+    if rect.is_empty or rect.is_infinite:
+        return 0.0
+    return abs(rect.width * rect.height)
+
+
+def profile_pdf_pages(filepath: Path) -> List[PageProfile]:
+    """
+    Calcula densidad de texto y cobertura de imagenes de cada pagina de un PDF.
+    
+    Args:
+        filepath: Ruta al archivo PDF
+        
+    Returns:
+        Lista de PageProfile (vacia si PyMuPDF no esta disponible o hay error)
+    """
+    if not PYMUPDF_AVAILABLE:
+        return []
+    
+    profiles = []
+    try:
+        doc = fitz.open(filepath)
+        for page_num, page in enumerate(doc, 1):
+            page_rect = page.rect
+            page_area = _rect_area(page_rect) or 1.0
+            
+            text_chars = len(re.sub(r'\s+', '', page.get_text("text") or ""))
+            text_area = sum(
+                _rect_area(fitz.Rect(block[:4]) & page_rect)
+                for block in page.get_text("blocks")
+                if block[6] == 0  # Bloques de texto (1 = imagen)
+            )
+            
+            image_count = 0
+            image_area = 0.0
+            for info in page.get_image_info():
+                area = _rect_area(fitz.Rect(info["bbox"]) & page_rect)
+                if area / page_area < OCR_MIN_IMAGE_AREA_RATIO:
+                    continue
+                image_count += 1
+                image_area += area
+            
+            profiles.append(PageProfile(
+                page_num=page_num,
+                text_chars=text_chars,
+                text_coverage=min(text_area / page_area, 1.0),
+                image_count=image_count,
+                image_coverage=min(image_area / page_area, 1.0),
+            ))
+        doc.close()
+    except Exception as e:
+        logger.warning(f"Error perfilando paginas de {filepath.name}: {e}")
+        return []
+    
+    return profiles
+
+
 class CVProcessor:
     """
     Procesa CVs y los prepara para busqueda semantica.
@@ -78,7 +180,12 @@ class CVProcessor:
         cvs_folder: Path, 
         chunk_size: int = 500, 
         overlap: int = 100,
-        use_vision: bool = True  # Nuevo parametro
+        use_vision: bool = True,  # Nuevo parametro
+        ocr_gating: bool = True,
+        chunk_mode: str = "chars",
+        tokenizer: Optional[Any] = None,
+        max_tokens: int = 126,
+        overlap_tokens: int = 24
     ):
         """
         Inicializa el procesador.
@@ -88,11 +195,59 @@ class CVProcessor:
             chunk_size: Tamano maximo de cada chunk en caracteres
             overlap: Caracteres de overlap entre chunks consecutivos
             use_vision: Si usar Gemini Vision para extraer texto de imagenes
+            ocr_gating: Si enviar a Vision solo las paginas PDF dominadas por imagenes
+            chunk_mode: "chars" (chunk_size/overlap en caracteres) o "tokens"
+                (presupuesto de tokens del modelo de embeddings, cortando en oraciones)
+            tokenizer: Tokenizer HuggingFace del modelo de embeddings (requerido en modo "tokens")
+            max_tokens: Tokens maximos por chunk sin contar tokens especiales
+            overlap_tokens: Tokens maximos de overlap (oraciones completas) entre chunks
         """
+        if chunk_mode not in CHUNK_MODES:
+            raise ValueError(f"chunk_mode invalido: {chunk_mode}. Opciones: {CHUNK_MODES}")
+        if chunk_mode == "tokens" and tokenizer is None:
+            logger.warning("chunk_mode='tokens' sin tokenizer, usando chunking por caracteres")
+            chunk_mode = "chars"
+        
         self.cvs_folder = cvs_folder
         self.chunk_size = chunk_size
         self.overlap = overlap
         self.use_vision = use_vision and VISION_AVAILABLE
+        self.ocr_gating = ocr_gating
+        self.chunk_mode = chunk_mode
+        self.tokenizer = tokenizer
+        self.max_tokens = max_tokens
+        self.overlap_tokens = min(overlap_tokens, max_tokens // 2)
+        self.ocr_stats = {"paginas_ocr": 0, "paginas_omitidas": 0, "cvs_sin_ocr": 0}
+    
+    def select_ocr_pages(self, filepath: Path) -> Optional[List[int]]:
+        """
+        Decide que paginas de un CV enviar a Vision OCR.
+        
+        Args:
+            filepath: Ruta al archivo CV
+            
+        Returns:
+            Lista de paginas (base 1) a procesar, o None para procesar todas
+            (DOCX, gating deshabilitado o sin perfil disponible)
+        """
+        if not self.ocr_gating or filepath.suffix.lower() != '.pdf':
+            return None
+        
+        profiles = profile_pdf_pages(filepath)
+        if not profiles:
+            return None
+        
+        selected = [p.page_num for p in profiles if p.needs_ocr]
+        self.ocr_stats["paginas_ocr"] += len(selected)
+        self.ocr_stats["paginas_omitidas"] += len(profiles) - len(selected)
+        if not selected:
+            self.ocr_stats["cvs_sin_ocr"] += 1
+        
+        logger.debug(
+            f"  Gating OCR {filepath.name}: {len(selected)}/{len(profiles)} paginas "
+            f"(paginas: {selected})"
+        )
+        return selected
     
     def extract_text_from_pdf(self, filepath: Path) -> List[Tuple[int, str]]:
         """
@@ -203,7 +358,107 @@ class CVProcessor:
         
         return text.strip()
     
-    def chunk_text(self, text: str) -> List[str]:
+    def count_tokens(self, text: str) -> int:
+        """Cuenta tokens (sin tokens especiales) con el tokenizer del modelo."""
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+    
+    def chunk_text(self, text: str, reserved_tokens: int = 0) -> List[str]:
+        """
+        Divide el texto en chunks con overlap segun el modo configurado.
+        
+        Args:
+            text: Texto a dividir
+            reserved_tokens: Tokens a reservar por chunk (ej. prefijos), solo modo "tokens"
+            
+        Returns:
+            Lista de chunks
+        """
+        if self.chunk_mode == "tokens":
+            return self.chunk_text_by_tokens(text, reserved_tokens)
+        return self.chunk_text_by_chars(text)
+    
+    def _split_sentences(self, text: str, budget: int) -> List[Tuple[str, int]]:
+        """
+        Divide el texto en oraciones (o lineas) con su conteo de tokens.
+        Las oraciones que exceden el presupuesto se parten por palabras.
+        """
+        units = []
+        for sentence in _SENTENCE_SPLIT.split(text):
+            sentence = re.sub(r'\s+', ' ', sentence).strip()
+            if not sentence:
+                continue
+            
+            n_tokens = self.count_tokens(sentence)
+            if n_tokens <= budget:
+                units.append((sentence, n_tokens))
+                continue
+            
+            # Oracion demasiado larga: agrupar palabras hasta el presupuesto
+            words, word_tokens = [], 0
+            for word in sentence.split(' '):
+                n_word = self.count_tokens(word)
+                if words and word_tokens + n_word > budget:
+                    units.append((' '.join(words), word_tokens))
+                    words, word_tokens = [], 0
+                words.append(word)
+                word_tokens += n_word
+            if words:
+                units.append((' '.join(words), word_tokens))
+        
+        return units
+    
+    def chunk_text_by_tokens(self, text: str, reserved_tokens: int = 0) -> List[str]:
+        """
+        Divide el texto en chunks que caben en el limite de tokens del encoder.
+        
+        Agrupa oraciones completas hasta max_tokens y repite al inicio del
+        siguiente chunk las ultimas oraciones que sumen hasta overlap_tokens.
+        Asi ningun chunk se trunca al generar el embedding.
+        
+        Args:
+            text: Texto a dividir
+            reserved_tokens: Tokens a reservar por chunk (ej. prefijo "[IMAGEN] ")
+            
+        Returns:
+            Lista de chunks
+        """
+        budget = max(self.max_tokens - reserved_tokens, 8)
+        units = self._split_sentences(text, budget)
+        
+        chunks = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        new_units = 0  # Oraciones del chunk actual que no vienen del overlap
+        
+        for sentence, n_tokens in units:
+            if current and current_tokens + n_tokens > budget:
+                chunks.append(' '.join(s for s, _ in current))
+                
+                # Overlap: ultimas oraciones completas dentro de overlap_tokens
+                overlap: List[Tuple[str, int]] = []
+                overlap_total = 0
+                for prev in reversed(current):
+                    if overlap_total + prev[1] > self.overlap_tokens:
+                        break
+                    overlap.insert(0, prev)
+                    overlap_total += prev[1]
+                
+                # El overlap nunca debe impedir que entre la oracion nueva
+                while overlap and overlap_total + n_tokens > budget:
+                    overlap_total -= overlap.pop(0)[1]
+                
+                current, current_tokens, new_units = overlap, overlap_total, 0
+            
+            current.append((sentence, n_tokens))
+            current_tokens += n_tokens
+            new_units += 1
+        
+        if current and new_units:
+            chunks.append(' '.join(s for s, _ in current))
+        
+        return chunks
+    
+    def chunk_text_by_chars(self, text: str) -> List[str]:
         """
         Divide el texto en chunks con overlap.
         
@@ -311,21 +566,26 @@ class CVProcessor:
         # [NUEVO] Extraer texto de imagenes con Gemini Vision
         if self.use_vision:
             try:
-                vision_text = process_cv_with_vision(filepath)
+                ocr_pages = self.select_ocr_pages(filepath)
+                if ocr_pages == []:
+                    vision_text = ""  # Capa de texto suficiente en todas las paginas
+                else:
+                    vision_text = process_cv_with_vision(filepath, pages=ocr_pages)
                 if vision_text:
                     logger.info(f"  Vision OCR: {len(vision_text)} chars extraidos de imagenes")
                     
                     # Limpiar y chunkerizar el texto de imagenes
                     cleaned_vision = self.clean_text(vision_text)
                     if cleaned_vision:
-                        for chunk_text in self.chunk_text(cleaned_vision):
+                        reserved = self.count_tokens(VISION_CHUNK_PREFIX) if self.chunk_mode == "tokens" else 0
+                        for chunk_text in self.chunk_text(cleaned_vision, reserved_tokens=reserved):
                             if len(chunk_text) < 20:
                                 continue
                             
                             chunks.append(CVChunk(
                                 matricula=matricula,
                                 chunk_id=chunk_id,
-                                text=f"[IMAGEN] {chunk_text}",  # Prefijo para identificar
+                                text=f"{VISION_CHUNK_PREFIX}{chunk_text}",  # Prefijo para identificar
                                 page_num=0,  # Imagenes no tienen pagina especifica en este contexto
                                 cv_filename=filepath.name
                             ))
@@ -378,6 +638,12 @@ class CVProcessor:
                 logger.warning(f"  {filepath.name[:40]:<40} -> Sin contenido")
         
         logger.info(f"Procesados: {processed}, Omitidos: {skipped}, Total chunks: {len(all_chunks)}")
+        if self.use_vision and self.ocr_gating:
+            logger.info(
+                f"Gating OCR: {self.ocr_stats['paginas_ocr']} paginas a Vision, "
+                f"{self.ocr_stats['paginas_omitidas']} omitidas por tener capa de texto, "
+                f"{self.ocr_stats['cvs_sin_ocr']} CVs sin llamadas a Vision"
+            )
         
         return all_chunks
     
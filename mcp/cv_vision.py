@@ -17,11 +17,12 @@ Uso:
 import os
 import io
 import json
+import math
 import base64
 import hashlib
 import logging
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable
 from dataclasses import dataclass
 from dotenv import load_dotenv
 
@@ -36,6 +37,15 @@ VISION_CACHE_FILE = Path(__file__).parent / "vision_cache.json"
 MIN_IMAGE_SIZE = 5000  # Bytes - ignorar imagenes muy pequenas (iconos)
 MAX_IMAGES_PER_PDF = 20  # Limite de imagenes por PDF
 
+# Preprocesamiento de imagenes (antes de llamar a Gemini)
+MAX_IMAGE_DIMENSION = 1600  # Pixeles - lado mayor maximo enviado a Vision
+DOWNSAMPLE_JPEG_QUALITY = 85  # Calidad JPEG al re-codificar imagenes reducidas
+MAX_ASPECT_RATIO = 6.0  # Imagenes mas alargadas son separadores/banners decorativos
+MIN_IMAGE_ENTROPY = 1.5  # Bits - por debajo es un fondo plano o degradado sin texto
+PHASH_CACHE_PREFIX = "phash:"  # Prefijo de las entradas por hash perceptual en el cache
+MAX_PHASH_VARIANTS = 8  # Imagenes distintas guardadas bajo un mismo hash perceptual
+NO_TEXT_RESPONSES = ("SIN_TEXTO", "SIN_TEXT", "NO_TEXT")
+
 # Prompt para extraccion de texto
 VISION_PROMPT = """Analiza esta imagen de un CV/currículum y extrae TODO el texto visible.
 
@@ -61,12 +71,160 @@ class ImageText:
     image_hash: str  # Para cache
 
 
+@dataclass
+class PreparedImage:
+    """Imagen lista para enviar a Vision tras el preprocesamiento."""
+    image_bytes: bytes
+    mime_type: str
+    phash: Optional[str]  # dHash de 64 bits en hex (None si no se pudo decodificar)
+    fine_hash: Optional[str] = None  # dHash de 256 bits (16x16) que confirma una coincidencia
+    width: int = 0
+    height: int = 0
+    decorative: bool = False
+    original_size: int = 0
+
+    def matches(self, entry: Any) -> bool:
+        """True si una variante guardada bajo el mismo phash es esta misma imagen."""
+        return (
+            isinstance(entry, dict)
+            and self.fine_hash is not None
+            and entry.get("fine_hash") == self.fine_hash
+            and entry.get("size") == [self.width, self.height]
+        )
+
+
 def _get_image_hash(image_bytes: bytes) -> str:
     """Genera hash MD5 de la imagen para cache."""
     return hashlib.md5(image_bytes).hexdigest()
 
 
-def _load_cache() -> Dict[str, str]:
+def _detect_mime_type(image_bytes: bytes) -> str:
+    """Detecta el tipo MIME a partir de la firma de los bytes."""
+    if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
+        return "image/png"
+    if image_bytes[:2] == b'\xff\xd8':
+        return "image/jpeg"
+    return "image/png"  # Default
+
+
+def _to_rgb_or_gray(pix):
+    """Normaliza un Pixmap a GRAY/RGB sin canal alfa (CMYK, indexados, etc.)."""
+    import fitz
+
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)
+    if pix.n not in (1, 3):
+        pix = fitz.Pixmap(fitz.csRGB, pix)
+    return pix
+
+
+def _grayscale_samples(pix, width: int, height: int) -> bytes:
+    """Reduce el Pixmap a escala de grises de width x height y retorna sus muestras."""
+    import fitz
+
+    gray = pix if pix.n == 1 else fitz.Pixmap(fitz.csGRAY, pix)
+    small = fitz.Pixmap(gray, width, height)
+    if small.width != width or small.height != height:
+        return b""
+    # Quitar padding por fila si lo hubiera
+    if small.stride != width:
+        samples = small.samples
+        return b"".join(samples[r * small.stride:r * small.stride + width] for r in range(height))
+    return bytes(small.samples)
+
+
+def _dhash(pix, size: int = 8) -> Optional[str]:
+    """
+    Hash perceptual (difference hash) de size x size bits.
+    Es estable frente a re-codificacion y compresion (JPEG/PNG, calidad).
+    Con size=8 (64 bits) badges de igual diseno que solo difieren en texto
+    chico (AZ-104 / AZ-900) colisionan: sirve solo de clave de busqueda. El
+    OCR se reutiliza cuando ademas coinciden el hash de size=16 y las
+    dimensiones en pixeles, por lo que el mismo badge embebido a otra
+    resolucion se vuelve a procesar.
+    """
+    samples = _grayscale_samples(pix, size + 1, size)
+    if len(samples) != (size + 1) * size:
+        return None
+
+    bits = 0
+    for row in range(size):
+        offset = row * (size + 1)
+        for col in range(size):
+            bits = (bits << 1) | (1 if samples[offset + col] > samples[offset + col + 1] else 0)
+    return f"{bits:0{size * size // 4}x}"
+
+
+def _entropy(pix) -> float:
+    """Entropia de Shannon (bits) del histograma de grises de una version reducida."""
+    size = 64
+    samples = _grayscale_samples(pix, size, size)
+    if not samples:
+        return 8.0  # Sin informacion: no descartar
+
+    histogram = [0] * 256
+    for value in samples:
+        histogram[value] += 1
+
+    total = len(samples)
+    entropy = 0.0
+    for count in histogram:
+        if count:
+            p = count / total
+            entropy -= p * math.log2(p)
+    return entropy
+
+
+def prepare_image(image_bytes: bytes) -> PreparedImage:
+    """
+    Preprocesa una imagen antes de enviarla a Gemini Vision:
+    - Calcula hash perceptual para reutilizar OCR entre CVs
+    - Marca como decorativas las imagenes muy alargadas o de baja entropia
+    - Reduce imagenes sobredimensionadas (lado mayor > MAX_IMAGE_DIMENSION)
+
+    Si PyMuPDF no esta disponible o la imagen no se puede decodificar,
+    retorna los bytes originales sin hash perceptual.
+    """
+    prepared = PreparedImage(
+        image_bytes=image_bytes,
+        mime_type=_detect_mime_type(image_bytes),
+        phash=None,
+        original_size=len(image_bytes),
+    )
+
+    try:
+        import fitz  # PyMuPDF
+
+        pix = _to_rgb_or_gray(fitz.Pixmap(image_bytes))
+        width, height = pix.width, pix.height
+        if width < 1 or height < 1:
+            return prepared
+
+        prepared.phash = _dhash(pix)
+        prepared.fine_hash = _dhash(pix, 16)
+        prepared.width, prepared.height = width, height
+
+        aspect = max(width, height) / min(width, height)
+        if aspect > MAX_ASPECT_RATIO or _entropy(pix) < MIN_IMAGE_ENTROPY:
+            prepared.decorative = True
+            return prepared
+
+        longest = max(width, height)
+        if longest > MAX_IMAGE_DIMENSION:
+            scale = MAX_IMAGE_DIMENSION / longest
+            resized = fitz.Pixmap(pix, max(1, int(width * scale)), max(1, int(height * scale)))
+            resized_bytes = resized.tobytes("jpeg", jpg_quality=DOWNSAMPLE_JPEG_QUALITY)
+            if len(resized_bytes) < len(image_bytes):
+                prepared.image_bytes = resized_bytes
+                prepared.mime_type = "image/jpeg"
+
+    except Exception as e:
+        logger.debug(f"No se pudo preprocesar imagen: {e}")
+
+    return prepared
+
+
+def _load_cache() -> Dict[str, Any]:
     """Carga cache de textos ya extraidos."""
     if VISION_CACHE_FILE.exists():
         try:
@@ -77,7 +235,7 @@ def _load_cache() -> Dict[str, str]:
     return {}
 
 
-def _save_cache(cache: Dict[str, str]) -> None:
+def _save_cache(cache: Dict[str, Any]) -> None:
     """Guarda cache de textos extraidos."""
     try:
         with open(VISION_CACHE_FILE, "w", encoding="utf-8") as f:
@@ -86,9 +244,11 @@ def _save_cache(cache: Dict[str, str]) -> None:
         logger.warning(f"Error guardando cache de vision: {e}")
 
 
-def _call_gemini_vision(image_bytes: bytes) -> Optional[str]:
+def _call_gemini_vision(image_bytes: bytes, mime_type: Optional[str] = None) -> Optional[str]:
     """
     Llama a Gemini Flash con una imagen y retorna el texto extraido.
+    Retorna "" si la imagen no tiene texto y None si la llamada fallo
+    (lo que no se debe guardar en cache).
     """
     if not GOOGLE_API_KEY:
         logger.error("GOOGLE_API_KEY no configurada")
@@ -101,12 +261,7 @@ def _call_gemini_vision(image_bytes: bytes) -> Optional[str]:
         image_b64 = base64.b64encode(image_bytes).decode("utf-8")
         
         # Detectar tipo de imagen
-        if image_bytes[:8] == b'\x89PNG\r\n\x1a\n':
-            mime_type = "image/png"
-        elif image_bytes[:2] == b'\xff\xd8':
-            mime_type = "image/jpeg"
-        else:
-            mime_type = "image/png"  # Default
+        mime_type = mime_type or _detect_mime_type(image_bytes)
         
         # Request a Gemini
         url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent?key={GOOGLE_API_KEY}"
@@ -143,8 +298,7 @@ def _call_gemini_vision(image_bytes: bytes) -> Optional[str]:
                     if len(parts) > 0 and "text" in parts[0]:
                         text = parts[0]["text"].strip()
                         # Filtrar respuestas que indican que no hay texto
-                        if text and text not in ["SIN_TEXTO", "SIN_TEXT", "NO_TEXT", ""]:
-                            return text
+                        return "" if text in NO_TEXT_RESPONSES else text
             
             return None
             
@@ -153,12 +307,17 @@ def _call_gemini_vision(image_bytes: bytes) -> Optional[str]:
         return None
 
 
-def extract_images_from_pdf(pdf_path: Path) -> List[tuple]:
+def extract_images_from_pdf(pdf_path: Path, pages: Optional[Iterable[int]] = None) -> List[tuple]:
     """
     Extrae imagenes de un PDF.
     Retorna lista de (page_num, image_index, image_bytes).
+    
+    Args:
+        pdf_path: Ruta al PDF
+        pages: Numeros de pagina (base 1) a procesar. None = todas.
     """
     images = []
+    page_filter = set(pages) if pages is not None else None
     
     try:
         import fitz  # PyMuPDF
@@ -166,6 +325,9 @@ def extract_images_from_pdf(pdf_path: Path) -> List[tuple]:
         doc = fitz.open(pdf_path)
         
         for page_num, page in enumerate(doc, 1):
+            if page_filter is not None and page_num not in page_filter:
+                continue
+            
             image_list = page.get_images(full=True)
             
             for img_index, img_info in enumerate(image_list):
@@ -244,7 +406,8 @@ def extract_images_from_docx(docx_path: Path) -> List[tuple]:
 
 def extract_text_from_images(
     file_path: Path,
-    use_cache: bool = True
+    use_cache: bool = True,
+    pages: Optional[Iterable[int]] = None
 ) -> List[ImageText]:
     """
     Extrae texto de todas las imagenes de un CV (PDF o DOCX).
@@ -252,6 +415,7 @@ def extract_text_from_images(
     Args:
         file_path: Ruta al archivo PDF o DOCX
         use_cache: Si usar cache de textos ya extraidos
+        pages: Paginas del PDF a procesar (base 1). None = todas. Ignorado en DOCX.
     
     Returns:
         Lista de ImageText con el texto extraido de cada imagen
@@ -264,7 +428,7 @@ def extract_text_from_images(
     suffix = file_path.suffix.lower()
     
     if suffix == ".pdf":
-        images = extract_images_from_pdf(file_path)
+        images = extract_images_from_pdf(file_path, pages=pages)
     elif suffix in [".docx", ".doc"]:
         images = extract_images_from_docx(file_path)
     else:
@@ -277,25 +441,66 @@ def extract_text_from_images(
     
     logger.info(f"Procesando {len(images)} imagenes de {file_path.name} con Gemini Vision...")
     
+    seen_images = set()  # Imagenes repetidas dentro del mismo archivo (confirmadas)
+    stats = {"decorativas": 0, "duplicadas": 0, "reutilizadas": 0, "llamadas": 0, "bytes_ahorrados": 0}
+    
     for page_num, img_index, image_bytes in images:
         image_hash = _get_image_hash(image_bytes)
         
-        # Verificar cache
+        # Verificar cache exacto (mismos bytes)
         if use_cache and image_hash in cache:
             text = cache[image_hash]
             logger.debug(f"  Cache hit para imagen {img_index} de pagina {page_num}")
         else:
-            # Llamar a Gemini Vision
-            text = _call_gemini_vision(image_bytes)
+            prepared = prepare_image(image_bytes)
+            phash_key = f"{PHASH_CACHE_PREFIX}{prepared.phash}" if prepared.phash else None
+            # Solo se considera la misma imagen si tambien coinciden el hash fino y las dimensiones
+            image_key = (prepared.phash, prepared.fine_hash, prepared.width, prepared.height) if prepared.fine_hash else None
             
-            if text:
-                cache[image_hash] = text
-                cache_updated = True
-                logger.info(f"  Extraido texto de imagen {img_index} (pag {page_num}): {text[:50]}...")
+            if prepared.decorative:
+                stats["decorativas"] += 1
+                logger.debug(f"  Imagen {img_index} (pag {page_num}) descartada como decorativa")
+                continue
+            
+            if image_key and image_key in seen_images:
+                stats["duplicadas"] += 1
+                continue
+            
+            # Variantes guardadas bajo el mismo phash (entradas antiguas sin confirmacion se ignoran)
+            variants = cache.get(phash_key) if use_cache and phash_key else None
+            variants = variants if isinstance(variants, list) else []
+            match = next((v for v in variants if prepared.matches(v)), None)
+            
+            if match is not None:
+                # Misma imagen visual ya procesada en otro CV
+                text = match.get("text") or ""
+                stats["reutilizadas"] += 1
+                logger.debug(f"  Hash perceptual reutilizado para imagen {img_index} de pagina {page_num}")
             else:
-                # Guardar en cache como vacio para no reprocesar
-                cache[image_hash] = ""
+                # Llamar a Gemini Vision
+                text = _call_gemini_vision(prepared.image_bytes, prepared.mime_type)
+                stats["llamadas"] += 1
+                stats["bytes_ahorrados"] += prepared.original_size - len(prepared.image_bytes)
+                
+                if text:
+                    logger.info(f"  Extraido texto de imagen {img_index} (pag {page_num}): {text[:50]}...")
+                
+                # Un fallo de la llamada (None) no se guarda: se reintenta en el proximo CV
+                if phash_key and image_key and text is not None:
+                    variants.append({
+                        "text": text,
+                        "fine_hash": prepared.fine_hash,
+                        "size": [prepared.width, prepared.height],
+                    })
+                    cache[phash_key] = variants[-MAX_PHASH_VARIANTS:]
+                    cache_updated = True
+            
+            # Guardar en cache (vacio para no reprocesar imagenes sin texto)
+            if text is not None:
+                cache[image_hash] = text
                 cache_updated = True
+            if image_key:
+                seen_images.add(image_key)
         
         if text:
             results.append(ImageText(
@@ -305,6 +510,13 @@ def extract_text_from_images(
                 image_hash=image_hash
             ))
     
+    logger.info(
+        f"  Vision {file_path.name}: {stats['llamadas']} llamadas, "
+        f"{stats['reutilizadas']} reutilizadas por hash perceptual, "
+        f"{stats['duplicadas']} duplicadas, {stats['decorativas']} decorativas, "
+        f"{stats['bytes_ahorrados'] / 1024:.0f} KB ahorrados"
+    )
+    
     # Guardar cache si hubo cambios
     if cache_updated:
         _save_cache(cache)
@@ -312,15 +524,19 @@ def extract_text_from_images(
     return results
 
 
-def process_cv_with_vision(file_path: Path) -> str:
+def process_cv_with_vision(file_path: Path, pages: Optional[Iterable[int]] = None) -> str:
     """
     Procesa un CV y retorna todo el texto de imagenes concatenado.
     Util para agregar al texto principal del CV.
     
+    Args:
+        file_path: Ruta al CV
+        pages: Paginas del PDF a enviar a OCR (base 1). None = todas.
+    
     Returns:
         String con todo el texto extraido de imagenes, separado por newlines
     """
-    image_texts = extract_text_from_images(file_path)
+    image_texts = extract_text_from_images(file_path, pages=pages)
     
     if not image_texts:
         return ""
@@ -18,7 +18,8 @@ Endpoints:
 - GET  /countries        - Paises disponibles
 - GET  /stats            - Estadisticas
 - POST /reindex          - Reconstruir indices
-- GET  /cvs/download/{matricula}  - Descargar CV (v4.0)
+- GET  /cvs/download/{matricula}  - Descargar CV (v4.0, ETag/304/Range)
+- GET  /cvs/preview/{matricula}   - Texto de la primera pagina del CV
 - GET  /cvs/mapping-review        - Ver mapeo CVs (v4.0)
 - POST /reindex-cvs               - Reindexar solo CVs (v4.0)
 
@@ -28,12 +29,14 @@ Filtros automaticos:
 """
 
 import os
+import asyncio
 import json
 import logging
 import re
 import math
+import hashlib
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
@@ -75,6 +78,22 @@ CV_MAPPING_FILE = BASE_DIR / "cv_mapping.xlsx"
 CV_MAPPING_REVIEW_FILE = BASE_DIR / "cv_mapping_review.xlsx"
 TABLE_CVS = "cvs"
 
+# Chunking de CVs: "tokens" ajusta cada chunk al limite real del encoder
+# (oraciones completas + overlap en tokens); "chars" mantiene el modo clasico
+CV_CHUNK_MODE = os.getenv("CV_CHUNK_MODE", "tokens")
+CV_CHUNK_SIZE = int(os.getenv("CV_CHUNK_SIZE", "500"))  # Caracteres (modo chars)
+CV_CHUNK_OVERLAP = int(os.getenv("CV_CHUNK_OVERLAP", "100"))  # Caracteres (modo chars)
+CV_CHUNK_OVERLAP_TOKENS = int(os.getenv("CV_CHUNK_OVERLAP_TOKENS", "24"))  # Tokens (modo tokens)
+
+# Busqueda hibrida (BM25 via tantivy + vector, fusion RRF)
+SEARCH_MODES = ("vector", "hibrido")
+RRF_K = 60  # Constante de Reciprocal Rank Fusion
+FTS_COLUMNS = {
+    TABLE_CERTS: "certificacion",
+    TABLE_SKILLS: "skill",
+    TABLE_CVS: "text",
+}
+
 # Modelo de embeddings multilingue
 EMBEDDING_MODEL = "paraphrase-multilingual-MiniLM-L12-v2"
 
@@ -139,6 +158,10 @@ class TalentSearchRequest(BaseModel):
     consulta: str = Field(..., description="Descripcion del perfil buscado")
     limit: int = Field(10, ge=1, le=50, description="Maximo de resultados")
     pais: Optional[str] = Field(None, description="Filtrar por pais")
+    modo_busqueda: Literal["vector", "hibrido"] = Field(
+        "vector",
+        description="vector: solo similitud semantica | hibrido: BM25 + vector (mejor para codigos como AZ-104, CKA)"
+    )
 
 
 class TalentSearchResponse(BaseModel):
@@ -155,6 +178,7 @@ class RequerimientoRol(BaseModel):
     descripcion: str = Field(..., description="Skills y certificaciones requeridas")
     pais: Optional[str] = Field(None, description="Filtro por pais")
     cantidad: int = Field(3, ge=1, le=20, description="Candidatos a retornar")
+    modo_busqueda: Literal["vector", "hibrido"] = Field("vector", description="Modo de busqueda")
 
 
 class BatchSearchRequest(BaseModel):
@@ -240,6 +264,13 @@ _table_cvs = None
 _cv_mapping: Dict[str, str] = {}          # matricula -> filename
 _cv_mapping_reverse: Dict[str, str] = {}  # filename -> matricula
 
+# Tablas con indice full-text (tantivy) disponible
+_fts_ready: set = set()
+
+# Metadatos de archivos CV (ETag/Last-Modified) y previews de primera pagina
+_cv_file_meta: Dict[str, Dict[str, Any]] = {}  # ruta -> {mtime_ns, size, etag, last_modified}
+_cv_previews: Dict[str, Dict[str, Any]] = {}   # matricula -> preview
+
 
 def get_model() -> SentenceTransformer:
     """Carga el modelo de embeddings (singleton)."""
@@ -251,6 +282,12 @@ def get_model() -> SentenceTransformer:
     return _model
 
 
+def get_token_budget(model: SentenceTransformer) -> int:
+    """Tokens de contenido que el encoder embebe sin truncar (descontando [CLS]/[SEP])."""
+    special = model.tokenizer.num_special_tokens_to_add(pair=False)
+    return model.max_seq_length - special
+
+
 def find_column(df: pd.DataFrame, names: list) -> Optional[str]:
     """Encuentra columna por nombres posibles."""
     for name in names:
@@ -433,6 +470,7 @@ def initialize_vector_db(force_rebuild: bool = False):
     if TABLE_CERTS in existing and not force_rebuild:
         logger.info(f"Reutilizando tabla {TABLE_CERTS}")
         _table_certs = _db.open_table(TABLE_CERTS)
+        ensure_fts_index(_table_certs, TABLE_CERTS)
     else:
         df = load_certifications_raw()
         if not df.empty:
@@ -471,12 +509,14 @@ def initialize_vector_db(force_rebuild: bool = False):
             if TABLE_CERTS in existing:
                 _db.drop_table(TABLE_CERTS)
             _table_certs = _db.create_table(TABLE_CERTS, records)
+            ensure_fts_index(_table_certs, TABLE_CERTS, rebuild=True)
             logger.info(f"Tabla {TABLE_CERTS}: {len(records)} registros")
     
     # === SKILLS ===
     if TABLE_SKILLS in existing and not force_rebuild:
         logger.info(f"Reutilizando tabla {TABLE_SKILLS}")
         _table_skills = _db.open_table(TABLE_SKILLS)
+        ensure_fts_index(_table_skills, TABLE_SKILLS)
     else:
         df = load_skills_raw()
         if not df.empty:
@@ -522,9 +562,101 @@ def initialize_vector_db(force_rebuild: bool = False):
                 if TABLE_SKILLS in existing:
                     _db.drop_table(TABLE_SKILLS)
                 _table_skills = _db.create_table(TABLE_SKILLS, records)
+                ensure_fts_index(_table_skills, TABLE_SKILLS, rebuild=True)
                 logger.info(f"Tabla {TABLE_SKILLS}: {len(records)} registros")
 
 
+# ============================================
+# INDICES FULL-TEXT (BM25)
+# ============================================
+
+def ensure_fts_index(table, table_name: str, rebuild: bool = False) -> bool:
+    """
+    Crea (o verifica) el indice full-text de la columna configurada en FTS_COLUMNS.
+    
+    Args:
+        table: Tabla LanceDB
+        table_name: Nombre de la tabla
+        rebuild: Si True, recrea el indice aunque exista
+        
+    Returns:
+        True si el indice esta disponible
+    """
+    _fts_ready.discard(table_name)
+    column = FTS_COLUMNS.get(table_name)
+    if table is None or not column:
+        return False
+    
+    if not rebuild:
+        try:
+            table.search("probe", query_type="fts").limit(1).to_list()
+            _fts_ready.add(table_name)
+            return True
+        except Exception:
+            pass  # No existe: crearlo
+    
+    try:
+        try:
+            table.create_fts_index(column, replace=True, use_tantivy=True)
+        except TypeError:
+            # Versiones de lancedb sin el parametro use_tantivy (siempre tantivy)
+            table.create_fts_index(column, replace=True)
+        _fts_ready.add(table_name)
+        logger.info(f"Indice FTS creado: {table_name}.{column}")
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudo crear indice FTS en {table_name}.{column}: {e}")
+        return False
+
+
+def _fts_query(query: str) -> str:
+    """Limpia la consulta de sintaxis del query parser de tantivy (AZ-104 -> AZ 104)."""
+    return re.sub(r'[^\w\s]', ' ', query).strip()
+
+
+def search_table(table, table_name: str, query: str, query_vector: List[float],
+                 limit: int, modo_busqueda: str = "vector") -> pd.DataFrame:
+    """
+    Busca en una tabla LanceDB y agrega la columna "_relevancia" (0-100).
+    
+    - vector: score = 100 * exp(-distancia / 15)
+    - hibrido: Reciprocal Rank Fusion de los rankings BM25 y vector,
+      normalizado para que 100 = primer lugar en ambos rankings
+    
+    Si la tabla no tiene indice FTS, el modo hibrido cae a vector.
+    """
+    vector_df = table.search(query_vector).limit(limit).to_pandas()
+    distances = pd.to_numeric(vector_df.get("_distance", pd.Series(0, index=vector_df.index)), errors="coerce")
+    distances = distances.replace([math.inf, -math.inf], float("nan")).fillna(0)
+    vector_df["_relevancia"] = 100 * (-distances / 15).apply(math.exp)
+    
+    fts_text = _fts_query(query)
+    if modo_busqueda != "hibrido" or table_name not in _fts_ready or not fts_text:
+        return vector_df
+    
+    try:
+        fts_df = table.search(fts_text, query_type="fts").limit(limit).to_pandas()
+    except Exception as e:
+        logger.warning(f"Busqueda FTS fallida en {table_name}, usando solo vector: {e}")
+        return vector_df
+    
+    rrf: Dict[Any, float] = {}
+    rows: Dict[Any, pd.Series] = {}
+    for ranked in (vector_df, fts_df):
+        for rank, (_, row) in enumerate(ranked.iterrows(), 1):
+            key = row["id"]
+            rrf[key] = rrf.get(key, 0.0) + 1.0 / (RRF_K + rank)
+            rows.setdefault(key, row)
+    
+    if not rows:
+        return vector_df
+    
+    max_rrf = 2.0 / (RRF_K + 1)
+    fused = pd.DataFrame([rows[k] for k in rrf])
+    fused["_relevancia"] = [100 * rrf[k] / max_rrf for k in rrf]
+    return fused.sort_values("_relevancia", ascending=False).head(limit).reset_index(drop=True)
+
+
 # ============================================
 # INICIALIZACION DE CVs (v4.0)
 # ============================================
@@ -543,6 +675,8 @@ def initialize_cv_index(force_rebuild: bool = False):
     """
     global _table_cvs, _cv_mapping, _cv_mapping_reverse
     
+    _cv_previews.clear()
+    
     if not CV_FOLDER.exists():
         logger.warning(f"Carpeta de CVs no existe: {CV_FOLDER}")
         logger.info("Crear carpeta 'cvs/' y agregar los CVs para habilitar busqueda en CVs")
@@ -599,11 +733,20 @@ def initialize_cv_index(force_rebuild: bool = False):
     if TABLE_CVS in existing and not force_rebuild:
         logger.info(f"Reutilizando tabla {TABLE_CVS}")
         _table_cvs = _db.open_table(TABLE_CVS)
+        ensure_fts_index(_table_cvs, TABLE_CVS)
         logger.info(f"CVs indexados: {len(_cv_mapping)} matriculas con CV")
         return
     
     # === PASO 3: Procesar CVs y generar chunks ===
-    processor = CVProcessor(CV_FOLDER, chunk_size=500, overlap=100)
+    processor = CVProcessor(
+        CV_FOLDER,
+        chunk_size=CV_CHUNK_SIZE,
+        overlap=CV_CHUNK_OVERLAP,
+        chunk_mode=CV_CHUNK_MODE,
+        tokenizer=model.tokenizer,
+        max_tokens=get_token_budget(model),
+        overlap_tokens=CV_CHUNK_OVERLAP_TOKENS
+    )
     chunks = processor.process_all(filename_to_matricula)
     
     if not chunks:
@@ -632,9 +775,36 @@ def initialize_cv_index(force_rebuild: bool = False):
         _db.drop_table(TABLE_CVS)
     
     _table_cvs = _db.create_table(TABLE_CVS, records)
+    ensure_fts_index(_table_cvs, TABLE_CVS, rebuild=True)
     logger.info(f"Tabla {TABLE_CVS}: {len(records)} chunks de {len(_cv_mapping)} CVs")
 
 
+def get_cv_index_stats() -> Dict[str, Any]:
+    """
+    Estadisticas del indice de CVs: chunks, chunks que el encoder trunca
+    y tamano en disco de la tabla LanceDB.
+    """
+    if _table_cvs is None:
+        return {"chunks": 0, "chunks_truncados": 0, "tokens_promedio": 0, "tamano_indice_kb": 0}
+    
+    model = get_model()
+    budget = get_token_budget(model)
+    texts = _table_cvs.to_pandas()["text"].tolist()
+    token_counts = [
+        len(model.tokenizer.encode(t, add_special_tokens=False)) for t in texts
+    ]
+    
+    table_dir = LANCEDB_PATH / f"{TABLE_CVS}.lance"
+    size_bytes = sum(f.stat().st_size for f in table_dir.rglob("*") if f.is_file()) if table_dir.exists() else 0
+    
+    return {
+        "chunks": len(texts),
+        "chunks_truncados": sum(1 for n in token_counts if n > budget),
+        "tokens_promedio": round(sum(token_counts) / len(token_counts), 1) if token_counts else 0,
+        "tamano_indice_kb": round(size_bytes / 1024, 1)
+    }
+
+
 # ============================================
 # BUSQUEDA Y ENRIQUECIMIENTO
 # ============================================
@@ -678,7 +848,8 @@ def get_basic_info_for_matricula(matricula: str) -> Optional[Dict]:
 
 
 def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
-                      include_cv_search: bool = True) -> List[PerfilCompleto]:
+                      include_cv_search: bool = True,
+                      modo_busqueda: str = "vector") -> List[PerfilCompleto]:
     """
     Busca candidatos y retorna perfiles ENRIQUECIDOS con todas sus certs, skills y CVs.
     
@@ -687,6 +858,7 @@ def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
         limit: Maximo de resultados
         pais: Filtrar por pais
         include_cv_search: Si True, tambien busca en CVs indexados (v4.0)
+        modo_busqueda: "vector" o "hibrido" (BM25 + vector con fusion RRF)
     """
     if _table_certs is None and _table_skills is None:
         return []
@@ -700,7 +872,7 @@ def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
     # Buscar en certificaciones
     if _table_certs:
         search_limit = limit * 5 if pais else limit * 3
-        results = _table_certs.search(query_vector).limit(search_limit).to_pandas()
+        results = search_table(_table_certs, TABLE_CERTS, query, query_vector, search_limit, modo_busqueda)
         
         if pais:
             results = results[results["pais"].str.lower() == pais.lower()]
@@ -710,11 +882,7 @@ def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
             if not mat:
                 continue
             
-            dist = float(row.get("_distance", 0) or 0)
-            # Validar que dist sea un número válido
-            if math.isnan(dist) or math.isinf(dist):
-                dist = 0
-            score = 100 * math.exp(-dist / 15)
+            score = float(row["_relevancia"])
             
             if mat not in candidatos_raw or score > candidatos_raw[mat]["score"]:
                 candidatos_raw[mat] = {
@@ -730,18 +898,14 @@ def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
     
     # Buscar en skills (complementar)
     if _table_skills and len(candidatos_raw) < limit:
-        results = _table_skills.search(query_vector).limit(limit * 3).to_pandas()
+        results = search_table(_table_skills, TABLE_SKILLS, query, query_vector, limit * 3, modo_busqueda)
         
         for _, row in results.iterrows():
             mat = str(row.get("matricula", "")).strip()
             if not mat:
                 continue
             
-            dist = float(row.get("_distance", 0) or 0)
-            # Validar que dist sea un número válido
-            if math.isnan(dist) or math.isinf(dist):
-                dist = 0
-            score = 100 * math.exp(-dist / 15)
+            score = float(row["_relevancia"])
             
             if mat not in candidatos_raw or score > candidatos_raw[mat]["score"]:
                 candidatos_raw[mat] = {
@@ -759,18 +923,16 @@ def search_and_enrich(query: str, limit: int = 10, pais: Optional[str] = None,
     
     # v4.0: Buscar en CVs
     if include_cv_search and _table_cvs is not None:
-        cv_results = _table_cvs.search(query_vector).limit(limit * 5).to_pandas()
+        # En modo hibrido BM25 recupera los codigos exactos: no hace falta sobre-pedir tanto
+        cv_limit = limit * 3 if modo_busqueda == "hibrido" else limit * 5
+        cv_results = search_table(_table_cvs, TABLE_CVS, query, query_vector, cv_limit, modo_busqueda)
         
         for _, row in cv_results.iterrows():
             mat = str(row.get("matricula", "")).strip()
             if not mat:
                 continue
             
-            dist = float(row.get("_distance", 0) or 0)
-            # Validar que dist sea un número válido
-            if math.isnan(dist) or math.isinf(dist):
-                dist = 0
-            score = 100 * math.exp(-dist / 15)
+            score = float(row["_relevancia"])
             
             # Guardar matches de CV para mostrar despues
             if mat not in cv_matches_by_matricula:
@@ -864,7 +1026,8 @@ def search_for_roles(roles: List[RequerimientoRol]) -> Dict[str, RolResultado]:
         candidatos = search_and_enrich(
             query=rol.descripcion,
             limit=rol.cantidad,
-            pais=rol.pais
+            pais=rol.pais,
+            modo_busqueda=rol.modo_busqueda
         )
         
         resultados[rol.rol_id] = RolResultado(
@@ -1190,9 +1353,12 @@ async def search_talent(request: TalentSearchRequest):
     if _table_certs is None and _table_skills is None:
         raise HTTPException(503, "Base de datos no inicializada")
     
-    logger.info(f"Búsqueda: '{request.consulta}' | pais={request.pais} | limit={request.limit}")
+    logger.info(f"Búsqueda: '{request.consulta}' | pais={request.pais} | limit={request.limit} | modo={request.modo_busqueda}")
     
-    candidatos = search_and_enrich(request.consulta, request.limit, request.pais)
+    candidatos = search_and_enrich(
+        request.consulta, request.limit, request.pais,
+        modo_busqueda=request.modo_busqueda
+    )
     
     return TalentSearchResponse(
         exito=bool(candidatos),
@@ -1308,13 +1474,116 @@ async def reindex():
 # ENDPOINTS DE CVs (v4.0)
 # ============================================
 
-from fastapi.responses import FileResponse
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+CV_MEDIA_TYPES = {
+    ".pdf": "application/pdf",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".doc": "application/msword"
+}
+CV_STREAM_CHUNK_SIZE = 64 * 1024
+CV_PREVIEW_MAX_CHARS = 1500
+
+
+def get_cv_file_meta(cv_path: Path) -> Dict[str, Any]:
+    """
+    Retorna validadores HTTP de un CV (ETag fuerte por SHA-256 y Last-Modified).
+    El hash se cachea por (mtime_ns, size) para no releer el archivo en cada request.
+    """
+    stat = cv_path.stat()
+    key = str(cv_path)
+    cached = _cv_file_meta.get(key)
+    if cached and cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size:
+        return cached
+    
+    sha = hashlib.sha256()
+    with open(cv_path, "rb") as f:
+        for block in iter(lambda: f.read(CV_STREAM_CHUNK_SIZE), b""):
+            sha.update(block)
+    
+    meta = {
+        "mtime_ns": stat.st_mtime_ns,
+        "mtime": int(stat.st_mtime),
+        "size": stat.st_size,
+        "etag": f'"{sha.hexdigest()}"',
+        "last_modified": formatdate(stat.st_mtime, usegmt=True)
+    }
+    _cv_file_meta[key] = meta
+    return meta
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Comparacion debil de If-None-Match (ignora prefijo W/)."""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _not_modified_since(header: str, mtime: int) -> bool:
+    """True si el archivo no cambio desde la fecha de If-Modified-Since."""
+    try:
+        return mtime <= int(parsedate_to_datetime(header).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+def _parse_range(header: str, size: int) -> Optional[tuple]:
+    """
+    Parsea un header Range de un solo rango ("bytes=inicio-fin", "bytes=inicio-", "bytes=-sufijo").
+    
+    Returns:
+        (inicio, fin) inclusivos, None si el header no es valido o tiene multiples rangos
+        
+    Raises:
+        HTTPException 416: si el rango no es satisfacible
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header)
+    if not match or (not match.group(1) and not match.group(2)):
+        return None
+    
+    start_str, end_str = match.groups()
+    if start_str:
+        start = int(start_str)
+        end = min(int(end_str), size - 1) if end_str else size - 1
+    else:
+        suffix = int(end_str)
+        start, end = max(size - suffix, 0), size - 1
+        if suffix == 0:
+            start = size  # Sufijo vacio: no satisfacible
+    
+    if start >= size or start > end:
+        raise HTTPException(
+            416, "Rango no satisfacible",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _iter_file_range(path: Path, start: int, end: int):
+    """Lee el archivo desde start hasta end (inclusive) en bloques."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            block = f.read(min(CV_STREAM_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            yield block
+
 
 @app.get("/cvs/download/{matricula}", tags=["CVs"])
-async def download_cv(matricula: str):
+async def download_cv(matricula: str, request: Request):
     """
     Descarga el CV de un colaborador.
     
+    Soporta descargas condicionales (If-None-Match / If-Modified-Since -> 304)
+    y por rangos (Range / If-Range -> 206) para visores PDF en el navegador.
+    
     Args:
         matricula: Matricula del colaborador
         
@@ -1332,23 +1601,121 @@ async def download_cv(matricula: str):
     if not cv_path.exists():
         raise HTTPException(404, f"Archivo no encontrado: {cv_filename}")
     
-    # Determinar media type
-    ext = cv_path.suffix.lower()
-    media_types = {
-        ".pdf": "application/pdf",
-        ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-        ".doc": "application/msword"
+    # El primer request de cada CV calcula el SHA-256 del archivo completo: fuera del event loop
+    meta = await asyncio.to_thread(get_cv_file_meta, cv_path)
+    media_type = CV_MEDIA_TYPES.get(cv_path.suffix.lower(), "application/octet-stream")
+    headers = {
+        "ETag": meta["etag"],
+        "Last-Modified": meta["last_modified"],
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache"  # Cachear pero revalidar siempre
     }
     
+    # Validacion condicional: If-None-Match tiene prioridad sobre If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match and _etag_matches(if_none_match, meta["etag"])) or (
+        not if_none_match and if_modified_since and _not_modified_since(if_modified_since, meta["mtime"])
+    ):
+        return Response(status_code=304, headers=headers)
+    
+    # Rangos: solo si If-Range (si viene) coincide con la version actual
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() in (meta["etag"], meta["last_modified"])):
+        byte_range = _parse_range(range_header, meta["size"])
+        if byte_range:
+            start, end = byte_range
+            headers.update({
+                "Content-Range": f"bytes {start}-{end}/{meta['size']}",
+                "Content-Length": str(end - start + 1),
+                "Content-Disposition": f"attachment; filename*=utf-8''{quote(cv_filename)}"
+            })
+            return StreamingResponse(
+                _iter_file_range(cv_path, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=headers
+            )
+    
     logger.info(f"Descargando CV: {cv_filename} (matricula: {matricula})")
     
     return FileResponse(
         path=cv_path,
         filename=cv_filename,
-        media_type=media_types.get(ext, "application/octet-stream")
+        media_type=media_type,
+        headers=headers
     )
 
 
+def _merge_overlapping_chunks(chunks: List[str]) -> str:
+    """Une chunks consecutivos eliminando el texto repetido por el overlap."""
+    merged = ""
+    for chunk in chunks:
+        if not merged:
+            merged = chunk
+            continue
+        overlap = 0
+        for size in range(min(len(merged), len(chunk), 600), 10, -1):
+            if merged.endswith(chunk[:size]):
+                overlap = size
+                break
+        merged = f"{merged}{chunk[overlap:]}" if overlap else f"{merged} {chunk}"
+    return merged
+
+
+def build_cv_preview(matricula: str) -> Optional[Dict[str, Any]]:
+    """
+    Construye el texto de la primera pagina del CV a partir de los chunks indexados.
+    Excluye los chunks de Vision OCR (pagina 0).
+    """
+    if _table_cvs is None:
+        return None
+    
+    if not _cv_previews:
+        # Una sola lectura de la tabla para todas las matriculas
+        df = _table_cvs.to_pandas()
+        df = df[pd.to_numeric(df["page_num"], errors="coerce").fillna(0) > 0]
+        for mat, group in df.groupby(df["matricula"].astype(str).str.strip()):
+            first_page = int(group["page_num"].min())
+            page_chunks = group[group["page_num"] == first_page].sort_values("chunk_id")
+            _cv_previews[mat] = {
+                "pagina": first_page,
+                "texto": _merge_overlapping_chunks(page_chunks["text"].astype(str).tolist()),
+                "cv_filename": str(page_chunks["cv_filename"].iloc[0])
+            }
+    
+    return _cv_previews.get(str(matricula).strip())
+
+
+@app.get("/cvs/preview/{matricula}", tags=["CVs"])
+async def preview_cv(
+    matricula: str,
+    max_chars: int = Query(CV_PREVIEW_MAX_CHARS, ge=100, le=10000, description="Maximo de caracteres")
+):
+    """
+    Texto de la primera pagina del CV, servido desde el indice (sin leer el archivo).
+    
+    Pensado para tarjetas de candidatos que no necesitan descargar el PDF completo.
+    """
+    if matricula not in _cv_mapping:
+        raise HTTPException(404, f"No hay CV registrado para matricula: {matricula}")
+    
+    preview = build_cv_preview(matricula)
+    if not preview:
+        raise HTTPException(404, f"CV sin texto indexado para matricula: {matricula}")
+    
+    texto = preview["texto"]
+    return {
+        "exito": True,
+        "matricula": matricula,
+        "cv_filename": preview["cv_filename"],
+        "pagina": preview["pagina"],
+        "texto": texto[:max_chars],
+        "truncado": len(texto) > max_chars
+    }
+
+
 @app.get("/cvs/mapping-review", tags=["CVs"])
 async def get_mapping_review():
     """
@@ -1402,13 +1769,23 @@ async def reindex_cvs():
             import shutil
             shutil.copy(CV_MAPPING_FILE, backup_path)
         
+        stats_antes = get_cv_index_stats()
         initialize_cv_index(force_rebuild=True)
+        stats_despues = get_cv_index_stats()
+        logger.info(
+            f"Indice CVs ({CV_CHUNK_MODE}): chunks {stats_antes['chunks']} -> {stats_despues['chunks']}, "
+            f"truncados {stats_antes['chunks_truncados']} -> {stats_despues['chunks_truncados']}, "
+            f"tamano {stats_antes['tamano_indice_kb']} KB -> {stats_despues['tamano_indice_kb']} KB"
+        )
         
         return {
             "exito": True,
             "mensaje": "CVs reindexados",
             "total_chunks": _table_cvs.count_rows() if _table_cvs else 0,
             "total_cvs_mapeados": len(_cv_mapping),
+            "modo_chunking": CV_CHUNK_MODE,
+            "indice_antes": stats_antes,
+            "indice_despues": stats_despues,
             "revisar": f"Ver GET /cvs/mapping-review para CVs que requieren revision manual"
         }
     except Exception as e:
@@ -1426,7 +1803,8 @@ try:
     MCP_AVAILABLE = True
     
     @mcp.tool()
-    def buscar_talento(consulta: str, pais: str = None, limit: int = 10) -> str:
+    def buscar_talento(consulta: str, pais: str = None, limit: int = 10,
+                       modo_busqueda: str = "vector") -> str:
         """
         Busca candidatos con perfiles enriquecidos (todas las certs y skills).
         
@@ -1434,8 +1812,11 @@ try:
             consulta: Skills o certificaciones buscadas
             pais: Filtro por país (opcional)
             limit: Máximo de resultados
+            modo_busqueda: "vector" o "hibrido" (recomendado para codigos como AZ-104, CKA)
         """
-        candidatos = search_and_enrich(consulta, limit, pais)
+        if modo_busqueda not in SEARCH_MODES:
+            modo_busqueda = "vector"
+        candidatos = search_and_enrich(consulta, limit, pais, modo_busqueda=modo_busqueda)
         return json.dumps({
             "exito": bool(candidatos),
             "total": len(candidatos),
@@ -77,6 +77,7 @@ def run_all_tests(include_chat=True, chat_only=False):
             ("Busqueda Basica", test_02_search.test_search_basic()),
             ("Busqueda con Pais", test_02_search.test_search_with_country()),
             ("Perfil Enriquecido", test_02_search.test_search_enriched_profile()),
+            ("Busqueda Hibrida", test_02_search.test_search_hybrid()),
         ]
         all_results.extend(results)
         
@@ -147,11 +147,54 @@ def test_search_enriched_profile():
         return False
 
 
+def test_search_hybrid():
+    """Busqueda hibrida (BM25 + vector) con un codigo exacto de certificacion."""
+    print_header("TEST: Busqueda Hibrida")
+    
+    try:
+        payload = {
+            "consulta": "AZ-104",
+            "limit": 5,
+            "modo_busqueda": "hibrido"
+        }
+        
+        response = requests.post(f"{BASE_URL}/search", json=payload, timeout=TIMEOUT)
+        
+        assert response.status_code == 200, f"Status: {response.status_code}"
+        data = response.json()
+        
+        if data["total"] == 0:
+            print_warn("No se encontraron candidatos para esta busqueda")
+            return True
+        
+        scores = [c["score"] for c in data["candidatos"]]
+        assert all(0 <= s <= 100 for s in scores), f"Scores fuera de rango: {scores}"
+        assert scores == sorted(scores, reverse=True), "Candidatos no ordenados por score"
+        print_ok("Scores RRF en rango y ordenados")
+        
+        print_info(f"Primer candidato: {data['candidatos'][0]['nombre']}")
+        print_info(f"  - Match: {data['candidatos'][0]['match_principal'][:40]}")
+        
+        # Modo invalido debe rechazarse
+        payload["modo_busqueda"] = "otro"
+        response = requests.post(f"{BASE_URL}/search", json=payload, timeout=TIMEOUT)
+        assert response.status_code == 422, f"Modo invalido aceptado: {response.status_code}"
+        print_ok("Modo de busqueda invalido rechazado (422)")
+        
+        print_ok("Busqueda hibrida PASSED")
+        return True
+        
+    except Exception as e:
+        print_fail(f"Error: {e}")
+        return False
+
+
 if __name__ == "__main__":
     results = []
     results.append(("Busqueda Basica", test_search_basic()))
     results.append(("Busqueda con Pais", test_search_with_country()))
     results.append(("Perfil Enriquecido", test_search_enriched_profile()))
+    results.append(("Busqueda Hibrida", test_search_hybrid()))
     
     print_header("RESUMEN")
     passed = sum(1 for _, r in results if r)